@@ -0,0 +1,235 @@
+"""
+Embedding service shared by Milvus search and memory recall (Gemini embeddings).
+Batches requests and caches vectors in an in-memory LRU and an on-disk SQLite store,
+keyed by model + text hash, with vectors kept as compact float32 blobs.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import google.generativeai as genai
+
+from .scheduler import call_timeout
+
+DEFAULT_EMBEDDING_MODEL = "models/text-embedding-004"
+
+# Max keys per "IN (...)" lookup in the SQLite tier
+_SQL_IN_CHUNK = 500
+
+class EmbeddingCache:
+    """LRU + SQLite cache of float32 vectors. Embeddings are deterministic per model, so entries never expire"""
+
+    def __init__(self, max_entries: int = 4096, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "stores": 0, "evictions": 0}
+        self._db = None
+        if db_path:
+            self._init_disk_tier(db_path)
+
+    @classmethod
+    def from_env(cls) -> Optional["EmbeddingCache"]:
+        """
+        Builds the cache from environment variables, or returns None when disabled.
+
+        - EMBEDDING_CACHE_ENABLED: "true/false" (default: true)
+        - EMBEDDING_CACHE_MAX_ENTRIES: in-memory LRU size (default: 4096)
+        - EMBEDDING_CACHE_DB_PATH: SQLite file for the on-disk tier (default: embedding_cache.db, empty disables it)
+        """
+        if os.getenv("EMBEDDING_CACHE_ENABLED", "true").strip().lower() not in {"1", "true", "yes", "on"}:
+            return None
+        return cls(
+            max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "4096")),
+            db_path=os.getenv("EMBEDDING_CACHE_DB_PATH", "embedding_cache.db") or None,
+        )
+
+    def _init_disk_tier(self, db_path: str):
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors for the keys that are present"""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+                    self._stats["memory_hits"] += 1
+                else:
+                    missing.append(key)
+
+            if missing and self._db is not None:
+                rows = []
+                # Chunked to stay under SQLITE_MAX_VARIABLE_NUMBER (999 on older builds)
+                for start in range(0, len(missing), _SQL_IN_CHUNK):
+                    chunk = missing[start:start + _SQL_IN_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows.extend(self._db.execute(
+                        f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})", chunk
+                    ).fetchall())
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._put_memory(key, vector)
+                    found[key] = vector
+                    self._stats["disk_hits"] += 1
+
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(keys) - len(found)
+        return found
+
+    def set_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            for key, vector in items.items():
+                self._put_memory(key, vector)
+            self._stats["stores"] += len(items)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (key, dim, vector, created_at) VALUES (?, ?, ?, ?)",
+                    [(key, vector.shape[0], vector.tobytes(), now) for key, vector in items.items()]
+                )
+                self._db.commit()
+
+    def _put_memory(self, key: str, vector: np.ndarray):
+        """Insert into the LRU tier; caller holds the lock"""
+        vector.flags.writeable = False  # Shared between callers
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embedding_cache")
+                self._db.commit()
+
+def _gemini_embed(texts: List[str], model: str) -> List[List[float]]:
+    """One embed_content request for a list of texts, bounded by the current step deadline if any"""
+    timeout = call_timeout()
+    result = genai.embed_content(model=model, content=texts,
+                                 request_options={"timeout": timeout} if timeout else None)
+    return result["embedding"]
+
+class EmbeddingService:
+    """
+    Unified entry point for text embeddings.
+    - embed_many() splits uncached texts into batches of batch_size per API call.
+    - Vectors are returned as float32 NumPy arrays; cached vectors are read-only.
+    """
+    def __init__(self, model: str = DEFAULT_EMBEDDING_MODEL, batch_size: int = 100,
+                 cache: Optional[EmbeddingCache] = None,
+                 embed_fn: Callable[[List[str], str], List[List[float]]] = _gemini_embed):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.cache = cache
+        self._embed_fn = embed_fn
+        self._stats = {"requests": 0, "texts_embedded": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingService":
+        """
+        - EMBEDDING_MODEL: Gemini embedding model (default: models/text-embedding-004)
+        - EMBEDDING_BATCH_SIZE: texts per API request (default: 100, the Gemini limit)
+        """
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY must be set in .env file for embeddings.")
+        genai.configure(api_key=api_key)
+        return cls(
+            model=os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL),
+            batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "100")),
+            cache=EmbeddingCache.from_env(),
+        )
+
+    def embed(self, text: str, model: Optional[str] = None) -> np.ndarray:
+        return self.embed_many([text], model)[0]
+
+    def embed_many(self, texts: Sequence[str], model: Optional[str] = None) -> np.ndarray:
+        """
+        Embeds texts, returning a (len(texts), dim) float32 matrix in input order.
+        Duplicate and cached texts are not sent to the API.
+        """
+        model = model or self.model
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        keys = [EmbeddingCache.make_key(model, text) for text in texts]
+        vectors: Dict[str, np.ndarray] = self.cache.get_many(keys) if self.cache else {}
+
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                pending.setdefault(key, text)
+
+        if pending:
+            pending_keys = list(pending)
+            fresh: Dict[str, np.ndarray] = {}
+            for start in range(0, len(pending_keys), self.batch_size):
+                batch_keys = pending_keys[start:start + self.batch_size]
+                print(f"Generating {len(batch_keys)} embedding(s) with model: {model}")
+                embeddings = self._embed_fn([pending[key] for key in batch_keys], model)
+                with self._lock:
+                    self._stats["requests"] += 1
+                    self._stats["texts_embedded"] += len(batch_keys)
+                for key, embedding in zip(batch_keys, embeddings):
+                    fresh[key] = np.asarray(embedding, dtype=np.float32)
+            if self.cache:
+                self.cache.set_many(fresh)
+            vectors.update(fresh)
+
+        return np.stack([vectors[key] for key in keys])
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["cache"] = self.cache.get_stats() if self.cache else {"enabled": False}
+        return stats
+
+_EMBEDDING_SERVICE = None
+_EMBEDDING_SERVICE_LOCK = threading.Lock()
+
+def get_embedding_service() -> EmbeddingService:
+    """
+    Get or create the global embedding service.
+    """
+    global _EMBEDDING_SERVICE
+    if _EMBEDDING_SERVICE is None:
+        with _EMBEDDING_SERVICE_LOCK:
+            if _EMBEDDING_SERVICE is None:
+                _EMBEDDING_SERVICE = EmbeddingService.from_env()
+    return _EMBEDDING_SERVICE
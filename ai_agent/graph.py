@@ -1,21 +1,50 @@
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from .state import AgentState
-from .nodes.intent_extraction import extract_intent
-from .nodes.router import route_question
-from .nodes.planner import generate_plan
-from .nodes.executor import execute_action
-from .nodes.reflection import reflect_on_execution
-from .nodes.replan_repair import replan_or_repair
-from .nodes.synthesizer import synthesize_final_answer
-from .nodes.memory_handler import handle_memory, store_memory
+from .scheduler import remaining_budget
+from .nodes.intent_extraction import extract_intent, aextract_intent
+from .nodes.router import route_question, aroute_question
+from .nodes.planner import generate_plan, agenerate_plan
+from .nodes.executor import execute_action, aexecute_action
+from .nodes.reflection import reflect_on_execution, areflect_on_execution
+from .nodes.replan_repair import replan_or_repair, areplan_or_repair
+from .nodes.synthesizer import synthesize_final_answer, asynthesize_final_answer
+from .nodes.memory_handler import handle_memory, store_memory, ahandle_memory, astore_memory
+from .nodes.verifier import verify_step
+from .nodes.cataloger import gather_catalog, agather_catalog
+
+def _node(func, afunc):
+    """
+    Wraps a sync node and its async counterpart so the compiled graph runs the
+    native version under both invoke/stream and ainvoke/astream.
+    """
+    return RunnableLambda(func, afunc=afunc, name=func.__name__)
 
 # --- Conditional Edge Logic --- #
 
+def _turn_budget_exhausted(state: AgentState) -> bool:
+    remaining = remaining_budget(getattr(state, 'turn_deadline', None))
+    if remaining is not None and remaining <= 0:
+        print("Turn time budget exhausted, moving to final synthesis.")
+        return True
+    return False
+
 def after_action_execution(state: AgentState) -> str:
     """
     Decides the next step after action execution.
     """
-    # For now, always go to reflection after execution
+    # Check the wave with deterministic rules before paying for an LLM reflection
+    return "verification"
+
+def after_verification(state: AgentState) -> str:
+    """
+    Decides the next step after rule-based verification.
+    """
+    if _turn_budget_exhausted(state):
+        return "final_synthesis"
+    if getattr(state, 'verification_status', None) == "pass":
+        return "action_execution" if state.has_more_steps else "final_synthesis"
+    # Failed or not machine-checkable: let the LLM reflect on it
     return "reflection"
 
 def after_reflection(state: AgentState) -> str:
@@ -29,6 +58,9 @@ def after_reflection(state: AgentState) -> str:
     can_replan_repair = getattr(state, 'can_replan_repair', None)
     
     # Logic for routing after reflection
+    if _turn_budget_exhausted(state):
+        # No time left for more tool calls or replanning: answer with what we have
+        return "final_synthesis"
     if reflection_status == "done" or reflection_status == "success":
         return "final_synthesis"
     elif reflection_status == "continue":
@@ -78,6 +110,12 @@ def after_memory_handler(state: AgentState) -> str:
     """
     Decides the next step after memory handling.
     """
+    return "cataloger"
+
+def after_cataloger(state: AgentState) -> str:
+    """
+    Decides the next step after loading the schema catalog.
+    """
     return "plan_generation"
 
 def after_plan_generation(state: AgentState) -> str:
@@ -106,19 +144,22 @@ def after_memory_storage(state: AgentState) -> str:
 def build_graph():
     """
     Builds the LangGraph state machine for the Plan-Act-Reflect Agent.
+    The compiled graph supports both invoke/stream and ainvoke/astream.
     """
     workflow = StateGraph(AgentState)
 
     # Add all nodes
-    workflow.add_node("router", route_question)
-    workflow.add_node("intent_extraction", extract_intent)
-    workflow.add_node("memory_handler", handle_memory)
-    workflow.add_node("plan_generation", generate_plan)
-    workflow.add_node("action_execution", execute_action)
-    workflow.add_node("reflection", reflect_on_execution)
-    workflow.add_node("replan_repair", replan_or_repair)
-    workflow.add_node("final_synthesis", synthesize_final_answer)
-    workflow.add_node("memory_storage", store_memory)
+    workflow.add_node("router", _node(route_question, aroute_question))
+    workflow.add_node("intent_extraction", _node(extract_intent, aextract_intent))
+    workflow.add_node("memory_handler", _node(handle_memory, ahandle_memory))
+    workflow.add_node("cataloger", _node(gather_catalog, agather_catalog))
+    workflow.add_node("plan_generation", _node(generate_plan, agenerate_plan))
+    workflow.add_node("action_execution", _node(execute_action, aexecute_action))
+    workflow.add_node("verification", verify_step)
+    workflow.add_node("reflection", _node(reflect_on_execution, areflect_on_execution))
+    workflow.add_node("replan_repair", _node(replan_or_repair, areplan_or_repair))
+    workflow.add_node("final_synthesis", _node(synthesize_final_answer, asynthesize_final_answer))
+    workflow.add_node("memory_storage", _node(store_memory, astore_memory))
 
     # Set the entry point
     workflow.set_entry_point("router")
@@ -145,6 +186,13 @@ def build_graph():
     workflow.add_conditional_edges(
         "memory_handler",
         after_memory_handler,
+        {
+            "cataloger": "cataloger"
+        }
+    )
+    workflow.add_conditional_edges(
+        "cataloger",
+        after_cataloger,
         {
             "plan_generation": "plan_generation"
         }
@@ -177,7 +225,17 @@ def build_graph():
         "action_execution",
         after_action_execution,
         {
-            "reflection": "reflection"
+            "verification": "verification"
+        }
+    )
+
+    workflow.add_conditional_edges(
+        "verification",
+        after_verification,
+        {
+            "reflection": "reflection",
+            "action_execution": "action_execution",
+            "final_synthesis": "final_synthesis"
         }
     )
 
@@ -0,0 +1,154 @@
+"""
+Content-addressed response cache for LLM chat calls.
+Two tiers: an in-memory LRU and an optional on-disk SQLite store.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# TTL in seconds per graph node; 0 means the node must always get a fresh response
+DEFAULT_NODE_TTLS: Dict[str, int] = {
+    "router": 300,  # A cached direct answer must not outlive the conversation it answered
+    "intent_extraction": 900,
+    "plan_generation": 900,
+    "reflection": 0,
+    "replan_repair": 0,
+    "final_synthesis": 0,
+}
+
+# TTL for calls that do not name a node
+DEFAULT_TTL = 600
+
+class LLMCache:
+    """LRU + SQLite cache of raw LLM responses keyed by provider, model, prompt and JSON mode"""
+
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None, node_ttls: Optional[Dict[str, int]] = None):
+        self.max_entries = max_entries
+        self.node_ttls = dict(DEFAULT_NODE_TTLS)
+        if node_ttls:
+            self.node_ttls.update(node_ttls)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (expires_at, content)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+        self._db = None
+        if db_path:
+            self._init_disk_tier(db_path)
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMCache"]:
+        """
+        Builds the cache from environment variables, or returns None when disabled.
+
+        - LLM_CACHE_ENABLED: "true/false" (default: true)
+        - LLM_CACHE_MAX_ENTRIES: in-memory LRU size (default: 1024)
+        - LLM_CACHE_DB_PATH: SQLite file for the on-disk tier (default: disabled)
+        - LLM_CACHE_TTL_<NODE>: per-node TTL override in seconds, e.g. LLM_CACHE_TTL_ROUTER=60
+        """
+        if os.getenv("LLM_CACHE_ENABLED", "true").strip().lower() not in {"1", "true", "yes", "on"}:
+            return None
+        node_ttls = {}
+        for node in DEFAULT_NODE_TTLS:
+            value = os.getenv(f"LLM_CACHE_TTL_{node.upper()}")
+            if value is not None:
+                node_ttls[node] = int(value)
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+            db_path=os.getenv("LLM_CACHE_DB_PATH") or None,
+            node_ttls=node_ttls,
+        )
+
+    def _init_disk_tier(self, db_path: str):
+        """Open the SQLite tier and purge expired rows"""
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, json_mode: bool) -> str:
+        raw = json.dumps([provider, model, bool(json_mode), prompt], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, node: Optional[str]) -> int:
+        if node is None:
+            return DEFAULT_TTL
+        return self.node_ttls.get(node, DEFAULT_TTL)
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                expires_at, content = item
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return content
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT content, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row and row[1] > now:
+                    self._put_memory(key, row[1], row[0])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+                if row:
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, content: str, ttl: int):
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._put_memory(key, expires_at, content)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, content, expires_at) VALUES (?, ?, ?)",
+                    (key, content, expires_at)
+                )
+                self._db.commit()
+
+    def _put_memory(self, key: str, expires_at: float, content: str):
+        """Insert into the LRU tier; caller holds the lock"""
+        self._entries[key] = (expires_at, content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
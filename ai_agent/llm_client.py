@@ -3,10 +3,17 @@ LLM Client for interacting with various AI APIs (Custom/DeepSeek for Chat, Gemin
 """
 import os
 import json
+import asyncio
+import weakref
+import httpx
 import requests
 import google.generativeai as genai
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from enum import Enum
+from typing import AsyncIterator, Iterator, Optional, Tuple
+from .llm_cache import LLMCache
+from .embeddings import get_embedding_service
 
 class LLMProvider(str, Enum):
     DEEPSEEK = "deepseek"
@@ -15,6 +22,27 @@ class LLMProvider(str, Enum):
     GEMINI = "gemini"
     CUSTOM = "custom"
 
+# (connect, read) timeouts in seconds per provider; overridable via LLM_CONNECT_TIMEOUT / LLM_READ_TIMEOUT
+DEFAULT_TIMEOUTS = {
+    LLMProvider.DEEPSEEK: (5.0, 120.0),
+    LLMProvider.OPENAI: (5.0, 60.0),
+    LLMProvider.ANTHROPIC: (5.0, 90.0),
+    LLMProvider.GEMINI: (5.0, 60.0),
+    LLMProvider.CUSTOM: (10.0, 120.0),
+}
+
+def _create_http_session(pool_size: int) -> requests.Session:
+    """
+    Creates a requests Session whose connection pool keeps sockets alive between calls,
+    so every node reuses the same TCP/TLS connection to the LLM endpoint.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=False)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
 class AIClient:
     def __init__(self):
         # --- Chat Model Config ---
@@ -28,6 +56,22 @@ class AIClient:
                 "LLM_API_KEY, LLM_API_URL, and LLM_MODEL_ID must be set in .env file"
             )
 
+        # --- HTTP Connection Pool ---
+        self.pool_size = int(os.getenv("LLM_POOL_SIZE", "10"))
+        default_connect, default_read = DEFAULT_TIMEOUTS.get(self.llm_provider, DEFAULT_TIMEOUTS[LLMProvider.CUSTOM])
+        self.timeout = (
+            float(os.getenv("LLM_CONNECT_TIMEOUT", default_connect)),
+            float(os.getenv("LLM_READ_TIMEOUT", default_read)),
+        )
+        self.session = _create_http_session(self.pool_size)
+
+        # --- Async HTTP Clients (one per event loop) ---
+        self.async_pool_size = int(os.getenv("LLM_ASYNC_POOL_SIZE", "100"))
+        self._async_clients = weakref.WeakKeyDictionary()
+
+        # --- Response Cache ---
+        self.cache = LLMCache.from_env()
+
         # --- Embedding Model Config (Gemini) ---
         google_api_key = os.getenv("GEMINI_API_KEY")
         if not google_api_key:
@@ -94,39 +138,71 @@ class AIClient:
         else:
             return response_json["choices"][0]["message"]["content"]
 
-    def invoke_chat(self, prompt: str) -> str:
+    def _parse_stream_line(self, line: str) -> Tuple[Optional[str], bool]:
         """
-        Invokes the configured chat completion model.
+        Parses one server-sent-events line of a streaming response.
+        Returns (text_delta, done) for both OpenAI-compatible and Anthropic event formats.
         """
-        print(f"Invoking Chat Endpoint with model: {self.chat_model_id} ({self.llm_provider})")
-        
-        payload = self._format_messages_for_provider(prompt)
-        response = requests.post(
+        if not line or not line.startswith("data:"):
+            return None, False
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None, True
+        event = json.loads(data)
+        if self.llm_provider == LLMProvider.ANTHROPIC:
+            if event.get("type") == "content_block_delta":
+                return event.get("delta", {}).get("text"), False
+            return None, event.get("type") == "message_stop"
+        choices = event.get("choices") or []
+        if not choices:
+            return None, False
+        return (choices[0].get("delta") or {}).get("content"), False
+
+    def _post_chat(self, payload: dict) -> dict:
+        """
+        Sends a chat payload through the pooled session and returns the decoded JSON body.
+        """
+        response = self.session.post(
             self.chat_api_url,
             headers=self._get_chat_headers(),
-            json=payload
+            json=payload,
+            timeout=self.timeout
         )
         response.raise_for_status()
-        
-        content = self._extract_content_from_response(response.json())
-        return content
+        return response.json()
 
-    def invoke_chat_json(self, prompt: str) -> dict:
+    def _get_async_client(self) -> httpx.AsyncClient:
         """
-        Invokes the chat model and expects a JSON string as output.
+        Returns the pooled async HTTP client bound to the running event loop.
         """
-        print(f"Invoking Chat Endpoint (JSON mode) with model: {self.chat_model_id} ({self.llm_provider})")
-        
-        payload = self._format_json_messages_for_provider(prompt)
-        response = requests.post(
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.async_pool_size,
+                    max_keepalive_connections=self.async_pool_size
+                ),
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                headers={"Connection": "keep-alive"}
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def _apost_chat(self, payload: dict) -> dict:
+        """
+        Async counterpart of _post_chat.
+        """
+        response = await self._get_async_client().post(
             self.chat_api_url,
             headers=self._get_chat_headers(),
             json=payload
         )
         response.raise_for_status()
-        
-        raw_content = self._extract_content_from_response(response.json())
-        
+        return response.json()
+
+    def _parse_json_content(self, raw_content: str) -> dict:
+        """Parse JSON mode content, fixing known provider quirks"""
         # Fix malformed JSON for DeepSeek
         if self.llm_provider == LLMProvider.DEEPSEEK:
             corrected_content = raw_content.replace("n  ", "\n  ").replace("n}", "\n}")
@@ -135,12 +211,174 @@ class AIClient:
 
         return json.loads(corrected_content)
 
-    def get_embedding(self, text: str, model: str = "models/text-embedding-004") -> list[float]:
+    def _cache_lookup(self, prompt: str, json_mode: bool, node: Optional[str], use_cache: bool) -> Tuple[Optional[str], int, Optional[str]]:
+        """
+        Returns (cache_key, ttl, cached_content). cache_key is None when the call must not be cached.
+        """
+        if self.cache is None:
+            return None, 0, None
+        ttl = self.cache.ttl_for(node)
+        if not use_cache or ttl <= 0:
+            self.cache.record_bypass()
+            return None, 0, None
+        key = LLMCache.make_key(self.llm_provider, self.chat_model_id, prompt, json_mode)
+        cached = self.cache.get(key)
+        if cached is not None:
+            print(f"LLM cache hit (node={node})")
+        return key, ttl, cached
+
+    def invoke_chat(self, prompt: str, node: Optional[str] = None, use_cache: bool = True) -> str:
+        """
+        Invokes the configured chat completion model.
+        `node` selects the cache TTL policy; use_cache=False forces a fresh response.
+        """
+        key, ttl, cached = self._cache_lookup(prompt, False, node, use_cache)
+        if cached is not None:
+            return cached
+
+        print(f"Invoking Chat Endpoint with model: {self.chat_model_id} ({self.llm_provider})")
+        
+        payload = self._format_messages_for_provider(prompt)
+        content = self._extract_content_from_response(self._post_chat(payload))
+        if key:
+            self.cache.set(key, content, ttl)
+        return content
+
+    def invoke_chat_json(self, prompt: str, node: Optional[str] = None, use_cache: bool = True) -> dict:
+        """
+        Invokes the chat model and expects a JSON string as output.
+        Only responses that parse as JSON are cached.
+        """
+        key, ttl, cached = self._cache_lookup(prompt, True, node, use_cache)
+        if cached is not None:
+            return self._parse_json_content(cached)
+
+        print(f"Invoking Chat Endpoint (JSON mode) with model: {self.chat_model_id} ({self.llm_provider})")
+        
+        payload = self._format_json_messages_for_provider(prompt)
+        raw_content = self._extract_content_from_response(self._post_chat(payload))
+        parsed = self._parse_json_content(raw_content)
+        if key:
+            self.cache.set(key, raw_content, ttl)
+        return parsed
+
+    async def ainvoke_chat(self, prompt: str, node: Optional[str] = None, use_cache: bool = True) -> str:
+        """
+        Async version of invoke_chat; does not block the event loop while waiting on the API.
+        """
+        key, ttl, cached = self._cache_lookup(prompt, False, node, use_cache)
+        if cached is not None:
+            return cached
+
+        print(f"Invoking Chat Endpoint (async) with model: {self.chat_model_id} ({self.llm_provider})")
+
+        payload = self._format_messages_for_provider(prompt)
+        content = self._extract_content_from_response(await self._apost_chat(payload))
+        if key:
+            self.cache.set(key, content, ttl)
+        return content
+
+    async def ainvoke_chat_json(self, prompt: str, node: Optional[str] = None, use_cache: bool = True) -> dict:
+        """
+        Async version of invoke_chat_json.
+        """
+        key, ttl, cached = self._cache_lookup(prompt, True, node, use_cache)
+        if cached is not None:
+            return self._parse_json_content(cached)
+
+        print(f"Invoking Chat Endpoint (async, JSON mode) with model: {self.chat_model_id} ({self.llm_provider})")
+
+        payload = self._format_json_messages_for_provider(prompt)
+        raw_content = self._extract_content_from_response(await self._apost_chat(payload))
+        parsed = self._parse_json_content(raw_content)
+        if key:
+            self.cache.set(key, raw_content, ttl)
+        return parsed
+
+    def stream_chat(self, prompt: str) -> Iterator[str]:
+        """
+        Invokes the chat model with streaming enabled and yields text deltas as they arrive.
+        Streaming responses are never cached.
+        """
+        print(f"Invoking Chat Endpoint (stream) with model: {self.chat_model_id} ({self.llm_provider})")
+
+        payload = self._format_messages_for_provider(prompt)
+        payload["stream"] = True
+        with self.session.post(
+            self.chat_api_url,
+            headers=self._get_chat_headers(),
+            json=payload,
+            timeout=self.timeout,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                token, done = self._parse_stream_line(line)
+                if token:
+                    yield token
+                if done:
+                    break
+
+    async def astream_chat(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Async version of stream_chat.
+        """
+        print(f"Invoking Chat Endpoint (async stream) with model: {self.chat_model_id} ({self.llm_provider})")
+
+        payload = self._format_messages_for_provider(prompt)
+        payload["stream"] = True
+        async with self._get_async_client().stream(
+            "POST",
+            self.chat_api_url,
+            headers=self._get_chat_headers(),
+            json=payload
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                token, done = self._parse_stream_line(line)
+                if token:
+                    yield token
+                if done:
+                    break
+
+    def cache_stats(self) -> dict:
+        """
+        Returns hit/miss counters of the response cache.
+        """
+        return self.cache.get_stats() if self.cache else {"enabled": False}
+
+    def get_embedding(self, text: str, model: Optional[str] = None) -> list[float]:
+        """
+        Generates embedding for a given text through the shared (batched, cached) embedding service.
+        """
+        return get_embedding_service().embed(text, model).tolist()
+
+    def get_embeddings(self, texts: list[str], model: Optional[str] = None) -> list[list[float]]:
+        """
+        Generates embeddings for several texts, batching the uncached ones into as few API calls as possible.
+        """
+        return get_embedding_service().embed_many(texts, model).tolist()
+
+    async def aget_embedding(self, text: str, model: Optional[str] = None) -> list[float]:
+        """
+        Async version of get_embedding. The Gemini SDK call is blocking, so it runs in a worker thread.
+        """
+        return await asyncio.to_thread(self.get_embedding, text, model)
+
+    def close(self):
+        """
+        Closes pooled HTTP connections.
+        """
+        self.session.close()
+
+    async def aclose(self):
         """
-        Generates embedding for a given text using the Gemini API.
+        Closes the async HTTP client of the running event loop.
         """
-        print(f"Generating embedding with Gemini model: {model}")
-        return genai.embed_content(model=model, content=text)['embedding']
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
 
 # Lazy singleton factory to avoid import-time crashes (e.g., in Streamlit)
 _LLM_SINGLETON = None
@@ -4,12 +4,186 @@ Handles short-term and long-term memory storage
 """
 import json
 import os
+import re
 import sqlite3
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Any, Union
+from dataclasses import dataclass
 from pathlib import Path
+from collections import OrderedDict
+import threading
 import hashlib
+import numpy as np
+from .vector_index import VectorIndex
+from .sqlite_pool import SQLiteConnectionManager
+from .memory_writer import MemoryWriter
+from .short_term_memory import ShortTermMemory
+from .memory_export import EXPORT_FORMATS, export_user_memory
+
+# Bumped whenever _migrate() gains a step; stored in PRAGMA user_version
+SCHEMA_VERSION = 3
+
+# Embeddings are stored as BLOBs: a 4-byte magic header followed by the vector
+_EMBEDDING_F32 = b"EF32"  # float32 values
+_EMBEDDING_I8 = b"EI8\x00"  # float32 scale, then int8 values (symmetric quantization)
+
+def _encode_embedding(embedding, fmt: Optional[str] = None) -> Optional[bytes]:
+    """
+    Packs an embedding as float32 (default) or int8 (MEMORY_EMBEDDING_FORMAT=int8, 4x smaller).
+    """
+    if embedding is None:
+        return None
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    fmt = (fmt or os.getenv("MEMORY_EMBEDDING_FORMAT", "float32")).lower()
+    if fmt == "int8":
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = peak / 127 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return _EMBEDDING_I8 + np.float32(scale).tobytes() + quantized.tobytes()
+    return _EMBEDDING_F32 + vector.tobytes()
+
+def _decode_embedding(value) -> Optional[np.ndarray]:
+    """
+    Returns a float32 vector. float32 BLOBs come back as a read-only view over the row's bytes (no copy);
+    legacy JSON text from databases that were not migrated yet is still accepted.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return np.asarray(json.loads(value), dtype=np.float32)
+    header = bytes(value[:4])
+    if header == _EMBEDDING_F32:
+        return np.frombuffer(value, dtype=np.float32, offset=4)
+    if header == _EMBEDDING_I8:
+        scale = np.frombuffer(value, dtype=np.float32, count=1, offset=4)[0]
+        return np.frombuffer(value, dtype=np.int8, offset=8).astype(np.float32) * scale
+    raise ValueError(f"Unknown embedding encoding {header!r}")
+
+def _fold_sql(column: str) -> str:
+    """
+    unicode61 with remove_diacritics 2 folds Vietnamese tone and vowel marks, but "đ" is a letter of its own
+    """
+    return f"replace(replace({column}, 'đ', 'd'), 'Đ', 'D')"
+
+# Contentless FTS5 index over memory_entries, keyed by its rowid and kept in sync by triggers.
+# Text is stored folded, so the delete commands must re-fold the old values the same way.
+_FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS memory_fts USING fts5(
+        question, answer,
+        content='',
+        tokenize="unicode61 remove_diacritics 2"
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS memory_fts_ai AFTER INSERT ON memory_entries BEGIN
+        INSERT INTO memory_fts(rowid, question, answer)
+        VALUES (new.rowid, {_fold_sql('new.question')}, {_fold_sql('new.answer')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS memory_fts_ad AFTER DELETE ON memory_entries BEGIN
+        INSERT INTO memory_fts(memory_fts, rowid, question, answer)
+        VALUES ('delete', old.rowid, {_fold_sql('old.question')}, {_fold_sql('old.answer')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS memory_fts_au AFTER UPDATE OF question, answer ON memory_entries BEGIN
+        INSERT INTO memory_fts(memory_fts, rowid, question, answer)
+        VALUES ('delete', old.rowid, {_fold_sql('old.question')}, {_fold_sql('old.answer')});
+        INSERT INTO memory_fts(rowid, question, answer)
+        VALUES (new.rowid, {_fold_sql('new.question')}, {_fold_sql('new.answer')});
+    END
+    """,
+]
+
+# Per-user aggregates for get_user_statistics, maintained by triggers in the same transaction as each write
+_STATS_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id TEXT PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0,
+        successes INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_intent_stats (
+        user_id TEXT NOT NULL,
+        intent TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, intent)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_tool_stats (
+        user_id TEXT NOT NULL,
+        tool TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, tool)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_daily_stats (
+        user_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day)
+    )
+    """,
+]
+
+def _stats_add_sql(row: str) -> str:
+    """Trigger statements counting row ('new') into the aggregates"""
+    return f"""
+        INSERT INTO user_stats (user_id, total, successes)
+        VALUES ({row}.user_id, 1, CASE WHEN {row}.success THEN 1 ELSE 0 END)
+        ON CONFLICT(user_id) DO UPDATE SET total = total + 1, successes = successes + excluded.successes;
+        INSERT INTO user_intent_stats (user_id, intent, count) VALUES ({row}.user_id, {row}.intent, 1)
+        ON CONFLICT(user_id, intent) DO UPDATE SET count = count + 1;
+        INSERT INTO user_tool_stats (user_id, tool, count)
+        SELECT {row}.user_id, value, 1 FROM json_each({row}.tools_used) WHERE true
+        ON CONFLICT(user_id, tool) DO UPDATE SET count = count + 1;
+        INSERT INTO user_daily_stats (user_id, day, count) VALUES ({row}.user_id, IFNULL(DATE({row}.timestamp), ''), 1)
+        ON CONFLICT(user_id, day) DO UPDATE SET count = count + 1;
+    """
+
+def _stats_remove_sql(row: str) -> str:
+    """Trigger statements taking row ('old') out of the aggregates"""
+    return f"""
+        UPDATE user_stats SET total = total - 1, successes = successes - (CASE WHEN {row}.success THEN 1 ELSE 0 END)
+        WHERE user_id = {row}.user_id;
+        UPDATE user_intent_stats SET count = count - 1 WHERE user_id = {row}.user_id AND intent = {row}.intent;
+        UPDATE user_tool_stats
+        SET count = count - (SELECT COUNT(*) FROM json_each({row}.tools_used) j WHERE j.value = user_tool_stats.tool)
+        WHERE user_id = {row}.user_id AND tool IN (SELECT value FROM json_each({row}.tools_used));
+        UPDATE user_daily_stats SET count = count - 1 WHERE user_id = {row}.user_id AND day = IFNULL(DATE({row}.timestamp), '');
+        DELETE FROM user_stats WHERE user_id = {row}.user_id AND total <= 0;
+        DELETE FROM user_intent_stats WHERE user_id = {row}.user_id AND count <= 0;
+        DELETE FROM user_tool_stats WHERE user_id = {row}.user_id AND count <= 0;
+        DELETE FROM user_daily_stats WHERE user_id = {row}.user_id AND count <= 0;
+    """
+
+_STATS_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS memory_stats_ai AFTER INSERT ON memory_entries BEGIN {_stats_add_sql('new')} END",
+    f"CREATE TRIGGER IF NOT EXISTS memory_stats_ad AFTER DELETE ON memory_entries BEGIN {_stats_remove_sql('old')} END",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS memory_stats_au
+    AFTER UPDATE OF user_id, timestamp, intent, tools_used, success ON memory_entries
+    BEGIN {_stats_remove_sql('old')} {_stats_add_sql('new')} END
+    """,
+]
+
+def _fts_query(text: str) -> Optional[str]:
+    """
+    Turns free text into an FTS5 MATCH expression: quoted terms joined with OR, ranked later by BM25.
+    """
+    terms = []
+    for token in re.findall(r"\w+", text.lower().replace("đ", "d")):
+        if len(token) > 1 and token not in terms:
+            terms.append(token)
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms)
 
 @dataclass
 class MemoryEntry:
@@ -24,7 +198,7 @@ class MemoryEntry:
     tools_used: List[str]
     success: bool
     metadata: Dict[str, Any]
-    embedding: Optional[List[float]] = None
+    embedding: Optional[Union[List[float], np.ndarray]] = None  # float32 array when read from the database
 
 @dataclass
 class MemoryQuery:
@@ -41,12 +215,30 @@ class MemoryManager:
     
     def __init__(self, db_path: str = "memory.db"):
         self.db_path = db_path
-        self.short_term_memory: Dict[str, List[MemoryEntry]] = {}  # session_id -> entries
+        self._connections = SQLiteConnectionManager.from_env(db_path)
+        self.short_term_memory = ShortTermMemory.from_env()  # session_id -> recent entries, bounded
+        # user_id -> VectorIndex over that user's stored embeddings, loaded on first search
+        self._vector_indexes: "OrderedDict[str, VectorIndex]" = OrderedDict()
+        self._vector_lock = threading.Lock()
+        self.max_vector_users = int(os.getenv("MEMORY_VECTOR_MAX_USERS", "64"))
+        # Entries queued without an embedding get one on the writer thread, off the response path
+        self.embed_on_write = os.getenv("MEMORY_VECTOR_SEARCH", "true").strip().lower() in {"1", "true", "yes", "on"}
         self._init_database()
+        # Background writer for add_memory; None means writes happen inline
+        self.writer = MemoryWriter.from_env(self._write_behind_batch)
+    
+    def _wait_for_pending_writes(self, timeout: float = 2.0):
+        """Let queued writes land before user-facing reads (history, statistics, export)"""
+        if self.writer is not None:
+            self.writer.flush(timeout)
+    
+    def _conn(self) -> sqlite3.Connection:
+        """This thread's persistent connection (WAL mode, see sqlite_pool)"""
+        return self._connections.connection()
     
     def _init_database(self):
         """Initialize the SQLite database for long-term memory"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -61,7 +253,7 @@ class MemoryManager:
                 tools_used TEXT NOT NULL,
                 success BOOLEAN NOT NULL,
                 metadata TEXT NOT NULL,
-                embedding TEXT,
+                embedding BLOB,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP
             )
         ''')
@@ -71,57 +263,211 @@ class MemoryManager:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_session_id ON memory_entries(session_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_intent ON memory_entries(intent)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON memory_entries(timestamp)')
+        # Keyset pagination for exports: WHERE user_id = ? ORDER BY timestamp, id
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_timestamp_id ON memory_entries(user_id, timestamp, id)')
         
         conn.commit()
-        conn.close()
+        self._migrate(conn)
+        # Not tied to user_version: a DB first opened without FTS5 gets the index once FTS5 is available
+        if not self._fts_index_exists(conn):
+            self._create_fts_index(conn)
+        self.fts_enabled = self._fts_index_exists(conn)
+
+    @staticmethod
+    def _fts_index_exists(conn: sqlite3.Connection) -> bool:
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'memory_fts'"
+        ).fetchone() is not None
+    
+    def _migrate(self, conn: sqlite3.Connection):
+        """Upgrade an existing memory.db to SCHEMA_VERSION, one step at a time"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        # Version 1 added the full-text index, which _init_database creates whenever it is missing
+        if version < 2:
+            self._migrate_embeddings_to_blob(conn)
+        if version < 3:
+            with conn:
+                for statement in _STATS_TABLES + _STATS_TRIGGERS:
+                    conn.execute(statement)
+                self._populate_statistics(conn)
+        if version < SCHEMA_VERSION:
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+    
+    def _populate_statistics(self, conn: sqlite3.Connection):
+        """Recompute every aggregate from memory_entries; caller manages the transaction"""
+        for table in ("user_stats", "user_intent_stats", "user_tool_stats", "user_daily_stats"):
+            conn.execute(f"DELETE FROM {table}")
+        conn.execute("""
+            INSERT INTO user_stats (user_id, total, successes)
+            SELECT user_id, COUNT(*), SUM(CASE WHEN success THEN 1 ELSE 0 END) FROM memory_entries GROUP BY user_id
+        """)
+        conn.execute("""
+            INSERT INTO user_intent_stats (user_id, intent, count)
+            SELECT user_id, intent, COUNT(*) FROM memory_entries GROUP BY user_id, intent
+        """)
+        conn.execute("""
+            INSERT INTO user_tool_stats (user_id, tool, count)
+            SELECT m.user_id, j.value, COUNT(*) FROM memory_entries m, json_each(m.tools_used) j GROUP BY m.user_id, j.value
+        """)
+        conn.execute("""
+            INSERT INTO user_daily_stats (user_id, day, count)
+            SELECT user_id, IFNULL(DATE(timestamp), ''), COUNT(*) FROM memory_entries GROUP BY user_id, IFNULL(DATE(timestamp), '')
+        """)
+    
+    def rebuild_statistics(self):
+        """Recompute the per-user statistics tables from memory_entries (python -m ai_agent.memory rebuild-stats)"""
+        self._wait_for_pending_writes()
+        conn = self._conn()
+        with conn:
+            self._populate_statistics(conn)
+    
+    def _migrate_embeddings_to_blob(self, conn: sqlite3.Connection, batch_size: int = 500):
+        """Rewrite JSON text embeddings as binary BLOBs, one transaction per batch"""
+        converted = 0
+        while True:
+            rows = conn.execute(
+                "SELECT rowid, embedding FROM memory_entries WHERE typeof(embedding) = 'text' LIMIT ?",
+                (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            with conn:
+                conn.executemany(
+                    "UPDATE memory_entries SET embedding = ? WHERE rowid = ?",
+                    [(_encode_embedding(json.loads(text)) if text else None, rowid) for rowid, text in rows]
+                )
+            converted += len(rows)
+        if converted:
+            print(f"Converted {converted} memory embeddings to binary storage")
+    
+    def _create_fts_index(self, conn: sqlite3.Connection):
+        """Create the full-text index and backfill it from existing rows"""
+        try:
+            with conn:
+                for statement in _FTS_SCHEMA:
+                    conn.execute(statement)
+                self._populate_fts_index(conn)
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5: search_similar_memories falls back to LIKE
+            print(f"FTS5 unavailable, using keyword search for memories: {e}")
+    
+    def _populate_fts_index(self, conn: sqlite3.Connection):
+        conn.execute("INSERT INTO memory_fts(memory_fts) VALUES ('delete-all')")
+        conn.execute(f"""
+            INSERT INTO memory_fts(rowid, question, answer)
+            SELECT rowid, {_fold_sql('question')}, {_fold_sql('answer')} FROM memory_entries
+        """)
+    
+    def rebuild_fts_index(self):
+        """
+        Rebuild the full-text index from memory_entries, e.g. after a VACUUM
+        (which may renumber the rowids the index is keyed by).
+        """
+        if not self.fts_enabled:
+            return
+        conn = self._conn()
+        with conn:
+            self._populate_fts_index(conn)
     
     def add_memory(self, entry: MemoryEntry):
         """Add a memory entry to both short-term and long-term storage"""
         # Add to short-term memory
-        if entry.session_id not in self.short_term_memory:
-            self.short_term_memory[entry.session_id] = []
-        self.short_term_memory[entry.session_id].append(entry)
+        self.short_term_memory.add(entry)
         
-        # Add to long-term memory (database)
-        self._save_to_database(entry)
+        # Add to long-term memory (database), off the response path when write-behind is enabled
+        if self.writer is not None:
+            self.writer.submit(entry)
+        else:
+            self._save_to_database(entry)
+        
+        if entry.embedding is not None:
+            self._index_entry(entry)
+    
+    def _index_entry(self, entry: MemoryEntry):
+        """Keep an already loaded vector index in sync; unloaded users pick the row up on first search"""
+        with self._vector_lock:
+            index = self._vector_indexes.get(entry.user_id)
+        if index is not None:
+            try:
+                index.add([entry.id], entry.embedding)
+            except ValueError as e:
+                # Embedding model changed: rebuild from the database on the next search
+                print(f"Dropping vector index for {entry.user_id}: {e}")
+                with self._vector_lock:
+                    self._vector_indexes.pop(entry.user_id, None)
     
     def _save_to_database(self, entry: MemoryEntry):
         """Save memory entry to SQLite database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO memory_entries 
-            (id, session_id, user_id, timestamp, question, answer, intent, tools_used, success, metadata, embedding)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            entry.id,
-            entry.session_id,
-            entry.user_id,
-            entry.timestamp,
-            entry.question,
-            entry.answer,
-            entry.intent,
-            json.dumps(entry.tools_used),
-            entry.success,
-            json.dumps(entry.metadata),
-            json.dumps(entry.embedding) if entry.embedding else None
-        ))
-        
-        conn.commit()
-        conn.close()
+        self._save_batch([entry])
+    
+    def _write_behind_batch(self, entries: List[MemoryEntry]):
+        """Writer-thread batch: embeds questions still missing a vector (one API call), then saves"""
+        self._embed_missing(entries)
+        self._save_batch(entries)
+        # After the commit, so an index built from a snapshot in between still receives these rows
+        for entry in entries:
+            if entry.embedding is not None:
+                self._index_entry(entry)
+    
+    def _embed_missing(self, entries: List[MemoryEntry]) -> List[MemoryEntry]:
+        missing = [entry for entry in entries if entry.embedding is None]
+        if not missing or not self.embed_on_write:
+            return []
+        try:
+            from .embeddings import get_embedding_service
+            vectors = get_embedding_service().embed_many([entry.question for entry in missing])
+        except Exception as e:
+            # Stored without an embedding: still found by keyword search
+            print(f"Could not embed {len(missing)} memory entries: {e}")
+            return []
+        for entry, vector in zip(missing, vectors):
+            entry.embedding = vector
+        return missing
+    
+    def _save_batch(self, entries: List[MemoryEntry]):
+        """Save memory entries to SQLite database in a single transaction"""
+        conn = self._conn()
+        
+        # Upsert rather than INSERT OR REPLACE: REPLACE deletes without firing the FTS delete trigger
+        with conn:
+            conn.executemany('''
+                INSERT INTO memory_entries 
+                (id, session_id, user_id, timestamp, question, answer, intent, tools_used, success, metadata, embedding)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    session_id = excluded.session_id,
+                    user_id = excluded.user_id,
+                    timestamp = excluded.timestamp,
+                    question = excluded.question,
+                    answer = excluded.answer,
+                    intent = excluded.intent,
+                    tools_used = excluded.tools_used,
+                    success = excluded.success,
+                    metadata = excluded.metadata,
+                    embedding = excluded.embedding
+            ''', [(
+                entry.id,
+                entry.session_id,
+                entry.user_id,
+                entry.timestamp,
+                entry.question,
+                entry.answer,
+                entry.intent,
+                json.dumps(entry.tools_used),
+                entry.success,
+                json.dumps(entry.metadata),
+                _encode_embedding(entry.embedding)
+            ) for entry in entries])
     
     def get_short_term_memory(self, session_id: str, limit: int = 10) -> List[MemoryEntry]:
         """Get recent memory entries for a session"""
-        if session_id not in self.short_term_memory:
-            return []
-        
-        entries = self.short_term_memory[session_id]
-        return entries[-limit:] if limit else entries
+        return self.short_term_memory.get(session_id, limit)
     
     def get_long_term_memory(self, query: MemoryQuery) -> List[MemoryEntry]:
         """Get memory entries from long-term storage based on query"""
-        conn = sqlite3.connect(self.db_path)
+        self._wait_for_pending_writes()
+        conn = self._conn()
         cursor = conn.cursor()
         
         # Build query conditions
@@ -164,32 +510,114 @@ class MemoryManager:
         rows = cursor.fetchall()
         
         # Convert rows to MemoryEntry objects
-        entries = []
-        for row in rows:
-            entry = MemoryEntry(
-                id=row[0],
-                session_id=row[1],
-                user_id=row[2],
-                timestamp=row[3],
-                question=row[4],
-                answer=row[5],
-                intent=row[6],
-                tools_used=json.loads(row[7]),
-                success=bool(row[8]),
-                metadata=json.loads(row[9]),
-                embedding=json.loads(row[10]) if row[10] else None
-            )
-            entries.append(entry)
+        entries = [self._row_to_entry(row) for row in rows]
         
-        conn.close()
         return entries
     
     def search_similar_memories(self, question: str, user_id: str, limit: int = 5) -> List[MemoryEntry]:
-        """Search for similar past questions using simple keyword matching"""
-        # Simple keyword-based search (can be enhanced with embeddings later)
+        """Search for similar past questions, ranked by BM25 over the FTS5 index"""
+        if not self.fts_enabled:
+            return self._search_memories_like(question, user_id, limit)
+        
+        match = _fts_query(question)
+        if not match:
+            return []
+        
+        conn = self._conn()
+        cursor = conn.cursor()
+        try:
+            # Matches in the question weigh more than matches in the answer
+            cursor.execute("""
+                SELECT m.* FROM memory_fts f
+                JOIN memory_entries m ON m.rowid = f.rowid
+                WHERE memory_fts MATCH ? AND m.user_id = ?
+                ORDER BY bm25(memory_fts, 10.0, 1.0), m.timestamp DESC
+                LIMIT ?
+            """, (match, user_id, limit))
+            rows = cursor.fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"FTS search failed, falling back to keyword search: {e}")
+            return self._search_memories_like(question, user_id, limit)
+        
+        return [self._row_to_entry(row) for row in rows]
+    
+    def _get_vector_index(self, user_id: str) -> VectorIndex:
+        """The user's vector index, built from the database on first use (LRU over users)"""
+        with self._vector_lock:
+            index = self._vector_indexes.get(user_id)
+            if index is not None:
+                self._vector_indexes.move_to_end(user_id)
+                return index
+        
+        # Built from a snapshot without waiting on the writer; rows committed after it are caught up below
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT rowid, id, embedding FROM memory_entries WHERE user_id = ? AND embedding IS NOT NULL ORDER BY rowid",
+            (user_id,)
+        ).fetchall()
+        snapshot_rowid = rows[-1][0] if rows else 0
+        ids, vectors = [], []
+        for _, memory_id, blob in rows:
+            ids.append(memory_id)
+            vectors.append(_decode_embedding(blob))
+        if vectors:
+            # Only vectors from the current embedding model (that of the newest row) are comparable
+            dim = vectors[-1].shape[0]
+            ids = [memory_id for memory_id, vector in zip(ids, vectors) if vector.shape[0] == dim]
+            vectors = [vector for vector in vectors if vector.shape[0] == dim]
+        
+        index = VectorIndex(
+            ivf_threshold=int(os.getenv("MEMORY_VECTOR_IVF_THRESHOLD", "20000")),
+            nprobe=int(os.getenv("MEMORY_VECTOR_NPROBE", "8")),
+        )
+        if vectors:
+            index.add(ids, np.stack(vectors))
+        
+        with self._vector_lock:
+            registered = self._vector_indexes.setdefault(user_id, index)
+            self._vector_indexes.move_to_end(user_id)
+            while len(self._vector_indexes) > self.max_vector_users:
+                self._vector_indexes.popitem(last=False)
+        if registered is not index:
+            return registered
+        
+        # Once registered, _index_entry keeps the index current; rows committed since the snapshot are
+        # added here (VectorIndex.add skips ids indexed by both paths)
+        rows = conn.execute(
+            "SELECT id, embedding FROM memory_entries WHERE user_id = ? AND embedding IS NOT NULL AND rowid > ? ORDER BY rowid",
+            (user_id, snapshot_rowid)
+        ).fetchall()
+        late = [(memory_id, _decode_embedding(blob)) for memory_id, blob in rows]
+        dim = index.dim or (late[-1][1].shape[0] if late else None)
+        late = [(memory_id, vector) for memory_id, vector in late if vector.shape[0] == dim]
+        if late:
+            index.add([memory_id for memory_id, _ in late], np.stack([vector for _, vector in late]))
+        return index
+    
+    def search_memories_by_vector(self, embedding: List[float], user_id: str, limit: int = 5,
+                                  min_score: float = 0.0) -> List[MemoryEntry]:
+        """Search for semantically similar past questions by cosine similarity of their embeddings"""
+        matches = [(memory_id, score) for memory_id, score in self._get_vector_index(user_id).search(embedding, limit)
+                   if score >= min_score]
+        if not matches:
+            return []
+        
+        ids = [memory_id for memory_id, _ in matches]
+        sql = f"SELECT * FROM memory_entries WHERE id IN ({','.join('?' * len(ids))})"
+        rows = self._conn().execute(sql, ids).fetchall()
+        if len(rows) < len(ids) and self.writer is not None:
+            # A match was indexed but is still queued for writing
+            self._wait_for_pending_writes()
+            rows = self._conn().execute(sql, ids).fetchall()
+        
+        by_id = {row[0]: self._row_to_entry(row) for row in rows}
+        return [by_id[memory_id] for memory_id, _ in matches if memory_id in by_id]
+    
+    def _search_memories_like(self, question: str, user_id: str, limit: int) -> List[MemoryEntry]:
+        """Keyword matching with LIKE, used when FTS5 is not available"""
         keywords = question.lower().split()
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         # Search for questions containing any of the keywords
@@ -215,88 +643,61 @@ class MemoryManager:
         cursor.execute(sql, params)
         rows = cursor.fetchall()
         
-        entries = []
-        for row in rows:
-            entry = MemoryEntry(
-                id=row[0],
-                session_id=row[1],
-                user_id=row[2],
-                timestamp=row[3],
-                question=row[4],
-                answer=row[5],
-                intent=row[6],
-                tools_used=json.loads(row[7]),
-                success=bool(row[8]),
-                metadata=json.loads(row[9]),
-                embedding=json.loads(row[10]) if row[10] else None
-            )
-            entries.append(entry)
-        
-        conn.close()
-        return entries
+        return [self._row_to_entry(row) for row in rows]
+    
+    @staticmethod
+    def _row_to_entry(row) -> MemoryEntry:
+        return MemoryEntry(
+            id=row[0],
+            session_id=row[1],
+            user_id=row[2],
+            timestamp=row[3],
+            question=row[4],
+            answer=row[5],
+            intent=row[6],
+            tools_used=json.loads(row[7]),
+            success=bool(row[8]),
+            metadata=json.loads(row[9]),
+            embedding=_decode_embedding(row[10])
+        )
     
     def get_user_statistics(self, user_id: str) -> Dict[str, Any]:
-        """Get statistics about user's interaction history"""
-        conn = sqlite3.connect(self.db_path)
+        """Get statistics about user's interaction history from the trigger-maintained aggregates"""
+        self._wait_for_pending_writes()
+        conn = self._conn()
         cursor = conn.cursor()
         
-        # Total interactions
-        cursor.execute("SELECT COUNT(*) FROM memory_entries WHERE user_id = ?", (user_id,))
-        total_interactions = cursor.fetchone()[0]
-        
-        # Success rate
-        cursor.execute("SELECT COUNT(*) FROM memory_entries WHERE user_id = ? AND success = 1", (user_id,))
-        successful_interactions = cursor.fetchone()[0]
+        # Total interactions and success rate
+        row = cursor.execute("SELECT total, successes FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+        total_interactions, successful_interactions = row if row else (0, 0)
         success_rate = (successful_interactions / total_interactions * 100) if total_interactions > 0 else 0
         
         # Most common intents
         cursor.execute("""
-            SELECT intent, COUNT(*) as count 
-            FROM memory_entries 
-            WHERE user_id = ? 
-            GROUP BY intent 
-            ORDER BY count DESC 
+            SELECT intent, count FROM user_intent_stats
+            WHERE user_id = ?
+            ORDER BY count DESC
             LIMIT 5
         """, (user_id,))
         common_intents = [{"intent": row[0], "count": row[1]} for row in cursor.fetchall()]
         
         # Most used tools
         cursor.execute("""
-            SELECT tools_used, COUNT(*) as count 
-            FROM memory_entries 
-            WHERE user_id = ? 
-            GROUP BY tools_used 
-            ORDER BY count DESC 
+            SELECT tool, count FROM user_tool_stats
+            WHERE user_id = ?
+            ORDER BY count DESC
             LIMIT 5
         """, (user_id,))
-        common_tools = []
-        for row in cursor.fetchall():
-            tools = json.loads(row[0])
-            for tool in tools:
-                found = False
-                for item in common_tools:
-                    if item["tool"] == tool:
-                        item["count"] += row[1]
-                        found = True
-                        break
-                if not found:
-                    common_tools.append({"tool": tool, "count": row[1]})
-        
-        common_tools.sort(key=lambda x: x["count"], reverse=True)
-        common_tools = common_tools[:5]
+        common_tools = [{"tool": row[0], "count": row[1]} for row in cursor.fetchall()]
         
         # Recent activity
         cursor.execute("""
-            SELECT DATE(timestamp) as date, COUNT(*) as count 
-            FROM memory_entries 
-            WHERE user_id = ? 
-            GROUP BY DATE(timestamp) 
-            ORDER BY date DESC 
+            SELECT day, count FROM user_daily_stats
+            WHERE user_id = ?
+            ORDER BY day DESC
             LIMIT 7
         """, (user_id,))
-        recent_activity = [{"date": row[0], "count": row[1]} for row in cursor.fetchall()]
-        
-        conn.close()
+        recent_activity = [{"date": row[0] or None, "count": row[1]} for row in cursor.fetchall()]
         
         return {
             "total_interactions": total_interactions,
@@ -308,39 +709,48 @@ class MemoryManager:
     
     def clear_session_memory(self, session_id: str):
         """Clear short-term memory for a specific session"""
-        if session_id in self.short_term_memory:
-            del self.short_term_memory[session_id]
+        self.short_term_memory.clear_session(session_id)
     
     def clear_user_memory(self, user_id: str):
         """Clear all memory for a specific user"""
         # Clear short-term memory
-        sessions_to_remove = []
-        for session_id, entries in self.short_term_memory.items():
-            if entries and entries[0].user_id == user_id:
-                sessions_to_remove.append(session_id)
+        self.short_term_memory.clear_user(user_id)
+        
+        with self._vector_lock:
+            self._vector_indexes.pop(user_id, None)
         
-        for session_id in sessions_to_remove:
-            del self.short_term_memory[session_id]
+        # Pending writes for this user must not land after the delete
+        if self.writer is not None:
+            self.writer.flush()
         
         # Clear long-term memory
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM memory_entries WHERE user_id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM memory_entries WHERE user_id = ?", (user_id,))
     
-    def export_memory(self, user_id: str, format: str = "json") -> str:
-        """Export user's memory to a file"""
-        entries = self.get_long_term_memory(MemoryQuery(user_id=user_id, limit=1000))
-        
-        if format == "json":
-            data = [asdict(entry) for entry in entries]
-            filename = f"memory_export_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            return filename
-        
-        return "Unsupported format"
+    def export_memory(self, user_id: str, format: str = "json", path: Optional[str] = None,
+                      since: Union[str, datetime, None] = None, until: Union[str, datetime, None] = None,
+                      include_embeddings: bool = False, progress=None, resume: bool = True) -> str:
+        """
+        Stream user's memory to a file and return its name.
+        format: json (a single array, the default), jsonl, jsonl.gz or parquet (needs pyarrow). Entries are exported in chunks of
+        MEMORY_EXPORT_CHUNK_SIZE (default: 1000) with no overall cap; since/until bound the timestamp range.
+        Passing the path of an interrupted export resumes it (json/jsonl/jsonl.gz only).
+        """
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format '{format}', expected one of {', '.join(EXPORT_FORMATS)}")
+        self._wait_for_pending_writes()
+        if path is None:
+            path = f"memory_export_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+        
+        chunk_size = max(1, int(os.getenv("MEMORY_EXPORT_CHUNK_SIZE", "1000")))
+        count = export_user_memory(
+            self._conn(), user_id, path, fmt=format, since=since, until=until, chunk_size=chunk_size,
+            include_embeddings=include_embeddings, progress=progress, resume=resume,
+            decode_embedding=_decode_embedding,
+        )
+        print(f"Exported {count} memory entries for {user_id} to {path}")
+        return path
     
     def get_memory_summary(self, user_id: str) -> str:
         """Generate a summary of user's memory"""
@@ -380,3 +790,18 @@ def get_memory_manager() -> MemoryManager:
     if _memory_manager is None:
         _memory_manager = MemoryManager()
     return _memory_manager
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Memory database maintenance")
+    parser.add_argument("command", choices=["rebuild-stats", "rebuild-fts"])
+    parser.add_argument("--db", default="memory.db", help="Path to the memory database")
+    args = parser.parse_args()
+    
+    manager = MemoryManager(args.db)
+    if args.command == "rebuild-stats":
+        manager.rebuild_statistics()
+    else:
+        manager.rebuild_fts_index()
+    print(f"{args.command} done for {args.db}")
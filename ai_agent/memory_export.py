@@ -0,0 +1,210 @@
+"""
+Streaming export of a user's memory entries.
+Rows are read with keyset pagination on (timestamp, id) and written chunk by chunk, so memory use is
+bounded by chunk_size regardless of history size. Text formats keep a checkpoint next to the output
+file and can resume an interrupted export.
+"""
+import os
+import gzip
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+# json: one JSON array; jsonl: one object per line; jsonl.gz: gzip members, one per chunk; parquet: needs pyarrow
+EXPORT_FORMATS = ("json", "jsonl", "jsonl.gz", "parquet")
+
+_COLUMNS = "id, session_id, user_id, timestamp, question, answer, intent, tools_used, success, metadata, embedding"
+
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+def _as_timestamp(value: Union[str, datetime, None]) -> Optional[str]:
+    # Timestamps are stored as ISO strings, so string comparison orders them correctly
+    if value is None:
+        return None
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def _row_to_record(row, include_embeddings: bool, decode_embedding: Callable[[Any], Optional[np.ndarray]]) -> Dict[str, Any]:
+    record = {
+        "id": row[0],
+        "session_id": row[1],
+        "user_id": row[2],
+        "timestamp": row[3],
+        "question": row[4],
+        "answer": row[5],
+        "intent": row[6],
+        "tools_used": json.loads(row[7]),
+        "success": bool(row[8]),
+        "metadata": json.loads(row[9]),
+    }
+    if include_embeddings:
+        embedding = decode_embedding(row[10])
+        record["embedding"] = embedding.tolist() if embedding is not None else None
+    return record
+
+def _iter_chunks(conn: sqlite3.Connection, user_id: str, since: Optional[str], until: Optional[str],
+                 after: Optional[List[str]], chunk_size: int) -> Iterator[list]:
+    """Yields rows in (timestamp, id) order, chunk_size at a time, resuming after the key `after`"""
+    filters = ["user_id = ?"]
+    params: List[Any] = [user_id]
+    if since:
+        filters.append("timestamp >= ?")
+        params.append(since)
+    if until:
+        filters.append("timestamp < ?")
+        params.append(until)
+    base = f"SELECT {_COLUMNS} FROM memory_entries WHERE {' AND '.join(filters)}"
+
+    while True:
+        sql, page_params = base, list(params)
+        if after:
+            sql += " AND (timestamp > ? OR (timestamp = ? AND id > ?))"
+            page_params += [after[0], after[0], after[1]]
+        sql += " ORDER BY timestamp, id LIMIT ?"
+        page_params.append(chunk_size)
+        rows = conn.execute(sql, page_params).fetchall()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        after = [rows[-1][3], rows[-1][0]]
+
+def _count(conn: sqlite3.Connection, user_id: str, since: Optional[str], until: Optional[str]) -> Optional[int]:
+    if not since and not until:
+        row = conn.execute("SELECT total FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+    sql = "SELECT COUNT(*) FROM memory_entries WHERE user_id = ?"
+    params: List[Any] = [user_id]
+    if since:
+        sql += " AND timestamp >= ?"
+        params.append(since)
+    if until:
+        sql += " AND timestamp < ?"
+        params.append(until)
+    return conn.execute(sql, params).fetchone()[0]
+
+class _Checkpoint:
+    """Progress of a text export, saved atomically after every chunk as <path>.checkpoint.json"""
+
+    def __init__(self, path: str, params: Dict[str, Any]):
+        self.path = f"{path}.checkpoint.json"
+        self.params = params
+        self.after: Optional[List[str]] = None
+        self.exported = 0
+        self.offset = 0
+
+    def load(self) -> bool:
+        """Restore progress when a checkpoint for the same export exists"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if state.get("params") != self.params:
+            return False
+        self.after = state["after"]
+        self.exported = state["exported"]
+        self.offset = state["offset"]
+        return True
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"params": self.params, "after": self.after, "exported": self.exported, "offset": self.offset}, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def export_user_memory(conn: sqlite3.Connection, user_id: str, path: str, fmt: str = "json",
+                       since: Union[str, datetime, None] = None, until: Union[str, datetime, None] = None,
+                       chunk_size: int = 1000, include_embeddings: bool = False,
+                       progress: Optional[ProgressCallback] = None, resume: bool = True,
+                       decode_embedding: Callable[[Any], Optional[np.ndarray]] = None) -> int:
+    """
+    Writes every entry of user_id with since <= timestamp < until to path. Returns the number of entries.
+    progress(exported, total) is called after each chunk. With resume=True an interrupted json/jsonl/jsonl.gz
+    export to the same path continues from its checkpoint instead of starting over.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}', expected one of {', '.join(EXPORT_FORMATS)}")
+    since, until = _as_timestamp(since), _as_timestamp(until)
+    total = _count(conn, user_id, since, until)
+
+    def to_records(rows):
+        return [_row_to_record(row, include_embeddings, decode_embedding) for row in rows]
+
+    if fmt == "parquet":
+        return _export_parquet(conn, user_id, path, since, until, chunk_size, include_embeddings, to_records, progress, total)
+
+    params = {"user_id": user_id, "format": fmt, "since": since, "until": until, "include_embeddings": include_embeddings}
+    checkpoint = _Checkpoint(path, params)
+    resumed = resume and os.path.exists(path) and checkpoint.load()
+
+    with open(path, "r+b" if resumed else "wb") as f:
+        if resumed:
+            # Drop anything written after the last checkpoint
+            f.truncate(checkpoint.offset)
+            f.seek(checkpoint.offset)
+            print(f"Resuming memory export to {path} after {checkpoint.exported} entries")
+        elif fmt == "json":
+            f.write(b"[")
+
+        for rows in _iter_chunks(conn, user_id, since, until, checkpoint.after, chunk_size):
+            if fmt == "json":
+                separator = ",\n" if checkpoint.exported else "\n"
+                data = separator + ",\n".join(json.dumps(r, ensure_ascii=False) for r in to_records(rows))
+                f.write(data.encode("utf-8"))
+            else:
+                data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in to_records(rows)).encode("utf-8")
+                # Each chunk is a complete gzip member; concatenated members form a valid .gz file
+                f.write(gzip.compress(data) if fmt == "jsonl.gz" else data)
+            f.flush()
+
+            checkpoint.exported += len(rows)
+            checkpoint.after = [rows[-1][3], rows[-1][0]]
+            checkpoint.offset = f.tell()
+            checkpoint.save()
+            if progress:
+                progress(checkpoint.exported, total)
+
+        if fmt == "json":
+            f.write(b"\n]\n")
+
+    checkpoint.remove()
+    return checkpoint.exported
+
+def _export_parquet(conn, user_id, path, since, until, chunk_size, include_embeddings, to_records, progress, total) -> int:
+    """One zstd-compressed row group per chunk. Parquet files cannot be appended to, so this format does not resume."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet export requires pyarrow (pip install pyarrow); use format='jsonl.gz' instead")
+
+    fields = [
+        ("id", pa.string()), ("session_id", pa.string()), ("user_id", pa.string()), ("timestamp", pa.string()),
+        ("question", pa.string()), ("answer", pa.string()), ("intent", pa.string()),
+        ("tools_used", pa.list_(pa.string())), ("success", pa.bool_()), ("metadata", pa.string()),
+    ]
+    if include_embeddings:
+        fields.append(("embedding", pa.list_(pa.float32())))
+    schema = pa.schema(fields)
+    exported = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for rows in _iter_chunks(conn, user_id, since, until, None, chunk_size):
+            records = to_records(rows)
+            columns = {name: [r[name] for r in records] for name in schema.names}
+            # Free-form metadata is kept as a JSON string column
+            columns["metadata"] = [json.dumps(m, ensure_ascii=False) for m in columns["metadata"]]
+            writer.write_table(pa.table(columns, schema=schema))
+            exported += len(rows)
+            if progress:
+                progress(exported, total)
+    return exported
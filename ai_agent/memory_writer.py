@@ -0,0 +1,161 @@
+"""
+Write-behind persistence for memory entries.
+add_memory enqueues; a dedicated thread drains the bounded queue and writes entries in batches,
+one transaction per batch, so turn latency does not include SQLite I/O.
+"""
+import os
+import time
+import queue
+import atexit
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+_STOP = object()
+
+class MemoryWriter:
+    """
+    Bounded queue + background writer thread.
+    - submit() never blocks longer than put_timeout; when the queue stays full the entry is
+      written synchronously by the caller (backpressure instead of unbounded growth).
+    - flush() waits until everything submitted so far is on disk; close() flushes and stops the thread.
+    """
+    def __init__(self, write_batch: Callable[[List[Any]], None], max_queue: int = 1000, batch_size: int = 50,
+                 put_timeout: float = 0.05, flush_interval: float = 0.2):
+        self._write_batch = write_batch
+        self.batch_size = max(1, batch_size)
+        self.put_timeout = put_timeout
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "written": 0, "batches": 0, "failed": 0,
+                       "sync_fallbacks": 0, "max_queue_depth": 0, "last_batch_ms": 0.0}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, write_batch: Callable[[List[Any]], None]) -> Optional["MemoryWriter"]:
+        """
+        Builds the writer from environment variables, or returns None when disabled.
+
+        - MEMORY_WRITE_BEHIND: "true/false" (default: true)
+        - MEMORY_WRITER_QUEUE_SIZE: max pending entries (default: 1000)
+        - MEMORY_WRITER_BATCH_SIZE: max entries per transaction (default: 50)
+        - MEMORY_WRITER_PUT_TIMEOUT: seconds to wait for queue space before writing synchronously (default: 0.05)
+        """
+        if os.getenv("MEMORY_WRITE_BEHIND", "true").strip().lower() not in {"1", "true", "yes", "on"}:
+            return None
+        return cls(
+            write_batch,
+            max_queue=int(os.getenv("MEMORY_WRITER_QUEUE_SIZE", "1000")),
+            batch_size=int(os.getenv("MEMORY_WRITER_BATCH_SIZE", "50")),
+            put_timeout=float(os.getenv("MEMORY_WRITER_PUT_TIMEOUT", "0.05")),
+        )
+
+    def submit(self, entry: Any):
+        if self._closed:
+            self._write_sync(entry)
+            return
+        try:
+            self._queue.put(entry, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats["sync_fallbacks"] += 1
+            print("Memory write queue is full; writing synchronously")
+            self._write_sync(entry)
+            return
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+
+    def _write_sync(self, entry: Any):
+        self._write_batch([entry])
+        with self._lock:
+            self._stats["written"] += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Pick up whatever else is already queued, up to one batch
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=self.flush_interval if len(batch) == 1 else 0))
+                except queue.Empty:
+                    break
+
+            stop = any(entry is _STOP for entry in batch)
+            entries = [entry for entry in batch if entry is not _STOP]
+            if entries:
+                self._flush_batch(entries)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _flush_batch(self, entries: List[Any]):
+        start = time.time()
+        try:
+            self._write_batch(entries)
+            written, failed = len(entries), 0
+        except Exception as e:
+            print(f"Memory batch write failed ({e}); retrying entries one by one")
+            written = failed = 0
+            for entry in entries:
+                try:
+                    self._write_batch([entry])
+                    written += 1
+                except Exception as entry_error:
+                    failed += 1
+                    print(f"Dropping memory entry that could not be written: {entry_error}")
+        with self._lock:
+            self._stats["written"] += written
+            self._stats["failed"] += failed
+            self._stats["batches"] += 1
+            self._stats["last_batch_ms"] = round((time.time() - start) * 1000, 2)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until all submitted entries are written. Returns False on timeout.
+        """
+        if not self._thread.is_alive():
+            return self._queue.unfinished_tasks == 0
+        if timeout is None:
+            self._queue.join()
+            return True
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """
+        Writes out everything still queued and stops the writer thread. Safe to call more than once.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"Memory writer did not finish within {timeout}s; {self._queue.qsize()} entries pending")
+            return
+        # Entries that raced in behind the stop marker
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        if leftovers:
+            self._flush_batch(leftovers)
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
@@ -1,8 +1,28 @@
+"""
+Node: CATALOGER
+Loads the cached database schema catalog and exposes a compact summary to the planner.
+"""
+import asyncio
 from ..state import AgentState
+from ..tools.catalog import get_catalog, summarize_catalog
 
 def gather_catalog(state: AgentState) -> dict:
     """
-    Placeholder function for catalog gathering.
+    Populates state.catalog from the schema catalog cache (introspecting only when the schema changed).
     """
-    print("--- Node: CATALOGER (Placeholder) ---")
-    return {"catalog": "No catalog available in the new architecture."}
\ No newline at end of file
+    print("--- Node: CATALOGER ---")
+    try:
+        catalog = get_catalog()
+    except Exception as e:
+        print(f"Error loading schema catalog: {e}")
+        catalog = None
+    summary = summarize_catalog(catalog)
+    if catalog is not None:
+        print(f"Schema catalog ready: {len(catalog.tables)} tables")
+    return {"catalog": summary}
+
+async def agather_catalog(state: AgentState) -> dict:
+    """
+    Async version of gather_catalog. Introspection uses the blocking driver, so it runs in a worker thread.
+    """
+    return await asyncio.to_thread(gather_catalog, state)
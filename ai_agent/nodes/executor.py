@@ -1,93 +1,202 @@
 import json
-from typing import Dict, Any
-from ..state import AgentState, Observation
-from ..tools import knowledge_graph, rag, database, web, google_search
-from ..tools import github as github_tool
+import asyncio
+from typing import Dict, Any, List, Optional
+import psycopg2
+import requests
+from ..state import AgentState, Observation, Step, FailureContext
+from ..scheduler import (
+    step_keys, next_wave, get_max_parallel_steps, run_wave, arun_wave,
+    remaining_budget, backoff_delay, run_with_deadline, StepTimeout, call_deadline, get_timeout_grace,
+)
+from ..tools.registry import get_tool_spec
+from ..tools.database import ToolError
+from ..tools.pg_pool import statement_timeout
+from ..tools.result_cache import get_tool_result_cache, make_signature
 import time # For latency metrics
 
+def _prepare_wave(state: AgentState):
+    """
+    Validates the plan and returns (early_result, wave_indices, step_keys).
+    A wave is every pending step whose depends_on are already completed.
+    """
+    # Validate plan
+    if not state.plan or not state.plan.steps:
+        return {"errors": state.errors + ["No plan or steps available for execution"]}, [], []
+
+    wave = next_wave(state.plan.steps, state.completed_steps)
+    if not wave:
+        # All steps completed, go to final synthesis
+        return {"final_answer": "All steps in the plan have been completed successfully."}, [], []
+
+    return None, wave, step_keys(state.plan.steps)
+
+def _merge_wave(state: AgentState, wave: List[int], keys: List[str], observations: List[Observation]) -> dict:
+    """
+    Merges the wave's observations back into state in plan order.
+    """
+    wave_keys = [keys[idx] for idx in wave]
+    completed_steps = state.completed_steps + wave_keys
+    signatures = {obs.metrics["signature"] for obs in observations if obs.metrics.get("signature")}
+    failure_context = None
+    for idx, obs in zip(wave, observations):
+        if not obs.ok and obs.error:
+            failure_context = FailureContext(
+                step_id=obs.step_id,
+                action=obs.tool,
+                input=state.plan.steps[idx].input,
+                error_code=obs.error.get("code"),
+                summary=obs.error.get("summary"),
+                detail=obs.error.get("detail"),
+                hint=obs.error.get("hint"),
+                details=obs.error.get("details") or {},
+            )
+    return {
+        "failure_context": failure_context,
+        "visited_signatures": set(state.visited_signatures) | signatures,
+        "last_observation": observations[-1],
+        "observations": state.observations + observations,
+        "completed_steps": completed_steps,
+        "last_step_ids": wave_keys,
+        "step_idx": len(completed_steps),
+    }
+
+def _max_parallel_steps(state: AgentState) -> int:
+    return get_max_parallel_steps(state.limits.max_parallel_steps if state.limits else None)
+
 def execute_action(state: AgentState) -> dict:
     print("--- Node: ACTION EXECUTION ---")
     print(f"State.plan type: {type(state.plan)}")
     print(f"State.plan: {state.plan}")
-    
-    # Validate plan and step_idx
-    if not state.plan or not state.plan.steps:
-        return {"errors": state.errors + ["No plan or steps available for execution"]}
-    
-    if state.step_idx >= len(state.plan.steps):
-        # All steps completed, go to final synthesis
-        return {"final_answer": "All steps in the plan have been completed successfully."}
-    
-    current_step = state.plan.steps[state.step_idx] # Assuming plan is a list of Step objects
+
+    early_result, wave, keys = _prepare_wave(state)
+    if early_result is not None:
+        return early_result
+
+    print(f"Executing wave of {len(wave)} step(s): {[keys[idx] for idx in wave]}")
+    steps = state.plan.steps
+    observations = run_wave(lambda idx: _execute_step(steps[idx], keys[idx], state.turn_deadline), wave, _max_parallel_steps(state))
+    return _merge_wave(state, wave, keys, observations)
+
+async def aexecute_action(state: AgentState) -> dict:
+    """
+    Async version of execute_action. Tool drivers are blocking, so each step runs in a worker thread.
+    """
+    print("--- Node: ACTION EXECUTION (async) ---")
+
+    early_result, wave, keys = _prepare_wave(state)
+    if early_result is not None:
+        return early_result
+
+    print(f"Executing wave of {len(wave)} step(s): {[keys[idx] for idx in wave]}")
+    steps = state.plan.steps
+
+    async def run_step(idx: int) -> Observation:
+        return await asyncio.to_thread(_execute_step, steps[idx], keys[idx], state.turn_deadline)
+
+    observations = await arun_wave(run_step, wave, _max_parallel_steps(state))
+    return _merge_wave(state, wave, keys, observations)
+
+def _is_retriable(e: Exception) -> bool:
+    """
+    Failures worth retrying: tool errors marked retriable, timeouts and dropped connections.
+    """
+    if isinstance(e, ToolError):
+        return bool(e.retriable)
+    return isinstance(e, (StepTimeout, TimeoutError, ConnectionError, requests.ConnectionError,
+                          requests.Timeout, psycopg2.OperationalError))
+
+def _error_data(e: Exception) -> Dict[str, Any]:
+    if isinstance(e, ToolError):
+        return {**e.to_dict(), "summary": f"{e.summary}: {e.detail}"}
+    code = "TIMEOUT" if isinstance(e, StepTimeout) else type(e).__name__
+    return {"code": code, "summary": str(e), "detail": str(e), "retriable": _is_retriable(e)}
+
+def _execute_step(current_step: Step, step_key: str, turn_deadline: Optional[float] = None) -> Observation:
+    """
+    Runs a single plan step and wraps the outcome in an Observation.
+    Each attempt is bounded by min(step/tool timeout, remaining turn budget); retriable failures
+    of idempotent tools are retried with exponential backoff while the retry and time budgets allow.
+    """
     tool_name = current_step.action.value  # Use action.value to get the string
     tool_input = current_step.input
-    
-    # Placeholder for execution_context (session_id, trace_id, timeout, pii_policy)
-    # For now, we'll use dummy values or retrieve from state if available
-    execution_context = state.execution_context or {}
 
     start_time = time.time()
     
     result_data = {}
     error_data = None
     ok_status = True
+    spec = None
+    attempt = 0
+    retries_left = 0
+    signature = None
+    cache_hit = False
 
     try:
         # --- Tool Execution Logic ---
-        # PostgreSQL Tools
-        if tool_name == "sql.list_tables":
-            schemas = tool_input.get("schemas")
-            include_system = tool_input.get("include_system", False)
-            result_data = database.list_tables(schemas=schemas, include_system=include_system)
-        elif tool_name == "sql.custom_query":
-            result_data = database.execute_custom_query(**tool_input)
-        elif tool_name == "sql.describe_table":
-            result_data = database.describe_table(**tool_input)
-        elif tool_name == "sql.get_table_info":
-            result_data = database.get_table_info(**tool_input)
-        elif tool_name == "sql.search_in_table":
-            result_data = database.search_in_table(**tool_input)
-        elif tool_name == "sql.get_distinct_values":
-            result_data = database.get_distinct_values(**tool_input)
-        elif tool_name == "sql.get_table_stats":
-            result_data = database.get_table_statistics(**tool_input)
-        elif tool_name == "sql.find_related_tables":
-            result_data = database.find_related_tables(**tool_input)
-        elif tool_name == "sql.get_schema":
-            result_data = database.get_schema()
-        
-        # Milvus Tools
-        elif tool_name == "milvus.list_collections":
-            result_data = rag.list_milvus_collections(**tool_input)
-        elif tool_name == "milvus.describe_index":
-            result_data = rag.describe_milvus_index(**tool_input)
-        elif tool_name == "rag.search":
-            result_data = rag.search(**tool_input)
-        
-        # Neo4j Tools
-        elif tool_name == "kg.query":
-            result_data = knowledge_graph.query(**tool_input)
-        
-        # General Tools
-        elif tool_name == "google.search":
-            result_data = google_search.search(**tool_input)
-        elif tool_name == "http.get":
-            result_data = web.get(**tool_input)
-        elif tool_name == "github.request":
-            result_data = github_tool.request(**tool_input)
-        elif tool_name == "plan.note":
-            result_data = {"note": tool_input.get("note", "No note provided")}
-        
-        else:
-            raise ValueError(f"Tool '{tool_name}' not implemented for direct execution.")
+        # O(1) dispatch through the registry; inputs are validated against the tool's schema
+        spec = get_tool_spec(current_step.action)
+        kwargs = spec.prepare_input(tool_input)
+        signature = make_signature(tool_name, kwargs)
+        # The planner's timeout_s only counts when it was set explicitly; otherwise use the tool's own
+        timeout_s = current_step.timeout_s if "timeout_s" in current_step.model_fields_set else spec.timeout_s
+        idempotent = spec.is_idempotent(kwargs)
+        retries_left = min(current_step.max_retries, spec.retry.max_retries) if idempotent else 0
+
+        # Identical calls (same action + normalized input) are served from the result cache;
+        # non-idempotent calls such as github.request POST always run
+        cache = get_tool_result_cache()
+        use_cache = cache is not None and spec.cacheable and idempotent
+        if use_cache:
+            cached = cache.get(signature)
+            if cached is not None:
+                print(f"Cache hit for {tool_name} ({signature[:12]})")
+                result_data = cached
+                cache_hit = True
+        elif cache is not None:
+            cache.record_bypass()
+
+        while not cache_hit:
+            attempt += 1
+            remaining = remaining_budget(turn_deadline)
+            if remaining is not None and remaining <= 0:
+                raise ToolError("TURN_BUDGET_EXCEEDED", "turn_budget_exceeded",
+                                "The turn's time budget is exhausted; step was not run", retriable=False)
+            deadline_s = timeout_s if remaining is None else min(timeout_s, remaining)
+            try:
+                # Drivers enforce deadline_s themselves (statement_timeout, transaction and request timeouts);
+                # the thread deadline is only a backstop for calls that ignore it
+                with call_deadline(deadline_s), statement_timeout(int(deadline_s * 1000)):
+                    result_data = run_with_deadline(lambda: spec.invoke(kwargs), deadline_s + get_timeout_grace())
+                break
+            except Exception as e:
+                if retries_left <= 0 or not _is_retriable(e):
+                    raise
+                delay = backoff_delay(attempt, spec.retry.backoff_base_s, spec.retry.backoff_max_s)
+                remaining = remaining_budget(turn_deadline)
+                if remaining is not None and remaining <= delay:
+                    raise
+                backoff_start = time.time()
+                if isinstance(e, StepTimeout) and e.worker is not None:
+                    # Never start a second copy while the abandoned call still holds its connection
+                    # and concurrency slot
+                    e.worker.join(delay)
+                    if e.worker.is_alive():
+                        print(f"Attempt {attempt} of {tool_name} is still running after its deadline; not retrying")
+                        raise
+                retries_left -= 1
+                print(f"Attempt {attempt} of {tool_name} failed ({e}); retrying in {delay:.2f}s ({retries_left} retries left)")
+                time.sleep(max(0.0, delay - (time.time() - backoff_start)))
 
         # Ensure result_data is a dictionary
         if not isinstance(result_data, dict):
             result_data = {"result": result_data, "type": type(result_data).__name__}
 
+        if use_cache and not cache_hit and not result_data.get("error"):
+            cache.set(signature, result_data, cache.ttl_for(tool_name, spec.cache_ttl_s))
+
     except Exception as e:
         ok_status = False
-        error_data = {"summary": str(e), "detail": str(e)} # Basic error for now
+        error_data = _error_data(e)
         print(f"Error executing tool {tool_name}: {e}")
         result_data = {}  # Ensure result_data is a dict even on error
 
@@ -95,19 +204,24 @@ def execute_action(state: AgentState) -> dict:
     latency_ms = (end_time - start_time) * 1000
 
     # Placeholder for metrics and safety
-    metrics = {"latency_ms": latency_ms, "tokens_input": 0, "tokens_output": 0, "cost_estimate": 0}
+    metrics = {
+        "latency_ms": latency_ms,
+        "tokens_input": 0,
+        "tokens_output": 0,
+        "cost_estimate": spec.cost_weight if spec else 0,
+        "retries_left": retries_left,
+        "cache_hit": cache_hit,
+        "signature": signature,
+    }
     safety = {"pii_redacted": False, "notes": ""}
 
-    observation = Observation(
-        step_id=current_step.id or f"step_{state.step_idx}",  # Use fallback if id is None
+    return Observation(
+        step_id=step_key,
         tool=tool_name,
-        attempt=1, # Assuming first attempt for now
+        attempt=attempt,
         ok=ok_status,
         data=result_data,
         error=error_data,
         metrics=metrics,
         safety=safety
     )
-    
-    # Update state with last_observation and add to observations list
-    return {"last_observation": observation, "observations": state.observations + [observation]}
\ No newline at end of file
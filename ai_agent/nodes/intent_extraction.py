@@ -4,44 +4,49 @@ from ..state import AgentState, Task
 from ..prompts.intent_extraction_prompt import get_intent_extraction_prompt
 from ..llm_client import get_llm_client
 
-def extract_intent(state: AgentState) -> dict:
-    print("--- Node: INTENT EXTRACTION ---")
+def _build_prompt(state: AgentState) -> str:
     user_message = state.question # Assuming user's question is in state.question
     chat_history = state.chat_history # Assuming chat history is in state.chat_history
     org_policies = [] # Placeholder for organization policies
     defaults = {"deliverable_format": "markdown", "locale": "vi", "tone": "neutral"} # Placeholder for defaults
     tool_inventory = state.tool_inventory # Assuming tool inventory is in state.tool_inventory
 
-    prompt = get_intent_extraction_prompt(user_message, chat_history, org_policies, defaults, tool_inventory)
+    return get_intent_extraction_prompt(user_message, chat_history, org_policies, defaults, tool_inventory)
+
+def _parse_task(response_json: dict) -> Task:
+    print(f"LLM parsed JSON for Intent Extraction: {response_json}")
+
+    # Validate against expected schema (basic check for now)
+    # Map fields from LLM response to Task model fields
+    if "intent" in response_json:
+        response_json["intent_summary"] = response_json.pop("intent")
+
+    # Map 'acceptance_criteria' to 'acceptance' if present
+    if "acceptance_criteria" in response_json and "acceptance" not in response_json:
+        response_json["acceptance"] = response_json.pop("acceptance_criteria")
+
+    if not all(k in response_json for k in ["intent_summary", "acceptance", "priority"]):
+        raise ValueError("Missing required fields in Intent Extraction JSON.")
+
+    return Task(**response_json)
+
+def extract_intent(state: AgentState) -> dict:
+    print("--- Node: INTENT EXTRACTION ---")
+    prompt = _build_prompt(state)
 
     # Implement retry logic for JSON output
     for attempt in range(3): # Max 3 attempts
         try:
-            response_json = get_llm_client().invoke_chat_json(prompt)
-            print(f"LLM parsed JSON for Intent Extraction: {response_json}")
-
-            # Validate against expected schema (basic check for now)
-            # Validate against expected schema (basic check for now)
-            # Map fields from LLM response to Task model fields
-            if "intent" in response_json:
-                response_json["intent_summary"] = response_json.pop("intent")
-            
-            # Map 'acceptance_criteria' to 'acceptance' if present
-            if "acceptance_criteria" in response_json and "acceptance" not in response_json:
-                response_json["acceptance"] = response_json.pop("acceptance_criteria")
-
-            if not all(k in response_json for k in ["intent_summary", "acceptance", "priority"]):
-                raise ValueError("Missing required fields in Intent Extraction JSON.")
-
+            response_json = get_llm_client().invoke_chat_json(prompt, node="intent_extraction", use_cache=attempt == 0)
             # If successful, return the task
-            return {"task": Task(**response_json)}
+            return {"task": _parse_task(response_json)}
 
         except (json.JSONDecodeError, ValueError) as e:
             print(f"Intent Extraction failed (attempt {attempt + 1}): {e}")
             if attempt < 2: # If not last attempt, try to fix JSON
                 print("Re-invoking LLM with original prompt to fix JSON.")
                 # Re-invoke with original prompt
-                prompt = get_intent_extraction_prompt(user_message, chat_history, org_policies, defaults, tool_inventory)
+                prompt = _build_prompt(state)
             else:
                 print("Max retries reached for Intent Extraction. Returning error.")
                 return {"errors": state.errors + [f"Intent Extraction failed after multiple retries: {e}"]}
@@ -49,5 +54,30 @@ def extract_intent(state: AgentState) -> dict:
             print(f"An unexpected error occurred during Intent Extraction: {e}")
             return {"errors": state.errors + [f"Unexpected error in Intent Extraction: {e}"]}
 
-    print(f"Intent Extraction returning errors: {state.errors + ["Intent Extraction failed due to unknown reason."]}")
+    errors = state.errors + ["Intent Extraction failed due to unknown reason."]
+    print(f"Intent Extraction returning errors: {errors}")
+    return {"errors": errors}
+
+async def aextract_intent(state: AgentState) -> dict:
+    """
+    Async version of extract_intent.
+    """
+    print("--- Node: INTENT EXTRACTION (async) ---")
+    prompt = _build_prompt(state)
+
+    for attempt in range(3): # Max 3 attempts
+        try:
+            response_json = await get_llm_client().ainvoke_chat_json(prompt, node="intent_extraction", use_cache=attempt == 0)
+            return {"task": _parse_task(response_json)}
+
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"Intent Extraction failed (attempt {attempt + 1}): {e}")
+            if attempt >= 2:
+                print("Max retries reached for Intent Extraction. Returning error.")
+                return {"errors": state.errors + [f"Intent Extraction failed after multiple retries: {e}"]}
+            print("Re-invoking LLM with original prompt to fix JSON.")
+        except Exception as e:
+            print(f"An unexpected error occurred during Intent Extraction: {e}")
+            return {"errors": state.errors + [f"Unexpected error in Intent Extraction: {e}"]}
+
     return {"errors": state.errors + ["Intent Extraction failed due to unknown reason."]}
@@ -2,12 +2,44 @@
 Node: MEMORY HANDLER
 Handles memory operations including retrieval and storage
 """
+import os
+import asyncio
 import hashlib
 import uuid
 from datetime import datetime
 from typing import Dict, Any
 from ..state import AgentState
 from ..memory import get_memory_manager, MemoryEntry, MemoryQuery
+from ..embeddings import get_embedding_service
+
+def _vector_search_enabled() -> bool:
+    return os.getenv("MEMORY_VECTOR_SEARCH", "true").strip().lower() in {"1", "true", "yes", "on"}
+
+def _embed_question(question: str):
+    """
+    Embedding of the question, or None when embeddings are unavailable.
+    Passed on to store_memory through state; turns that skip recall are embedded by the memory writer.
+    """
+    if not _vector_search_enabled():
+        return None
+    try:
+        return get_embedding_service().embed(question).tolist()
+    except Exception as e:
+        print(f"Could not embed question for memory: {e}")
+        return None
+
+def _merge_ranked(result_lists, limit: int):
+    """
+    Reciprocal rank fusion of several ranked MemoryEntry lists, deduplicated by id.
+    """
+    scores = {}
+    entries = {}
+    for results in result_lists:
+        for rank, entry in enumerate(results):
+            scores[entry.id] = scores.get(entry.id, 0.0) + 1.0 / (60 + rank)
+            entries.setdefault(entry.id, entry)
+    ranked = sorted(scores, key=lambda memory_id: scores[memory_id], reverse=True)
+    return [entries[memory_id] for memory_id in ranked[:limit]]
 
 def handle_memory(state: AgentState) -> dict:
     """
@@ -24,12 +56,21 @@ def handle_memory(state: AgentState) -> dict:
     user_id = state.profile.get("user_id", "default_user")
     session_id = state.execution_context.session_id if state.execution_context else "default_session"
     
-    # Search for similar memories
+    # Search for similar memories: BM25 keyword matches plus semantic matches from the in-process vector index
     similar_memories = memory_manager.search_similar_memories(
         question=state.question,
         user_id=user_id,
         limit=3
     )
+    question_embedding = _embed_question(state.question)
+    if question_embedding is not None:
+        semantic_memories = memory_manager.search_memories_by_vector(
+            question_embedding,
+            user_id=user_id,
+            limit=3,
+            min_score=float(os.getenv("MEMORY_VECTOR_MIN_SCORE", "0.75"))
+        )
+        similar_memories = _merge_ranked([semantic_memories, similar_memories], limit=3)
     
     # Convert similar memories to dict format for state
     similar_memories_dict = []
@@ -54,6 +95,7 @@ def handle_memory(state: AgentState) -> dict:
     
     return {
         "memory_id": memory_id,
+        "memory_embedding": question_embedding,
         "similar_memories": similar_memories_dict,
         "memory_context": memory_context
     }
@@ -100,7 +142,9 @@ def store_memory(state: AgentState) -> dict:
         intent=state.intent,
         tools_used=tools_used,
         success=success,
-        metadata=metadata
+        metadata=metadata,
+        # Computed during recall; when recall was skipped the background writer embeds the question
+        embedding=state.memory_embedding
     )
     
     # Store in memory
@@ -110,6 +154,18 @@ def store_memory(state: AgentState) -> dict:
     
     return {"memory_stored": True, "memory_id": memory_entry.id}
 
+async def ahandle_memory(state: AgentState) -> dict:
+    """
+    Async version of handle_memory. SQLite access is blocking, so it runs in a worker thread.
+    """
+    return await asyncio.to_thread(handle_memory, state)
+
+async def astore_memory(state: AgentState) -> dict:
+    """
+    Async version of store_memory.
+    """
+    return await asyncio.to_thread(store_memory, state)
+
 def get_memory_statistics(user_id: str) -> Dict[str, Any]:
     """
     Get memory statistics for a user
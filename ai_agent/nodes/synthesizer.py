@@ -1,5 +1,6 @@
 import json
 from typing import Dict, Any
+from langgraph.config import get_stream_writer
 from ..state import AgentState
 from ..prompts.final_synthesis_prompt import get_final_synthesis_prompt
 from ..llm_client import get_llm_client
@@ -49,6 +50,10 @@ def format_database_results(observations: list) -> str:
                     
                     formatted_results.append("")
                     formatted_results.append(f"**Tổng số dòng:** {len(rows)}")
+                    if obs.data.get("truncated"):
+                        estimated_total = obs.data.get("estimated_total")
+                        total_text = f"~{estimated_total}" if estimated_total else "không rõ"
+                        formatted_results.append(f"*Kết quả đã bị cắt bớt (ước tính tổng: {total_text} dòng)*")
                     formatted_results.append("")
         
         # PostgreSQL: Handle describe_table results
@@ -120,78 +125,159 @@ def format_database_results(observations: list) -> str:
     
     return "\n".join(formatted_results)
 
-def synthesize_final_answer(state: AgentState) -> dict:
-    print("--- Node: FINAL SYNTHESIS ---")
-    
+def _get_token_writer():
+    """
+    Returns LangGraph's custom stream writer, or a no-op when the node runs outside a graph.
+    Tokens are emitted as {"token": str} chunks on the "custom" stream mode.
+    """
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda chunk: None
+
+def _emit_tail(writer, response_str: str, result: dict):
+    """
+    Streams the part of the final answer that was appended after the LLM response (formatted tables).
+    """
+    final_answer = result.get("final_answer")
+    if isinstance(final_answer, str) and len(final_answer) > len(response_str):
+        writer({"token": final_answer[len(response_str):]})
+
+def _check_synthesis_inputs(state: AgentState):
+    """
+    Returns an early node result when the full LLM synthesis is not needed or not possible.
+    """
     # If router already provided a final answer, return it directly
     if state.final_answer:
         return {"final_answer": state.final_answer}
-    
+
     # Check if we have the required components for complex synthesis
     if not state.task:
         return {"final_answer": "Error: Task not available for final synthesis."}
     if not state.plan:
         return {"final_answer": "Error: Plan not available for final synthesis."}
-    
+    return None
+
+def _build_prompt(state: AgentState) -> tuple:
+    """
+    Builds the synthesis prompt and returns it with the expected deliverable format.
+    """
     # Add memory context if available
     memory_context = ""
     if state.memory_context:
         memory_context = f"\n\n{state.memory_context}"
-    
+
     # Handle acceptance - it might be a string or dict
     acceptance = state.task.acceptance
     if isinstance(acceptance, str):
         acceptance = {"deliverable_format": "markdown", "success_condition": acceptance}
     elif not isinstance(acceptance, dict):
         acceptance = {"deliverable_format": "markdown", "success_condition": str(acceptance)}
-    
+
     plan = state.plan # Assuming state.plan is the final plan object
     observations = state.observations # Assuming state.observations is a list of Observation objects
     format_hints = {} # Placeholder for format hints
 
     prompt = get_final_synthesis_prompt(acceptance, plan.dict(), [obs.dict() for obs in observations], format_hints)
-    
+
     # Add memory context to prompt if available
     if memory_context:
         prompt += f"\n\n**Memory Context:**{memory_context}"
 
     # Determine expected output format
     deliverable_format = acceptance.get("deliverable_format", "markdown")
+    return prompt, deliverable_format
+
+def _finalize_answer(state: AgentState, response_str: str, deliverable_format: str) -> dict:
+    # Debug: Print response type and content
+    print(f"Response type: {type(response_str)}")
+    print(f"Response content: {response_str[:200]}...")
+
+    if deliverable_format == "markdown":
+        # Check if we have database results to format
+        database_formatted = format_database_results(state.observations)
+        if database_formatted:
+            # Combine LLM response with formatted database results
+            final_answer = response_str + "\n\n" + database_formatted
+        else:
+            final_answer = response_str
+    else: # json or custom
+        # Implement retry logic for JSON output
+        for attempt in range(3): # Max 3 attempts
+            try:
+                final_answer = json.loads(response_str)
+                break # Exit loop if successful
+            except json.JSONDecodeError as e:
+                print(f"Final Synthesis JSON output failed (attempt {attempt + 1}): {e}")
+                if attempt < 2: # If not last attempt, try to fix JSON
+                    print("Attempting to fix JSON by re-prompting LLM.")
+                    # Re-prompt with instruction to fix JSON
+                    prompt = f"{response_str}\n\nBạn đã trả JSON sai schema, hãy giữ nguyên nội dung nhưng sửa thành JSON hợp lệ theo schema đã cho. ONLY JSON."
+                else:
+                    print("Max retries reached for Final Synthesis JSON. Returning error.")
+                    return {"errors": state.errors + [f"Final Synthesis JSON output failed after multiple retries: {e}"]}
+        else: # This else block executes if the loop completes without a break
+            final_answer = response_str # Fallback if JSON parsing consistently fails
+
+    return {"final_answer": final_answer}
+
+def synthesize_final_answer(state: AgentState) -> dict:
+    print("--- Node: FINAL SYNTHESIS ---")
+
+    writer = _get_token_writer()
+    early_result = _check_synthesis_inputs(state)
+    if early_result is not None:
+        writer({"token": early_result["final_answer"]})
+        return early_result
+
+    prompt, deliverable_format = _build_prompt(state)
 
     try:
-        response_str = get_llm_client().invoke_chat(prompt)
-        
-        # Debug: Print response type and content
-        print(f"Response type: {type(response_str)}")
-        print(f"Response content: {response_str[:200]}...")
-
-        if deliverable_format == "markdown":
-            # Check if we have database results to format
-            database_formatted = format_database_results(observations)
-            if database_formatted:
-                # Combine LLM response with formatted database results
-                final_answer = response_str + "\n\n" + database_formatted
-            else:
-                final_answer = response_str
-        else: # json or custom
-            # Implement retry logic for JSON output
-            for attempt in range(3): # Max 3 attempts
-                try:
-                    final_answer = json.loads(response_str)
-                    break # Exit loop if successful
-                except json.JSONDecodeError as e:
-                    print(f"Final Synthesis JSON output failed (attempt {attempt + 1}): {e}")
-                    if attempt < 2: # If not last attempt, try to fix JSON
-                        print("Attempting to fix JSON by re-prompting LLM.")
-                        # Re-prompt with instruction to fix JSON
-                        prompt = f"{response_str}\n\nBạn đã trả JSON sai schema, hãy giữ nguyên nội dung nhưng sửa thành JSON hợp lệ theo schema đã cho. ONLY JSON."
-                    else:
-                        print("Max retries reached for Final Synthesis JSON. Returning error.")
-                        return {"errors": state.errors + [f"Final Synthesis JSON output failed after multiple retries: {e}"]}
-            else: # This else block executes if the loop completes without a break
-                final_answer = response_str # Fallback if JSON parsing consistently fails
+        if deliverable_format != "markdown":
+            response_str = get_llm_client().invoke_chat(prompt, node="final_synthesis")
+            return _finalize_answer(state, response_str, deliverable_format)
+
+        # Stream markdown answers so the UI can render tokens as they arrive
+        chunks = []
+        for token in get_llm_client().stream_chat(prompt):
+            chunks.append(token)
+            writer({"token": token})
+        response_str = "".join(chunks)
+        result = _finalize_answer(state, response_str, deliverable_format)
+        _emit_tail(writer, response_str, result)
+        return result
+
+    except Exception as e:
+        print(f"An unexpected error occurred during Final Synthesis: {e}")
+        return {"errors": state.errors + [f"Unexpected error in Final Synthesis: {e}"]}
+
+async def asynthesize_final_answer(state: AgentState) -> dict:
+    """
+    Async version of synthesize_final_answer.
+    """
+    print("--- Node: FINAL SYNTHESIS (async) ---")
+
+    writer = _get_token_writer()
+    early_result = _check_synthesis_inputs(state)
+    if early_result is not None:
+        writer({"token": early_result["final_answer"]})
+        return early_result
+
+    prompt, deliverable_format = _build_prompt(state)
+
+    try:
+        if deliverable_format != "markdown":
+            response_str = await get_llm_client().ainvoke_chat(prompt, node="final_synthesis")
+            return _finalize_answer(state, response_str, deliverable_format)
 
-        return {"final_answer": final_answer}
+        chunks = []
+        async for token in get_llm_client().astream_chat(prompt):
+            chunks.append(token)
+            writer({"token": token})
+        response_str = "".join(chunks)
+        result = _finalize_answer(state, response_str, deliverable_format)
+        _emit_tail(writer, response_str, result)
+        return result
 
     except Exception as e:
         print(f"An unexpected error occurred during Final Synthesis: {e}")
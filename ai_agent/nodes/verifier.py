@@ -1,9 +1,173 @@
-from ..state import AgentState
+"""
+Node: VERIFIER
+Rule-based check of each step's `expect` against its Observation.
+When every expectation of the latest wave is machine-checkable and met,
+the graph moves on without calling the reflection LLM.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from ..state import AgentState, Observation
+from ..scheduler import step_keys, has_pending_steps
 
-def verify_step(state: AgentState) -> str:
+PASS = "pass"
+FAIL = "fail"
+UNDECIDED = "undecided"
+
+# Keys under which tools return their result collections
+_ITEM_KEYS = ["rows", "docs", "tables", "collections", "results", "items", "indexes", "result"]
+
+def _result_items(data: Dict[str, Any]) -> Optional[list]:
+    for key in _ITEM_KEYS:
+        value = data.get(key)
+        if isinstance(value, list):
+            return value
+    return None
+
+def _result_count(data: Dict[str, Any]) -> Optional[int]:
+    items = _result_items(data)
+    if items is not None:
+        return len(items)
+    count = data.get("count")
+    return count if isinstance(count, int) else None
+
+def _check_min_count(expected, data) -> Tuple[Optional[bool], str]:
+    count = _result_count(data)
+    if count is None or not isinstance(expected, (int, float)):
+        return None, "result count not available"
+    return count >= expected, f"count={count}, expected >= {expected}"
+
+def _check_max_rows(expected, data) -> Tuple[Optional[bool], str]:
+    count = _result_count(data)
+    if count is None or not isinstance(expected, (int, float)):
+        return None, "result count not available"
+    return count <= expected, f"count={count}, expected <= {expected}"
+
+def _check_min_score(expected, data) -> Tuple[Optional[bool], str]:
+    scores = data.get("scores")
+    if not isinstance(scores, list) or not isinstance(expected, (int, float)):
+        return None, "scores not available"
+    if not scores:
+        return False, "no scores returned"
+    best = max(scores)
+    return best >= expected, f"best_score={best}, expected >= {expected}"
+
+def _check_non_empty(expected, data) -> Tuple[Optional[bool], str]:
+    items = _result_items(data)
+    if items is not None:
+        non_empty = len(items) > 0
+    else:
+        non_empty = any(value not in (None, "", [], {}) for value in data.values())
+    return non_empty == bool(expected), f"non_empty={non_empty}"
+
+def _check_must_contain(expected, data) -> Tuple[Optional[bool], str]:
+    if isinstance(expected, str):
+        expected = [expected]
+    if not isinstance(expected, list):
+        return None, "must_contain is not a list"
+    text = json.dumps(data, ensure_ascii=False, default=str).lower()
+    missing = [kw for kw in expected if str(kw).lower() not in text]
+    return not missing, f"missing={missing}" if missing else "all keywords found"
+
+def _check_status(expected, data) -> Tuple[Optional[bool], str]:
+    status = data.get("status", data.get("status_code"))
+    if status is None:
+        return None, "status not available"
+    return status == expected, f"status={status}, expected {expected}"
+
+# expect key -> check(expected, observation.data) returning (verdict or None if undecidable, reason)
+_CHECKS = {
+    "min_rows": _check_min_count,
+    "min_docs": _check_min_count,
+    "min_results": _check_min_count,
+    "max_rows": _check_max_rows,
+    "min_score": _check_min_score,
+    "non_empty": _check_non_empty,
+    "must_contain": _check_must_contain,
+    "status": _check_status,
+}
+
+def check_expectations(expect: Dict[str, Any], observation: Observation) -> Tuple[str, List[str]]:
     """
-    Placeholder function for the new verification architecture.
+    Evaluates a step's expectations against its observation.
+    Returns (verdict, reasons) where verdict is "pass", "fail" or "undecided"; a step passes only
+    when at least one result expectation (min_rows, status, ...) was actually checked.
     """
-    print("--- Node: VERIFIER (Placeholder) ---")
-    # Always return 'fail' for now, as verification is not implemented
-    return "fail"
\ No newline at end of file
+    expect = expect or {}
+    data = observation.data if isinstance(observation.data, dict) else {}
+    error_code = (observation.error or {}).get("code")
+
+    # Explicit expectations about the outcome itself
+    if "error_code" in expect:
+        if error_code != expect["error_code"]:
+            return FAIL, [f"error_code={error_code}, expected {expect['error_code']}"]
+        if error_code is not None:
+            # The expected error happened; nothing else to check
+            return PASS, [f"error_code={error_code}"]
+    if "ok" in expect and observation.ok != bool(expect["ok"]):
+        return FAIL, [f"ok={observation.ok}, expected {expect['ok']}"]
+
+    if not observation.ok:
+        summary = (observation.error or {}).get("summary", "tool error")
+        return FAIL, [f"tool failed: {summary}"]
+    if data.get("error"):
+        return FAIL, [f"tool returned error: {data['error']}"]
+
+    reasons = []
+    undecided = []
+    for key, expected in expect.items():
+        if key in ("error_code", "ok"):
+            continue
+        check = _CHECKS.get(key)
+        if check is None:
+            undecided.append(key)
+            continue
+        verdict, reason = check(expected, data)
+        if verdict is None:
+            undecided.append(key)
+        elif not verdict:
+            return FAIL, [f"{key}: {reason}"]
+        else:
+            reasons.append(f"{key}: {reason}")
+
+    if undecided:
+        return UNDECIDED, reasons + [f"not machine-checkable: {undecided}"]
+    if not reasons:
+        # Nothing beyond "the tool ran" was checked (no expect, or only ok): leave it to reflection
+        return UNDECIDED, ["no machine-checkable expectations"]
+    return PASS, reasons
+
+def verify_step(state: AgentState) -> dict:
+    """
+    Verifies the latest wave of observations against the plan's expectations.
+    On "pass" it also sets the routing fields reflection would have produced.
+    """
+    print("--- Node: VERIFIER ---")
+    if not state.plan or not state.last_step_ids:
+        return {"verification_status": UNDECIDED, "verification_notes": ["nothing to verify"]}
+
+    wave_size = len(state.last_step_ids)
+    observations = state.observations[-wave_size:]
+    steps_by_key = dict(zip(step_keys(state.plan.steps), state.plan.steps))
+
+    verdict = PASS
+    notes = []
+    for obs in observations:
+        step = steps_by_key.get(obs.step_id)
+        if step is None:
+            step_verdict, reasons = UNDECIDED, ["step not found in plan"]
+        else:
+            step_verdict, reasons = check_expectations(step.expect, obs)
+        notes.append(f"{obs.step_id} [{step_verdict}] " + "; ".join(reasons))
+        if step_verdict == FAIL:
+            verdict = FAIL
+        elif step_verdict == UNDECIDED and verdict == PASS:
+            verdict = UNDECIDED
+
+    print(f"Verification result: {verdict} | {notes}")
+    result = {"verification_status": verdict, "verification_notes": notes}
+    if verdict == PASS:
+        pending = has_pending_steps(state.plan.steps, state.completed_steps)
+        result["reflection_status"] = "continue"
+        result["has_more_steps"] = pending
+        result["all_criteria_met"] = not pending
+    return result
@@ -1,4 +1,5 @@
 import json
+from ..tools.registry import action_names
 
 PLAN_GENERATION_PROMPT_TEMPLATE = """
 [SYSTEM]
@@ -8,19 +9,22 @@ Bạn là Senior Planner. Hãy tạo kế hoạch ngắn gọn, khả thi, step-
 Task: {task}
 Tools: {tool_inventory}
 Limits: {limits}
+Database catalog (PostgreSQL, đã cache):
+{catalog}
 
 [INSTRUCTION]
 1) Tạo <= {max_steps} bước. Mỗi bước:
    - id duy nhất (s1, s2, ...),
    - description ngắn, reason (tại sao cần),
-   - action PHẢI LÀ MỘT TRONG: kg.query, rag.search, sql.query, http.get, plan.note, github.request, milvus.list_collections, milvus.describe_index, google.search, sql.get_schema, sql.list_tables, sql.describe_table, sql.get_table_info, sql.search_in_table, sql.get_distinct_values, sql.get_table_stats, sql.find_related_tables, sql.custom_query
+   - action PHẢI LÀ MỘT TRONG: {actions}
    - KHÔNG BAO GIỜ dùng action khác như request_info, milvus.connect, user_input, format_output, validate_data, browser.open, execute_cli
    - input rõ ràng, expect có thể kiểm chứng,
    - max_retries <= {max_retries_per_step},
-   - depends_on nếu có quan hệ.
+   - depends_on nếu có quan hệ (các bước không phụ thuộc nhau sẽ được chạy song song, chỉ khai báo depends_on khi bước thật sự cần kết quả của bước trước).
 
 2) **ƯU TIÊN TOOLS THEO THỨ TỰ VÀ LOẠI DATABASE:**
    - **PostgreSQL**: Ưu tiên sql.list_tables, sql.describe_table, sql.custom_query
+     * Nếu Database catalog ở trên đã có bảng/cột cần thiết, dùng trực tiếp trong sql.custom_query, KHÔNG thêm bước sql.list_tables/sql.describe_table/sql.find_related_tables chỉ để khám phá lại schema
    - **Milvus**: Ưu tiên milvus.list_collections, milvus.describe_index, rag.search
    - **Neo4j**: Ưu tiên kg.query cho graph queries
    - **Bước 2**: Chỉ sử dụng google.search khi:
@@ -79,7 +83,7 @@ Trả về JSON với cấu trúc:
 ONLY JSON, không có text khác.
 """
 
-def get_plan_generation_prompt(task: dict, tool_inventory: list, limits: dict) -> str:
+def get_plan_generation_prompt(task: dict, tool_inventory: list, limits: dict, catalog: str = None) -> str:
     # Provide default values for limits
     max_steps = limits.get('max_steps', 10)
     max_retries_per_step = limits.get('max_retries_per_step', 2)
@@ -88,6 +92,8 @@ def get_plan_generation_prompt(task: dict, tool_inventory: list, limits: dict) -
         task=json.dumps(task, ensure_ascii=False, indent=2),
         tool_inventory=json.dumps(tool_inventory, ensure_ascii=False, indent=2),
         limits=json.dumps(limits, ensure_ascii=False, indent=2),
+        catalog=catalog or "No schema available.",
+        actions=", ".join(action_names()),
         max_steps=max_steps,
         max_retries_per_step=max_retries_per_step
     )
\ No newline at end of file
@@ -24,6 +24,8 @@ Tools: {tool_inventory}
    - Chỉ search khi thực sự cần thiết
    - Ưu tiên sửa database query trước khi chuyển sang search
 
+   - Nếu error_code = QUERY_TOO_EXPENSIVE: dựa vào details (estimated_rows, costly_nodes) để viết lại truy vấn rẻ hơn — thêm điều kiện JOIN/WHERE, dùng COUNT/GROUP BY thay vì lấy dữ liệu thô.
+
 4) Nếu plan tổng thể kém/không phù hợp -> new_plan <= 6 bước.
 5) Bắt buộc đảm bảo loop_avoidance: thay đổi input/tool đủ khác để không lặp lỗi.
 6) Tuân thủ acceptance.must_cover & success_condition.
@@ -1,12 +1,17 @@
 """
 Common System Prompts and Tool Cards for all agent roles.
+The action enum and tool cards are generated from the tool registry.
 """
+import json
+from ..tools.registry import TOOL_REGISTRY, action_names
 
 # A) General System Prompt
-GENERAL_SYSTEM_PROMPT = """
+_ACTION_ENUM = " | ".join(action_names())
+
+GENERAL_SYSTEM_PROMPT = f"""
 Vai trò: "Bạn là Orchestrator tuân thủ kế hoạch theo từng bước."
 
-Tuyên bố enum action hợp lệ (CHỈ DÙNG CÁC ACTION NÀY): kg.query | rag.search | sql.query | http.get | plan.note | github.request | milvus.list_collections | milvus.describe_index | google.search | sql.get_schema | sql.list_tables | sql.describe_table | sql.get_table_info | sql.search_in_table | sql.get_distinct_values | sql.get_table_stats | sql.find_related_tables | sql.custom_query
+Tuyên bố enum action hợp lệ (CHỈ DÙNG CÁC ACTION NÀY): {_ACTION_ENUM}
 
 **QUY TẮC ACTION (TUYỆT ĐỐI TUÂN THỦ):**
 - CHỈ dùng các action trong enum trên
@@ -43,111 +48,43 @@ Chính sách chung:
 """
 
 # Tool Cards
+# (backend, heading, note appended to every card of that backend)
+_BACKEND_SECTIONS = [
+    ("postgres", "**POSTGRESQL TOOLS (Relational Database):**", "CHỈ DÙNG CHO POSTGRESQL"),
+    ("milvus", "**MILVUS TOOLS (Vector Database):**", "CHỈ DÙNG CHO MILVUS"),
+    ("neo4j", "**NEO4J TOOLS (Graph Database):**", "CHỈ DÙNG CHO NEO4J"),
+    ("general", "**GENERAL TOOLS:**", None),
+]
+
+def render_tool_cards() -> str:
+    """
+    Renders one card per registered tool, grouped by backend.
+    """
+    sections = []
+    number = 1
+    for backend, heading, backend_note in _BACKEND_SECTIONS:
+        cards = []
+        for spec in TOOL_REGISTRY.values():
+            if spec.backend != backend:
+                continue
+            lines = [
+                f"{number}. {spec.action.value}:",
+                f"   - Mô tả: {spec.description}",
+                f"   - input: {json.dumps(spec.example_input, ensure_ascii=False)}",
+                f"   - expect: {json.dumps(spec.example_expect, ensure_ascii=False)}",
+            ]
+            note = spec.note or backend_note
+            if note:
+                lines.append(f"   - Ghi chú: {note}")
+            cards.append("\n".join(lines))
+            number += 1
+        sections.append(heading + "\n" + "\n\n".join(cards))
+    return "\n\n".join(sections)
+
 TOOL_CARDS = """
 --- TOOL CARDS ---
 
-**POSTGRESQL TOOLS (Relational Database):**
-1. sql.list_tables:
-   - Mô tả: Liệt kê tất cả các bảng trong cơ sở dữ liệu PostgreSQL.
-   - input: {}
-   - expect: {"min_rows": 1}
-   - Ghi chú: CHỈ DÙNG CHO POSTGRESQL
-
-2. sql.describe_table:
-   - Mô tả: Mô tả cấu trúc chi tiết của một bảng cụ thể trong PostgreSQL.
-   - input: {"table_name": "ten_bang"}
-   - expect: {"min_rows": 1}
-   - Ghi chú: CHỈ DÙNG CHO POSTGRESQL
-
-3. sql.custom_query:
-   - Mô tả: Thực thi truy vấn SQL tùy chỉnh trong PostgreSQL (chỉ SELECT, có kiểm tra bảo mật).
-   - input: {"query": "SELECT * FROM table WHERE condition"}
-   - expect: {"min_rows": 0}
-   - Ghi chú: CHỈ DÙNG CHO POSTGRESQL
-
-4. sql.get_schema:
-   - Mô tả: Lấy schema của cơ sở dữ liệu PostgreSQL (tên bảng, tên cột, kiểu dữ liệu).
-   - input: {}
-   - expect: {"min_rows": 1}
-   - Ghi chú: CHỈ DÙNG CHO POSTGRESQL
-
-5. sql.get_table_info:
-   - Mô tả: Lấy thông tin chi tiết về bảng PostgreSQL bao gồm số lượng dòng, cột và dữ liệu mẫu.
-   - input: {"table_name": "ten_bang"}
-   - expect: {"min_rows": 1}
-   - Ghi chú: CHỈ DÙNG CHO POSTGRESQL
-
-6. sql.search_in_table:
-   - Mô tả: Tìm kiếm dữ liệu trong một cột cụ thể của bảng PostgreSQL.
-   - input: {"table_name": "ten_bang", "column_name": "ten_cot", "search_term": "tu_khoa", "limit": 10}
-   - expect: {"min_rows": 0}
-   - Ghi chú: CHỈ DÙNG CHO POSTGRESQL
-
-7. sql.get_distinct_values:
-   - Mô tả: Lấy các giá trị duy nhất từ một cột cụ thể trong PostgreSQL.
-   - input: {"table_name": "ten_bang", "column_name": "ten_cot", "limit": 50}
-   - expect: {"min_rows": 0}
-   - Ghi chú: CHỈ DÙNG CHO POSTGRESQL
-
-8. sql.get_table_stats:
-   - Mô tả: Lấy thống kê về bảng PostgreSQL từ pg_stats.
-   - input: {"table_name": "ten_bang"}
-   - expect: {"min_rows": 0}
-   - Ghi chú: CHỈ DÙNG CHO POSTGRESQL
-
-9. sql.find_related_tables:
-   - Mô tả: Tìm các bảng PostgreSQL liên quan thông qua foreign key.
-   - input: {"table_name": "ten_bang"}
-   - expect: {"min_rows": 0}
-   - Ghi chú: CHỈ DÙNG CHO POSTGRESQL
-
-**MILVUS TOOLS (Vector Database):**
-10. milvus.list_collections:
-   - Mô tả: Liệt kê tên tất cả các collection trong Milvus.
-   - input: {} (không cần input)
-   - expect: {"min_rows": 1}
-   - Ghi chú: CHỈ DÙNG CHO MILVUS
-
-11. milvus.describe_index:
-   - Mô tả: Mô tả cấu hình index của một collection Milvus (index_type, metric_type, params).
-   - input: {"collection": "ten_collection"}
-   - expect: {"min_rows": 1}
-   - Ghi chú: CHỈ DÙNG CHO MILVUS
-
-12. rag.search:
-   - Mô tả: Tìm kiếm thông tin trong cơ sở dữ liệu vector Milvus.
-   - input: {"query": "chủ đề cần tìm", "top_k": 5, "collection": "ten_collection"}
-   - expect: {"min_docs": 3, "min_score": 0.2}
-   - Ghi chú: CHỈ DÙNG CHO MILVUS
-
-**NEO4J TOOLS (Graph Database):**
-13. kg.query:
-   - Mô tả: Truy vấn cơ sở dữ liệu đồ thị Neo4j bằng Cypher.
-   - input: {"query": "MATCH (n) RETURN n LIMIT 1", "params": {}}
-   - expect: {"min_rows": 1}
-   - Ghi chú: CHỈ DÙNG CHO NEO4J
-
-**GENERAL TOOLS:**
-14. http.get:
-   - Mô tả: Lấy nội dung từ một URL.
-   - input: {"url": "https://example.com", "timeout": 10}
-   - expect: {"non_empty": true, "must_contain": ["keyword1", "keyword2"]}
-
-15. plan.note:
-   - Mô tả: Ghi lại một ghi chú hoặc kết quả trung gian.
-   - input: {"note": "Nội dung cần ghi chú"}
-   - expect: {}
-
-16. github.request:
-   - Mô tả: Gọi GitHub REST API để lấy thông tin repo/issues/PR/file.
-   - input: {"method": "GET", "path": "/repos/{owner}/{repo}", "params": {}}
-   - expect: {"status": 200}
-
-17. google.search:
-   - Mô tả: Tìm kiếm thông tin trên Google (CHỈ DÙNG KHI CẦN THIẾT).
-   - input: {"query": "chủ đề cần tìm"}
-   - expect: {"min_results": 1}
-   - Ghi chú: CHI PHÍ CAO - Chỉ dùng khi database không có dữ liệu hoặc cần thông tin bên ngoài
+""" + render_tool_cards() + """
 
 --- GỢI Ý VỀ CẤU TRÚC DỮ LIỆU (SCHEMA HINTS) ---
 - **Neo4j:** Node `ClassSession` có các thuộc tính `id`, `name`, `description`. Hãy ưu tiên dùng `id` để truy vấn chính xác.
@@ -0,0 +1,211 @@
+"""
+Dependency-aware scheduling of plan steps.
+Builds a DAG from Step.depends_on and runs steps whose dependencies are satisfied concurrently.
+Also provides the time budget helpers: turn budgets, per-call deadlines and retry backoff.
+"""
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from .state import Limits, Step
+
+def step_keys(steps: List[Step]) -> List[str]:
+    """
+    Returns a unique key per step: its id, or "step_<idx>" when missing.
+    Duplicate ids produced by the planner are disambiguated with their index.
+    """
+    keys = []
+    seen = set()
+    for idx, step in enumerate(steps):
+        key = step.id or f"step_{idx}"
+        if key in seen:
+            key = f"{key}#{idx}"
+        seen.add(key)
+        keys.append(key)
+    return keys
+
+def build_dependency_graph(steps: List[Step]) -> Dict[str, List[str]]:
+    """
+    Maps each step key to the keys it depends on.
+    Dependencies on unknown steps (or on itself) are ignored so they cannot block execution.
+    """
+    keys = step_keys(steps)
+    known = set(keys)
+    graph = {}
+    for key, step in zip(keys, steps):
+        graph[key] = [dep for dep in (step.depends_on or []) if dep in known and dep != key]
+    return graph
+
+def next_wave(steps: List[Step], completed: Iterable[str]) -> List[int]:
+    """
+    Returns the indices, in plan order, of all pending steps whose dependencies are completed.
+    """
+    keys = step_keys(steps)
+    graph = build_dependency_graph(steps)
+    done = set(completed)
+    pending = [idx for idx, key in enumerate(keys) if key not in done]
+    ready = [idx for idx in pending if all(dep in done for dep in graph[keys[idx]])]
+    if pending and not ready:
+        # Dependency cycle: fall back to plan order so the plan still makes progress
+        ready = [pending[0]]
+    return ready
+
+def has_pending_steps(steps: List[Step], completed: Iterable[str]) -> bool:
+    done = set(completed)
+    return any(key not in done for key in step_keys(steps))
+
+def get_max_parallel_steps(limit: Optional[int] = None) -> int:
+    """
+    Concurrency bound for one wave: explicit limit, else AGENT_MAX_PARALLEL_STEPS (default: 4).
+    """
+    if limit is None:
+        limit = int(os.getenv("AGENT_MAX_PARALLEL_STEPS", "4"))
+    return max(1, limit)
+
+def run_wave(fn: Callable[[Any], Any], items: List[Any], max_concurrency: int) -> List[Any]:
+    """
+    Runs fn over items with at most max_concurrency threads. Results keep the order of items.
+    """
+    if len(items) <= 1 or max_concurrency <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+async def arun_wave(afn: Callable[[Any], Awaitable[Any]], items: List[Any], max_concurrency: int) -> List[Any]:
+    """
+    Async version of run_wave bounded by a semaphore. Results keep the order of items.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(item):
+        async with semaphore:
+            return await afn(item)
+
+    return list(await asyncio.gather(*(run(item) for item in items)))
+
+# --- Time budgets --- #
+
+# Named budgets accepted in Limits.time_budget_hint (Vietnamese and English)
+TIME_BUDGET_PRESETS = {
+    "ngắn": 30, "nhanh": 30, "short": 30, "fast": 30,
+    "trung bình": 90, "vừa": 90, "medium": 90, "normal": 90,
+    "dài": 300, "long": 300,
+}
+
+_DURATION_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(ms|s|sec|giây|m|min|phút)?\s*$")
+
+def parse_time_budget(hint: Optional[str]) -> Optional[float]:
+    """
+    Converts a time budget hint into seconds: a preset ("ngắn", "medium", ...) or a duration ("45", "45s", "2m", "2 phút").
+    Returns None when the hint is missing or not understood.
+    """
+    if not hint:
+        return None
+    text = hint.strip().lower()
+    if text in TIME_BUDGET_PRESETS:
+        return float(TIME_BUDGET_PRESETS[text])
+    match = _DURATION_RE.match(text)
+    if not match:
+        return None
+    value, unit = float(match.group(1)), match.group(2) or "s"
+    if unit == "ms":
+        return value / 1000
+    if unit in ("m", "min", "phút"):
+        return value * 60
+    return value
+
+def get_turn_budget(limits: Optional[Limits]) -> float:
+    """
+    Wall-clock budget of one turn: Limits.time_budget_hint, else AGENT_TURN_BUDGET_S (default: 180).
+    """
+    budget = parse_time_budget(limits.time_budget_hint if limits else None)
+    if budget is None:
+        budget = float(os.getenv("AGENT_TURN_BUDGET_S", "180"))
+    return budget
+
+def remaining_budget(deadline: Optional[float]) -> Optional[float]:
+    """
+    Seconds left before an absolute deadline (time.time() based), or None when there is no deadline.
+    """
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+def backoff_delay(attempt: int, base_s: float, max_s: float) -> float:
+    """
+    Exponential backoff with jitter for the given (1-based) attempt that just failed.
+    """
+    delay = min(max_s, base_s * (2 ** (attempt - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+# Absolute deadline (time.time() based) of the tool call running in this context.
+# Drivers read it through call_timeout() to set their own client/server-side timeouts.
+_CALL_DEADLINE: contextvars.ContextVar = contextvars.ContextVar("call_deadline", default=None)
+
+@contextmanager
+def call_deadline(timeout_s: Optional[float]):
+    """
+    Sets the deadline of tool calls made inside the block to timeout_s seconds from now.
+    """
+    token = _CALL_DEADLINE.set(time.time() + timeout_s if timeout_s else None)
+    try:
+        yield
+    finally:
+        _CALL_DEADLINE.reset(token)
+
+def call_timeout(default: Optional[float] = None, minimum: float = 0.1) -> Optional[float]:
+    """
+    Seconds left before the current call's deadline, capped at default (default when no deadline is set).
+    Never below minimum, so drivers always get a usable timeout value.
+    """
+    deadline = _CALL_DEADLINE.get()
+    if deadline is None:
+        return default
+    remaining = max(minimum, deadline - time.time())
+    return remaining if default is None else min(default, remaining)
+
+def get_timeout_grace() -> float:
+    """
+    Extra seconds the thread backstop waits past a call's deadline so driver timeouts fire first:
+    AGENT_STEP_TIMEOUT_GRACE_S (default: 2).
+    """
+    return max(0.0, float(os.getenv("AGENT_STEP_TIMEOUT_GRACE_S", "2")))
+
+class StepTimeout(Exception):
+    """Raised when a call does not finish before its deadline. worker is the abandoned thread."""
+
+    def __init__(self, message: str, worker: Optional[threading.Thread] = None):
+        super().__init__(message)
+        self.worker = worker
+
+def run_with_deadline(fn: Callable[[], Any], timeout_s: float) -> Any:
+    """
+    Runs fn in a daemon thread and waits at most timeout_s seconds.
+    This is a backstop: blocking drivers cannot be interrupted from outside, so tools enforce the
+    deadline themselves (see call_timeout). On timeout the call is abandoned (its result is discarded)
+    and StepTimeout is raised carrying the still-running thread.
+    """
+    outcome: Dict[str, Any] = {}
+    context = contextvars.copy_context()
+
+    def target():
+        try:
+            outcome["result"] = context.run(fn)
+        except BaseException as e:
+            outcome["error"] = e
+
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    worker.join(max(0.0, timeout_s))
+    if worker.is_alive():
+        raise StepTimeout(f"Timed out after {timeout_s:.1f}s", worker=worker)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("result")
@@ -0,0 +1,150 @@
+"""
+Bounded short-term (per-session) memory.
+Each session keeps a ring buffer of its latest entries; idle sessions are evicted LRU-first once the
+number of sessions or their estimated total size exceeds the limits. A user -> sessions index keeps
+user-level operations proportional to that user's sessions.
+"""
+import os
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Set
+
+def _entry_size(entry: Any) -> int:
+    """Rough in-memory footprint of a MemoryEntry in bytes"""
+    size = 256  # object and field overhead
+    size += len(entry.question.encode("utf-8")) + len(entry.answer.encode("utf-8"))
+    size += len(json.dumps(entry.metadata, ensure_ascii=False, default=str).encode("utf-8"))
+    size += sum(len(tool) for tool in entry.tools_used)
+    if entry.embedding is not None:
+        size += 8 * len(entry.embedding)
+    return size
+
+class _Session:
+    __slots__ = ("entries", "sizes", "bytes", "user_ids")
+
+    def __init__(self, max_entries: int):
+        self.entries: Deque[Any] = deque(maxlen=max_entries)
+        self.sizes: Deque[int] = deque(maxlen=max_entries)
+        self.bytes = 0
+        self.user_ids: Set[str] = set()
+
+class ShortTermMemory:
+    """Thread-safe session_id -> recent entries store with LRU eviction by count and bytes"""
+
+    def __init__(self, max_entries_per_session: int = 50, max_sessions: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries_per_session = max(1, max_entries_per_session)
+        self.max_sessions = max(1, max_sessions)
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._user_sessions: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"evicted_sessions": 0, "evicted_entries": 0}
+
+    @classmethod
+    def from_env(cls) -> "ShortTermMemory":
+        """
+        - MEMORY_SHORT_TERM_MAX_ENTRIES: entries kept per session (default: 50)
+        - MEMORY_SHORT_TERM_MAX_SESSIONS: sessions kept in memory (default: 1000)
+        - MEMORY_SHORT_TERM_MAX_BYTES: estimated total size of all sessions (default: 64 MiB)
+        """
+        return cls(
+            max_entries_per_session=int(os.getenv("MEMORY_SHORT_TERM_MAX_ENTRIES", "50")),
+            max_sessions=int(os.getenv("MEMORY_SHORT_TERM_MAX_SESSIONS", "1000")),
+            max_bytes=int(os.getenv("MEMORY_SHORT_TERM_MAX_BYTES", str(64 * 1024 * 1024))),
+        )
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def add(self, entry: Any):
+        size = _entry_size(entry)
+        with self._lock:
+            session = self._sessions.get(entry.session_id)
+            if session is None:
+                session = _Session(self.max_entries_per_session)
+                self._sessions[entry.session_id] = session
+            else:
+                self._sessions.move_to_end(entry.session_id)
+
+            if len(session.entries) == session.entries.maxlen:
+                # The ring buffer drops its oldest entry on append
+                dropped = session.sizes[0]
+                session.bytes -= dropped
+                self._bytes -= dropped
+                self._stats["evicted_entries"] += 1
+            session.entries.append(entry)
+            session.sizes.append(size)
+            session.bytes += size
+            self._bytes += size
+
+            if entry.user_id not in session.user_ids:
+                session.user_ids.add(entry.user_id)
+                self._user_sessions.setdefault(entry.user_id, set()).add(entry.session_id)
+
+            # Evict least recently used sessions, never the one just written
+            while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+                oldest = next(iter(self._sessions))
+                self._remove_session(oldest)
+                self._stats["evicted_sessions"] += 1
+
+    def get(self, session_id: str, limit: int = 10) -> List[Any]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            entries = list(session.entries)
+        return entries[-limit:] if limit else entries
+
+    def clear_session(self, session_id: str):
+        with self._lock:
+            if session_id in self._sessions:
+                self._remove_session(session_id)
+
+    def clear_user(self, user_id: str):
+        """Drop the user's entries from every session they wrote to; sessions left empty are removed"""
+        with self._lock:
+            for session_id in list(self._user_sessions.pop(user_id, ())):
+                session = self._sessions.get(session_id)
+                if session is None:
+                    continue
+                kept = [(entry, size) for entry, size in zip(session.entries, session.sizes) if entry.user_id != user_id]
+                if not kept:
+                    self._remove_session(session_id)
+                    continue
+                session.entries = deque((entry for entry, _ in kept), maxlen=self.max_entries_per_session)
+                session.sizes = deque((size for _, size in kept), maxlen=self.max_entries_per_session)
+                kept_bytes = sum(session.sizes)
+                self._bytes -= session.bytes - kept_bytes
+                session.bytes = kept_bytes
+                session.user_ids.discard(user_id)
+
+    def sessions_for_user(self, user_id: str) -> List[str]:
+        with self._lock:
+            return list(self._user_sessions.get(user_id, ()))
+
+    def _remove_session(self, session_id: str):
+        """Drop a session and its index entries; caller holds the lock"""
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.bytes
+        for user_id in session.user_ids:
+            sessions = self._user_sessions.get(user_id)
+            if sessions is not None:
+                sessions.discard(session_id)
+                if not sessions:
+                    del self._user_sessions[user_id]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["sessions"] = len(self._sessions)
+            stats["users"] = len(self._user_sessions)
+            stats["bytes"] = self._bytes
+        return stats
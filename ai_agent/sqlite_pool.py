@@ -0,0 +1,100 @@
+"""
+Persistent SQLite connections for the memory store.
+One connection per thread, opened once in WAL mode with tuned pragmas and a statement cache,
+so readers never block on the writer and no call pays for connect/close.
+"""
+import os
+import atexit
+import sqlite3
+import threading
+import weakref
+from typing import Dict
+
+class SQLiteConnectionManager:
+    """
+    Hands out a thread-local connection to db_path.
+    Connections of threads that have exited are closed the next time a new one is opened.
+    """
+    def __init__(self, db_path: str, cache_size_kb: int = 16384, mmap_size: int = 256 * 1024 * 1024,
+                 busy_timeout_ms: int = 5000, synchronous: str = "NORMAL", cached_statements: int = 256):
+        self.db_path = db_path
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections: Dict[int, sqlite3.Connection] = {}  # thread ident -> connection
+        self._lock = threading.Lock()
+        _MANAGERS.add(self)
+
+    @classmethod
+    def from_env(cls, db_path: str) -> "SQLiteConnectionManager":
+        """
+        - MEMORY_DB_CACHE_SIZE_KB: page cache per connection in KiB (default: 16384)
+        - MEMORY_DB_MMAP_SIZE: bytes of the file memory-mapped for reads (default: 256 MiB, 0 disables)
+        - MEMORY_DB_BUSY_TIMEOUT_MS: how long a writer waits for the write lock (default: 5000)
+        - MEMORY_DB_SYNCHRONOUS: OFF/NORMAL/FULL (default: NORMAL, durable across app crashes in WAL mode)
+        - MEMORY_DB_CACHED_STATEMENTS: prepared statements kept per connection (default: 256)
+        """
+        return cls(
+            db_path,
+            cache_size_kb=int(os.getenv("MEMORY_DB_CACHE_SIZE_KB", "16384")),
+            mmap_size=int(os.getenv("MEMORY_DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+            busy_timeout_ms=int(os.getenv("MEMORY_DB_BUSY_TIMEOUT_MS", "5000")),
+            synchronous=os.getenv("MEMORY_DB_SYNCHRONOUS", "NORMAL").upper(),
+            cached_statements=int(os.getenv("MEMORY_DB_CACHED_STATEMENTS", "256")),
+        )
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        # check_same_thread=False only so close_all() can run from another thread;
+        # each connection is otherwise used by the thread that opened it
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+
+        with self._lock:
+            alive = {thread.ident for thread in threading.enumerate()}
+            for ident in [ident for ident in self._connections if ident not in alive]:
+                self._close_quietly(self._connections.pop(ident))
+            self._connections[threading.get_ident()] = conn
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"Error closing SQLite connection: {e}")
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections.values():
+                self._close_quietly(conn)
+            self._connections.clear()
+        self._local = threading.local()
+
+# Every manager is closed at interpreter exit (checkpointing the WAL back into the main file)
+_MANAGERS: "weakref.WeakSet[SQLiteConnectionManager]" = weakref.WeakSet()
+
+def close_all_sqlite_connections():
+    for manager in list(_MANAGERS):
+        manager.close_all()
+
+atexit.register(close_all_sqlite_connections)
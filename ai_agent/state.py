@@ -76,13 +76,21 @@ class ProgressSummary(BaseModel):
     pass # Placeholder for now
 
 class FailureContext(BaseModel):
-    # Define fields based on how it will be used in Replan/Repair
-    pass # Placeholder for now
+    """The latest failed step, as handed to Replan/Repair."""
+    step_id: Optional[str] = None
+    action: Optional[str] = None
+    input: Dict[str, Any] = Field(default_factory=dict)
+    error_code: Optional[str] = None
+    summary: Optional[str] = None
+    detail: Optional[str] = None
+    hint: Optional[str] = None
+    details: Dict[str, Any] = Field(default_factory=dict)  # Structured reason, e.g. estimated rows and costly plan nodes
 
 class Limits(BaseModel):
     max_steps: int
     max_retries_per_step: int
     time_budget_hint: str
+    max_parallel_steps: Optional[int] = None  # Falls back to AGENT_MAX_PARALLEL_STEPS
 
 class ExecutionContext(BaseModel):
     session_id: Optional[str] = None
@@ -103,6 +111,8 @@ class AgentState(BaseModel):
     question: str
     plan: Optional[Plan] = None
     step_idx: int = 0
+    completed_steps: List[str] = Field(default_factory=list)  # Keys of executed steps in the current plan
+    last_step_ids: List[str] = Field(default_factory=list)  # Keys of the steps run in the latest wave
     evidence: List[Evidence] = Field(default_factory=list)
     errors: List[str] = Field(default_factory=list)
     visited_signatures: Set[str] = Field(default_factory=set)
@@ -116,6 +126,7 @@ class AgentState(BaseModel):
     profile: Dict[str, Any] = Field(default_factory=dict)
     tool_policies: Optional[Dict[str, Any]] = None
     run_id: Optional[str] = None
+    turn_deadline: Optional[float] = None  # Epoch seconds when the turn's time budget runs out (set by the router)
 
     # Fields for routing
     intent: str = "complex_query" # Default to complex query
@@ -134,11 +145,14 @@ class AgentState(BaseModel):
     limits: Optional[Limits] = None
     execution_context: Optional[ExecutionContext] = None
     reflection_status: Optional[str] = None
+    verification_status: Optional[str] = None  # pass | fail | undecided (rule-based verifier)
+    verification_notes: List[str] = Field(default_factory=list)
     all_criteria_met: Optional[bool] = None
     has_more_steps: Optional[bool] = None
     can_replan_repair: Optional[bool] = None
     
     # Memory fields
     memory_id: Optional[str] = None
+    memory_embedding: Optional[List[float]] = None  # Question embedding from recall, reused when storing
     similar_memories: List[Dict[str, Any]] = Field(default_factory=list)
     memory_context: Optional[str] = None
@@ -0,0 +1,353 @@
+"""
+Schema catalog for PostgreSQL.
+Introspects tables, columns, foreign keys and approximate row counts in bulk,
+caches the result in memory and on disk, and invalidates it when the schema
+fingerprint changes. Metadata tools (list/describe/related tables, schema)
+are answered from the cache when it is available.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from psycopg2.extras import RealDictCursor
+from .pg_pool import get_pg_dsn, get_pg_pool
+
+# Relations owned by users (tables, partitioned tables, views, materialized views, foreign tables)
+_USER_RELATIONS = """
+    c.relkind IN ('r', 'p', 'v', 'm', 'f')
+    AND NOT c.relispartition
+    AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+    AND n.nspname NOT LIKE 'pg_toast%'
+    AND n.nspname NOT LIKE 'pg_temp%'
+"""
+
+_FINGERPRINT_SQL = f"""
+SELECT md5(
+    coalesce((
+        SELECT string_agg(c.oid::text || ':' || a.attnum || ':' || a.attname || ':' || a.atttypid, ',' ORDER BY c.oid, a.attnum)
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE {_USER_RELATIONS} AND a.attnum > 0 AND NOT a.attisdropped
+    ), '')
+    || '|' ||
+    coalesce((SELECT string_agg(con.oid::text, ',' ORDER BY con.oid) FROM pg_constraint con WHERE con.contype = 'f'), '')
+) AS fingerprint
+"""
+
+_TABLES_SQL = f"""
+SELECT n.nspname AS schema, c.relname AS table, c.relkind AS kind, c.reltuples::bigint AS approx_rows
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE {_USER_RELATIONS}
+ORDER BY n.nspname, c.relname
+"""
+
+_COLUMNS_SQL = f"""
+SELECT n.nspname AS schema, c.relname AS table, a.attname AS column,
+       format_type(a.atttypid, a.atttypmod) AS data_type, NOT a.attnotnull AS nullable
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE {_USER_RELATIONS} AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY n.nspname, c.relname, a.attnum
+"""
+
+_FOREIGN_KEYS_SQL = """
+SELECT n.nspname AS schema, c.relname AS table, a.attname AS column,
+       fn.nspname AS ref_schema, fc.relname AS ref_table, fa.attname AS ref_column
+FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_class fc ON fc.oid = con.confrelid
+JOIN pg_namespace fn ON fn.oid = fc.relnamespace
+CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(attnum, ref_attnum)
+JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+JOIN pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = k.ref_attnum
+WHERE con.contype = 'f'
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+ORDER BY n.nspname, c.relname, con.conname
+"""
+
+class SchemaCatalog:
+    """
+    In-memory view of the database schema with O(1) lookups by table name.
+    """
+    def __init__(self, fingerprint: str, tables: Dict[str, Dict[str, Any]], built_at: Optional[float] = None):
+        self.fingerprint = fingerprint
+        self.tables = tables  # "schema.table" -> {schema, table, kind, approx_rows, columns, foreign_keys}
+        self.built_at = built_at or time.time()
+        self._by_name: Dict[str, List[str]] = {}
+        for key, info in tables.items():
+            self._by_name.setdefault(info["table"].lower(), []).append(key)
+
+    def to_dict(self) -> dict:
+        return {"fingerprint": self.fingerprint, "built_at": self.built_at, "tables": self.tables}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SchemaCatalog":
+        return cls(data["fingerprint"], data["tables"], data.get("built_at"))
+
+    def find(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolves "table", "schema.table" or quoted names; bare names prefer the public schema.
+        """
+        name = (table_name or "").strip().replace('"', "")
+        if not name:
+            return None
+        if "." in name:
+            return self.tables.get(name) or self.tables.get(name.lower())
+        keys = self._by_name.get(name.lower(), [])
+        if not keys:
+            return None
+        public_key = f"public.{name.lower()}"
+        return self.tables[public_key] if public_key in keys else self.tables[keys[0]]
+
+def _dsn_key(dsn: str) -> str:
+    # The DSN contains credentials: only its hash is written to disk
+    return hashlib.sha256(dsn.encode("utf-8")).hexdigest()[:16]
+
+def _fetch_fingerprint(conn) -> str:
+    with conn.cursor() as cur:
+        cur.execute(_FINGERPRINT_SQL)
+        return cur.fetchone()[0]
+
+def introspect(conn) -> SchemaCatalog:
+    """
+    Builds a catalog with four queries on one connection: fingerprint, relations, columns and foreign keys.
+    """
+    fingerprint = _fetch_fingerprint(conn)
+    tables: Dict[str, Dict[str, Any]] = {}
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(_TABLES_SQL)
+        for r in cur.fetchall():
+            approx_rows = r["approx_rows"]
+            tables[f"{r['schema']}.{r['table']}"] = {
+                "schema": r["schema"],
+                "table": r["table"],
+                "kind": r["kind"],
+                # reltuples is -1 until the table has been analyzed (PostgreSQL 14+)
+                "approx_rows": approx_rows if approx_rows is not None and approx_rows >= 0 else None,
+                "columns": [],
+                "foreign_keys": [],
+            }
+
+        cur.execute(_COLUMNS_SQL)
+        for r in cur.fetchall():
+            info = tables.get(f"{r['schema']}.{r['table']}")
+            if info is not None:
+                info["columns"].append({"name": r["column"], "data_type": r["data_type"], "nullable": r["nullable"]})
+
+        cur.execute(_FOREIGN_KEYS_SQL)
+        for r in cur.fetchall():
+            info = tables.get(f"{r['schema']}.{r['table']}")
+            if info is not None:
+                info["foreign_keys"].append({
+                    "column": r["column"],
+                    "ref_schema": r["ref_schema"],
+                    "ref_table": r["ref_table"],
+                    "ref_column": r["ref_column"],
+                })
+    conn.rollback()
+    return SchemaCatalog(fingerprint, tables)
+
+class CatalogCache:
+    """
+    Two-tier catalog cache (memory + JSON file) keyed by a hash of the DSN.
+    The fingerprint is re-checked at most once per check_interval seconds.
+    """
+    def __init__(self, path: Optional[str] = None, check_interval: float = 300):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._catalogs: Dict[str, SchemaCatalog] = {}
+        self._checked_at: Dict[str, float] = {}
+
+    @classmethod
+    def from_env(cls) -> "CatalogCache":
+        return cls(
+            path=os.getenv("CATALOG_CACHE_PATH", "schema_catalog.json") or None,
+            check_interval=float(os.getenv("CATALOG_CHECK_INTERVAL", "300")),
+        )
+
+    def get(self, refresh: bool = False) -> Optional[SchemaCatalog]:
+        """
+        Returns the catalog of the configured database, or None when it is unreachable.
+        """
+        dsn = get_pg_dsn()
+        if not dsn:
+            return None
+        key = _dsn_key(dsn)
+
+        if not refresh and time.time() - self._checked_at.get(key, 0) < self.check_interval:
+            return self._catalogs.get(key)
+
+        with self._lock:
+            if not refresh and time.time() - self._checked_at.get(key, 0) < self.check_interval:
+                return self._catalogs.get(key)
+            try:
+                catalog = self._load_or_build(key, self._catalogs.get(key), refresh)
+            except Exception as e:
+                print(f"Could not load schema catalog: {e}")
+                # Do not retry on every tool call; keep serving the last known catalog (if any)
+                self._checked_at[key] = time.time()
+                return self._catalogs.get(key)
+            self._catalogs[key] = catalog
+            self._checked_at[key] = time.time()
+            return catalog
+
+    def invalidate(self):
+        with self._lock:
+            self._catalogs.clear()
+            self._checked_at.clear()
+
+    def _load_or_build(self, key: str, current: Optional[SchemaCatalog], refresh: bool) -> SchemaCatalog:
+        pool = get_pg_pool()
+        conn = pool.getconn()
+        try:
+            fingerprint = _fetch_fingerprint(conn)
+            conn.rollback()
+            if not refresh:
+                if current is not None and current.fingerprint == fingerprint:
+                    return current
+                stored = self._read_disk(key)
+                if stored is not None and stored.fingerprint == fingerprint:
+                    print("Schema catalog loaded from disk cache.")
+                    return stored
+            print("Introspecting database schema for catalog...")
+            catalog = introspect(conn)
+        finally:
+            pool.putconn(conn)
+        self._write_disk(key, catalog)
+        return catalog
+
+    def _read_disk(self, key: str) -> Optional[SchemaCatalog]:
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f).get(key)
+            return SchemaCatalog.from_dict(data) if data else None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable catalog cache {self.path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, catalog: SchemaCatalog):
+        if not self.path:
+            return
+        try:
+            data = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            data[key] = catalog.to_dict()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except (OSError, ValueError) as e:
+            print(f"Could not write catalog cache {self.path}: {e}")
+
+_CATALOG_CACHE = None
+_CATALOG_CACHE_LOCK = threading.Lock()
+
+def get_catalog_cache() -> CatalogCache:
+    """
+    Get or create the global catalog cache.
+    """
+    global _CATALOG_CACHE
+    if _CATALOG_CACHE is None:
+        with _CATALOG_CACHE_LOCK:
+            if _CATALOG_CACHE is None:
+                _CATALOG_CACHE = CatalogCache.from_env()
+    return _CATALOG_CACHE
+
+def get_catalog(refresh: bool = False) -> Optional[SchemaCatalog]:
+    return get_catalog_cache().get(refresh=refresh)
+
+def summarize_catalog(catalog: Optional[SchemaCatalog], max_tables: Optional[int] = None, max_columns: int = 30) -> str:
+    """
+    Compact one-line-per-table summary for prompts, e.g.
+    public.orders (~1200 rows): id integer, customer_id integer -> public.customers.id
+    """
+    if catalog is None or not catalog.tables:
+        return "No schema available."
+    if max_tables is None:
+        max_tables = int(os.getenv("CATALOG_SUMMARY_MAX_TABLES", "50"))
+
+    lines = []
+    for key, info in list(catalog.tables.items())[:max_tables]:
+        fks = {fk["column"]: f"{fk['ref_schema']}.{fk['ref_table']}.{fk['ref_column']}" for fk in info["foreign_keys"]}
+        columns = []
+        for col in info["columns"][:max_columns]:
+            text = f"{col['name']} {col['data_type']}"
+            if col["name"] in fks:
+                text += f" -> {fks[col['name']]}"
+            columns.append(text)
+        if len(info["columns"]) > max_columns:
+            columns.append(f"... +{len(info['columns']) - max_columns} columns")
+        size = f"~{info['approx_rows']} rows" if info["approx_rows"] is not None else "rows unknown"
+        kind = ", view" if info["kind"] in ("v", "m") else ""
+        lines.append(f"{key} ({size}{kind}): {', '.join(columns)}")
+    if len(catalog.tables) > max_tables:
+        lines.append(f"... +{len(catalog.tables) - max_tables} more tables (use sql.list_tables)")
+    return "\n".join(lines)
+
+# --- Cached handlers for metadata tools ---
+# Each returns None when the catalog cannot answer, so callers fall back to live queries.
+# Results keep the shape of the live handlers in database.py.
+
+def cached_list_tables(schemas=None, include_system=False) -> Optional[dict]:
+    if include_system:
+        return None
+    catalog = get_catalog()
+    if catalog is None:
+        return None
+    tables = [
+        {"schema": info["schema"], "table": info["table"]}
+        for info in catalog.tables.values()
+        if info["kind"] in ("r", "p") and (not schemas or info["schema"] in schemas)
+    ]
+    return {"ok": True, "tables": tables, "count": len(tables)}
+
+def cached_describe_table(table_name: str) -> Optional[dict]:
+    catalog = get_catalog()
+    info = catalog.find(table_name) if catalog else None
+    if info is None:
+        return None
+    # Same shape as the live describe_table: column_name and data_type only
+    rows = [{"column_name": c["name"], "data_type": c["data_type"]} for c in info["columns"]]
+    return {"rows": rows, "count": len(rows)}
+
+def cached_find_related_tables(table_name: str) -> Optional[dict]:
+    catalog = get_catalog()
+    target = catalog.find(table_name) if catalog else None
+    if target is None:
+        return None
+    rows = []
+    for info in catalog.tables.values():
+        for fk in info["foreign_keys"]:
+            outgoing = info is target
+            incoming = fk["ref_schema"] == target["schema"] and fk["ref_table"] == target["table"]
+            if outgoing or incoming:
+                rows.append({
+                    "table_name": info["table"],
+                    "column_name": fk["column"],
+                    "foreign_table_name": fk["ref_table"],
+                    "foreign_column_name": fk["ref_column"],
+                })
+    return {"rows": rows, "count": len(rows)}
+
+def cached_get_schema() -> Optional[dict]:
+    catalog = get_catalog()
+    if catalog is None:
+        return None
+    rows = [
+        {"table_name": info["table"], "column_name": c["name"], "data_type": c["data_type"]}
+        for info in catalog.tables.values() if info["schema"] == "public"
+        for c in info["columns"]
+    ]
+    return {"rows": rows, "count": len(rows)}
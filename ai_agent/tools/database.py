@@ -3,61 +3,205 @@ Tool for sql.query action
 Connects to a real PostgreSQL database.
 """
 import os
+import re
 import json
+import uuid
 import psycopg2
+import psycopg2.extras
+from contextlib import contextmanager
+from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
+from .pg_pool import get_pg_dsn, get_pg_pool, current_statement_timeout
+from . import catalog
 
 class ToolError(Exception):
-    def __init__(self, code, summary, detail, hint=None, retriable=False):
+    def __init__(self, code, summary, detail, hint=None, retriable=False, details=None):
+        super().__init__(f"{code}: {detail}")
         self.code = code; self.summary = summary; self.detail = detail
         self.hint = hint; self.retriable = retriable
+        self.details = details or {}
     def to_dict(self): return vars(self)
 
+@contextmanager
 def get_pg_conn():
-    print("--- Attempting to get PostgreSQL connection ---")
-    dsn = os.getenv("POSTGRES_DSN") or (
-        f"host={os.getenv('POSTGRES_HOST')} port={os.getenv('POSTGRES_PORT','5432')} "
-        f"dbname={os.getenv('POSTGRES_DB')} user={os.getenv('POSTGRES_USER')} password={os.getenv('POSTGRES_PASSWORD')}"
-    )
-    if not dsn:
+    """
+    Borrows a connection from the shared pool and returns it when the block exits.
+    """
+    if not get_pg_dsn():
         raise ToolError("NO_DSN", "missing_connection", "No PostgreSQL DSN/credentials provided",
-                        hint="Set POSTGRES_DSN or POSTGRES_HOST/DB/USER/PASSWORD", retriable=True)
+                        hint="Set POSTGRES_DSN or POSTGRES_HOST/DB/USER/PASSWORD", retriable=False)
     try:
-        return psycopg2.connect(dsn, connect_timeout=5)
+        pool = get_pg_pool()
+        conn = pool.getconn()
     except Exception as e:
         raise ToolError("CONN_FAIL", "connection_failed", str(e), retriable=True)
 
-def query_postgres(query: str, params: tuple = None) -> dict:
+    broken = False
+    try:
+        timeout_ms = current_statement_timeout()
+        if timeout_ms:
+            # Transaction-scoped: the pool's rollback on return restores the session default
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s", (timeout_ms,))
+        yield conn
+    except psycopg2.extensions.QueryCanceledError:
+        # statement_timeout or cancellation: the connection itself is still healthy
+        raise
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # The server dropped the connection: do not hand it to the next caller
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
+
+def _raise_if_connection_lost(e: psycopg2.Error):
+    """
+    Turns a dropped connection into a retriable ToolError; other database errors are reported to the agent.
+    """
+    if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)) and not isinstance(e, psycopg2.extensions.QueryCanceledError):
+        raise ToolError("CONN_LOST", "connection_lost", str(e), retriable=True)
+
+def _row_cap() -> int:
+    return int(os.getenv("SQL_MAX_ROWS", "1000"))
+
+def _fetch_batch_size() -> int:
+    return int(os.getenv("SQL_FETCH_BATCH_SIZE", "500"))
+
+# A trailing "LIMIT n [OFFSET m]" at the top level of the query
+_TRAILING_LIMIT_RE = re.compile(r"\blimit\s+(\d+)(\s+offset\s+\d+)?\s*$", re.IGNORECASE)
+
+def _cap_query(query: str, cap: int) -> str:
+    """
+    Bounds a SELECT to cap + 1 rows (the extra row tells us the result was truncated).
+    Queries that already end with a small enough LIMIT are left untouched.
+    """
+    query = query.strip().rstrip(";").strip()
+    match = _TRAILING_LIMIT_RE.search(query)
+    if match and int(match.group(1)) <= cap:
+        return query
+    return f"SELECT * FROM ({query}) AS _capped LIMIT {cap + 1}"
+
+def _explain(conn, query: str, params: tuple = None) -> dict:
+    """
+    Returns the top plan node of EXPLAIN (FORMAT JSON) for query, without executing it.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"EXPLAIN (FORMAT JSON) {query.strip().rstrip(';')}", params)
+        plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+def _costly_nodes(plan: dict, limit: int = 3) -> list:
+    """
+    The most expensive nodes of a plan tree, flagging joins without any join condition (cartesian products).
+    """
+    nodes = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        stack.extend(node.get("Plans", []))
+        entry = {
+            "node_type": node.get("Node Type"),
+            "relation": node.get("Relation Name"),
+            "total_cost": node.get("Total Cost"),
+            "plan_rows": node.get("Plan Rows"),
+        }
+        if node.get("Node Type") == "Nested Loop" and not any(k in node for k in ("Join Filter", "Inner Unique")):
+            inner = (node.get("Plans") or [{}])[-1]
+            if not any(k in inner for k in ("Index Cond", "Filter", "Recheck Cond")):
+                entry["warning"] = "join without a join condition (cartesian product)"
+        nodes.append(entry)
+    nodes.sort(key=lambda n: (-("warning" in n), -(n["total_cost"] or 0)))
+    return nodes[:limit]
+
+def _check_query_cost(plan: dict):
+    """
+    Raises QUERY_TOO_EXPENSIVE when the planner's estimated cost exceeds SQL_MAX_ESTIMATED_COST
+    (0 disables the check). plan is the node of the query as written, below the injected row cap.
+    Row counts are not a rejection criterion: the row cap already bounds what is fetched.
+    The error carries the estimates and the costliest plan nodes so the planner can repair the query.
+    """
+    max_cost = float(os.getenv("SQL_MAX_ESTIMATED_COST", "1000000"))
+    estimated_cost = float(plan.get("Total Cost", 0))
+    if max_cost <= 0 or estimated_cost <= max_cost:
+        return
+
+    raise ToolError(
+        "QUERY_TOO_EXPENSIVE", "query_too_expensive",
+        f"Query rejected before execution: estimated cost {estimated_cost:.0f} exceeds {max_cost:.0f}",
+        hint="Add selective WHERE filters, join conditions or aggregation (COUNT/GROUP BY) instead of returning raw rows",
+        retriable=False,
+        details={
+            "estimated_cost": estimated_cost,
+            "estimated_rows": int(plan.get("Plan Rows", 0)),
+            "max_estimated_cost": max_cost,
+            "costly_nodes": _costly_nodes(plan),
+        },
+    )
+
+def _query_node(plan: dict, capped: bool) -> dict:
+    # For a capped query the injected Limit node's child is the plan of the original query
+    if capped and plan.get("Node Type") == "Limit" and plan.get("Plans"):
+        return plan["Plans"][0]
+    return plan
+
+def query_postgres(query: str, params: tuple = None, max_rows: int = None, cost_guard: bool = False) -> dict:
     """
     Executes a read-only SQL query against a Postgres database, with support for query parameters.
+    Rows are streamed through a named server-side cursor in batches of SQL_FETCH_BATCH_SIZE and
+    capped at max_rows (default: SQL_MAX_ROWS); capped results carry truncated=True and an
+    estimated_total from the planner.
+    With cost_guard=True the capped query is checked with EXPLAIN first and rejected (ToolError
+    QUERY_TOO_EXPENSIVE) when the planner's estimated cost exceeds SQL_MAX_ESTIMATED_COST.
+    Connection problems raise ToolError so the executor can retry them.
     """
-    dsn = os.getenv("POSTGRES_DSN")
-    if not dsn:
-        host = os.getenv("POSTGRES_HOST")
-        port = os.getenv("POSTGRES_PORT", "5432")
-        db = os.getenv("POSTGRES_DB")
-        user = os.getenv("POSTGRES_USER")
-        password = os.getenv("POSTGRES_PASSWORD")
-        if not all([host, db, user, password]):
-            raise ValueError("POSTGRES_DSN must be set or POSTGRES_HOST/PORT/DB/USER/PASSWORD must be provided in .env")
-        dsn = f"host={host} port={port} dbname={db} user={user} password={password} sslmode=prefer"
-
-    conn = None
+    cap = max_rows or _row_cap()
     try:
-        conn = psycopg2.connect(dsn)
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+        with get_pg_conn() as conn:
             print(f"Executing SQL Query: {query} with params: {params}")
             
             if not query.strip().upper().startswith("SELECT"):
                 raise ValueError("Only SELECT queries are allowed.")
 
-            cursor.execute(query, params)
-            
-            rows = [dict(row) for row in cursor.fetchall()]
+            capped_query = _cap_query(query, cap)
+            capped = capped_query != query.strip().rstrip(";").strip()
+            plan_rows = None
+            if cost_guard:
+                plan = _query_node(_explain(conn, capped_query, params), capped)
+                _check_query_cost(plan)
+                plan_rows = int(plan.get("Plan Rows", 0))
+
+            rows = []
+            with conn.cursor(name=f"agent_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cursor:
+                cursor.itersize = _fetch_batch_size()
+                cursor.execute(capped_query, params)
+                while len(rows) <= cap:
+                    batch = cursor.fetchmany(cursor.itersize)
+                    if not batch:
+                        break
+                    rows.extend(dict(row) for row in batch)
+
+            truncated = len(rows) > cap
+            rows = rows[:cap]
             count = len(rows)
+            estimated_total = count
+            if truncated:
+                try:
+                    if plan_rows is None:
+                        plan_rows = int(_explain(conn, query, params).get("Plan Rows", 0))
+                    estimated_total = max(plan_rows, count + 1)
+                except psycopg2.Error as e:
+                    print(f"Could not estimate total rows: {e}")
+                    conn.rollback()
+                    estimated_total = None
+                print(f"Result truncated to {cap} rows (estimated total: {estimated_total})")
             
-            return {"rows": rows, "count": count}
+            return {"rows": rows, "count": count, "truncated": truncated, "estimated_total": estimated_total}
+    except ToolError:
+        raise
     except psycopg2.Error as e:
+        _raise_if_connection_lost(e)
         error_details = {
             "error_type": "PostgreSQL Error",
             "pgcode": e.pgcode,
@@ -69,14 +213,14 @@ def query_postgres(query: str, params: tuple = None) -> dict:
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return {"error": f"An unexpected error occurred: {str(e)}", "count": 0, "rows": []}
-    finally:
-        if conn:
-            conn.close()
 
 def get_schema() -> dict:
     """
     Retrieves the schema of the PostgreSQL database.
     """
+    cached = catalog.cached_get_schema()
+    if cached is not None:
+        return cached
     query = """
     SELECT table_name, column_name, data_type 
     FROM information_schema.columns 
@@ -86,9 +230,11 @@ def get_schema() -> dict:
 
 def list_tables(schemas=None, include_system=False):
     print(f"--- Calling list_tables with schemas={schemas}, include_system={include_system} ---")
-    conn = get_pg_conn()
+    cached = catalog.cached_list_tables(schemas=schemas, include_system=include_system)
+    if cached is not None:
+        return cached
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with get_pg_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             if include_system:
                 sql = """SELECT schemaname, tablename
                          FROM pg_catalog.pg_tables
@@ -119,32 +265,21 @@ def list_tables(schemas=None, include_system=False):
         # ví dụ: permission denied for schema → gợi ý dùng list_schemas trước
         hint = "Try specifying allowed schemas or run list_schemas" if code else None
         raise ToolError(code, "sql_error", msg, hint=hint, retriable=False)
-    finally:
-        conn.close()
 
 def describe_table(table_name: str) -> dict:
     """
     Describes the structure of a specific table by fetching column names from a LIMIT 0 query.
     This is a robust method that avoids issues with information_schema permissions.
     """
+    cached = catalog.cached_describe_table(table_name)
+    if cached is not None:
+        return cached
+
     # Use a LIMIT 0 query to get column headers without fetching data.
     query = f"SELECT * FROM {table_name} LIMIT 0;"
     
-    dsn = os.getenv("POSTGRES_DSN")
-    if not dsn:
-        host = os.getenv("POSTGRES_HOST")
-        port = os.getenv("POSTGRES_PORT", "5432")
-        db = os.getenv("POSTGRES_DB")
-        user = os.getenv("POSTGRES_USER")
-        password = os.getenv("POSTGRES_PASSWORD")
-        if not all([host, db, user, password]):
-            raise ValueError("Database connection details must be set in .env")
-        dsn = f"host={host} port={port} dbname={db} user={user} password={password} sslmode=prefer"
-
-    conn = None
     try:
-        conn = psycopg2.connect(dsn)
-        with conn.cursor() as cursor:
+        with get_pg_conn() as conn, conn.cursor() as cursor:
             print(f"Executing robust schema discovery query: {query}")
             cursor.execute(query)
             
@@ -156,7 +291,10 @@ def describe_table(table_name: str) -> dict:
             
             return {"rows": columns, "count": len(columns)}
 
+    except ToolError:
+        raise
     except psycopg2.Error as e:
+        _raise_if_connection_lost(e)
         error_details = {
             "error_type": "PostgreSQL Error",
             "pgcode": e.pgcode,
@@ -168,39 +306,103 @@ def describe_table(table_name: str) -> dict:
     except Exception as e:
         print(f"An unexpected error occurred during schema discovery: {e}")
         return {"error": f"An unexpected error occurred: {str(e)}", "count": 0, "rows": []}
-    finally:
-        if conn:
-            conn.close()
 
-def get_table_info(table_name: str) -> dict:
+def _table_identifier(table_name: str) -> sql.Identifier:
     """
-    Gets detailed information about a table including row count and sample data.
+    Turns "table" or "schema.table" (optionally double-quoted) into a safely quoted identifier.
     """
-    # Note: We can't parameterize table names, so we use them directly here.
-    # This is generally safe if table names are coming from a controlled source like list_tables.
-    count_query = f"SELECT COUNT(*) as row_count FROM {table_name};"
-    count_result = query_postgres(count_query)
-    
-    sample_query = f"SELECT * FROM {table_name} LIMIT 5;"
-    sample_result = query_postgres(sample_query)
-    
-    column_query = """
-    SELECT 
-        column_name,
-        data_type,
-        is_nullable
-    FROM information_schema.columns 
-    WHERE table_name = %s
-    ORDER BY ordinal_position;
+    parts = [part.strip().strip('"') for part in table_name.strip().split(".", 1)]
+    if not all(parts):
+        raise ValueError(f"Invalid table name: {table_name!r}")
+    return sql.Identifier(*parts)
+
+# Metadata, approximate counts and a TABLESAMPLE sample in one statement.
+# reltuples is -1 (PG14+) or 0 for never-analyzed tables; pg_stat_user_tables.n_live_tup is the fallback.
+_TABLE_INFO_SQL = """
+SELECT
+    n.nspname AS schema_name,
+    c.relname AS table_name,
+    c.reltuples::bigint AS reltuples,
+    s.n_live_tup AS n_live_tup,
+    (
+        SELECT json_agg(json_build_object(
+            'column_name', a.attname,
+            'data_type', format_type(a.atttypid, a.atttypmod),
+            'is_nullable', CASE WHEN a.attnotnull THEN 'NO' ELSE 'YES' END
+        ) ORDER BY a.attnum)
+        FROM pg_attribute a
+        WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    ) AS columns,
+    {sample} AS sample_data,
+    {exact_count} AS exact_count
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE c.oid = %(table_ref)s::regclass
+"""
+
+# Small tables can come back empty from block sampling; reading their first rows is cheap
+_SAMPLED_ROWS_SQL = """COALESCE(
+        (SELECT json_agg(t) FROM (SELECT * FROM {table} TABLESAMPLE SYSTEM (%(sample_percent)s) LIMIT %(sample_size)s) t),
+        (SELECT json_agg(t) FROM (SELECT * FROM {table} LIMIT %(sample_size)s) t)
+    )"""
+# Views cannot be sampled with TABLESAMPLE
+_FIRST_ROWS_SQL = "(SELECT json_agg(t) FROM (SELECT * FROM {table} LIMIT %(sample_size)s) t)"
+
+def get_table_info(table_name: str, exact_count: bool = False, sample_size: int = 5) -> dict:
     """
-    column_result = query_postgres(column_query, (table_name,))
-    
+    Gets detailed information about a table including row count and sample data, in a single round trip.
+    The row count is the planner's estimate (pg_class.reltuples, falling back to pg_stat_user_tables)
+    unless exact_count=True, which runs COUNT(*). Sample rows come from TABLESAMPLE SYSTEM
+    (SQL_SAMPLE_PERCENT, default 1%) so large tables are not read from the start.
+    """
+    try:
+        table = _table_identifier(table_name)
+        with get_pg_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            exact = sql.SQL("(SELECT COUNT(*) FROM {table})").format(table=table) if exact_count else sql.SQL("NULL::bigint")
+            params = {
+                "table_ref": table.as_string(conn),
+                "sample_percent": float(os.getenv("SQL_SAMPLE_PERCENT", "1")),
+                "sample_size": sample_size,
+            }
+            print(f"Fetching table info for {table_name} (exact_count={exact_count})")
+            def build(sample_sql):
+                sample = sql.SQL(sample_sql).format(table=table)
+                return sql.SQL(_TABLE_INFO_SQL).format(sample=sample, exact_count=exact)
+            try:
+                cur.execute(build(_SAMPLED_ROWS_SQL), params)
+            except psycopg2.errors.WrongObjectType:
+                conn.rollback()
+                cur.execute(build(_FIRST_ROWS_SQL), params)
+            info = cur.fetchone()
+    except ToolError:
+        raise
+    except psycopg2.Error as e:
+        _raise_if_connection_lost(e)
+        print(f"A database error occurred: {e}")
+        return {"error": f"Database Error: {e.pgerror} (Code: {e.pgcode})", "table_name": table_name}
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return {"error": f"An unexpected error occurred: {str(e)}", "table_name": table_name}
+
+    if info["exact_count"] is not None:
+        row_count, source = info["exact_count"], "count"
+    elif info["reltuples"] is not None and info["reltuples"] > 0:
+        row_count, source = info["reltuples"], "pg_class.reltuples"
+    elif info["n_live_tup"] is not None:
+        row_count, source = info["n_live_tup"], "pg_stat_user_tables.n_live_tup"
+    else:
+        row_count, source = 0, "unknown"
+
+    sample_data = info["sample_data"] or []
     return {
-        "table_name": table_name,
-        "row_count": count_result.get("rows", [{}])[0].get("row_count", 0) if count_result.get("rows") else 0,
-        "columns": column_result.get("rows", []),
-        "sample_data": sample_result.get("rows", []),
-        "sample_count": len(sample_result.get("rows", []))
+        "table_name": f"{info['schema_name']}.{info['table_name']}",
+        "row_count": row_count,
+        "row_count_is_estimate": source != "count",
+        "row_count_source": source,
+        "columns": info["columns"] or [],
+        "sample_data": sample_data,
+        "sample_count": len(sample_data)
     }
 
 def search_in_table(table_name: str, column_name: str, search_term: str, limit: int = 10) -> dict:
@@ -230,6 +432,9 @@ def find_related_tables(table_name: str) -> dict:
     """
     Finds tables that might be related through foreign keys.
     """
+    cached = catalog.cached_find_related_tables(table_name)
+    if cached is not None:
+        return cached
     query = """
     SELECT 
         tc.table_name,
@@ -250,7 +455,8 @@ def find_related_tables(table_name: str) -> dict:
 
 def execute_custom_query(query: str) -> dict:
     """
-    Executes a custom SQL query with safety checks.
+    Executes a custom SQL query with safety checks: keyword blocking, then an EXPLAIN-based cost guard
+    (SQL_COST_GUARD, SQL_MAX_ESTIMATED_COST).
     """
     # Additional safety checks
     query_upper = query.strip().upper()
@@ -273,4 +479,5 @@ def execute_custom_query(query: str) -> dict:
             "rows": []
         }
     
-    return query_postgres(query)
\ No newline at end of file
+    # Pre-flight EXPLAIN rejects cartesian joins and other runaway plans before they reach the DB
+    return query_postgres(query, cost_guard=os.getenv("SQL_COST_GUARD", "true").strip().lower() in {"1", "true", "yes", "on"})
\ No newline at end of file
@@ -6,6 +6,7 @@ import os
 import base64
 import requests
 from typing import Optional, Dict, Any
+from ..scheduler import call_timeout
 
 
 GITHUB_API_BASE = os.getenv("GITHUB_API_BASE", "https://api.github.com")
@@ -47,7 +48,7 @@ def github_request(
             headers=_get_headers(),
             params=params,
             json=data if method.upper() != "GET" else None,
-            timeout=30,
+            timeout=call_timeout(30),
         )
         status = resp.status_code
         # Handle content
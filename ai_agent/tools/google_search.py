@@ -1,5 +1,7 @@
 import os
+import httplib2
 from googleapiclient.discovery import build
+from ..scheduler import call_timeout
 
 def search(query: str):
     """
@@ -13,7 +15,8 @@ def search(query: str):
         return {"error": "GOOGLE_SEARCH_API_KEY and GOOGLE_CSE_ID environment variables are not set."}
         
     try:
-        service = build("customsearch", "v1", developerKey=api_key)
+        # Bounded by the step deadline (httplib2 has no timeout by default)
+        service = build("customsearch", "v1", developerKey=api_key, http=httplib2.Http(timeout=call_timeout(20)))
         res = service.cse().list(q=query, cx=cse_id, num=5).execute()
         return res.get('items', [])
     except Exception as e:
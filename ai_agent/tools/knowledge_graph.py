@@ -1,37 +1,98 @@
 """
 Tool for kg.query action
 Connects to a real Neo4j database.
+The driver (and its Bolt connection pool) is created once and shared by all queries.
 """
 import os
-from neo4j import GraphDatabase
+import re
+import atexit
+import threading
+from neo4j import GraphDatabase, unit_of_work
+from ..scheduler import call_timeout
 
-def query_neo4j(query: str, params: dict = None) -> dict:
+_DRIVER = None
+_DRIVER_LOCK = threading.Lock()
+
+def get_driver():
     """
-    Executes a Cypher query against a Neo4j database using credentials from environment variables.
+    Returns the process-wide Neo4j driver, creating it on first use.
     """
-    uri = os.getenv("NEO4J_URI")
-    user = os.getenv("NEO4J_USERNAME")
-    password = os.getenv("NEO4J_PASSWORD")
+    global _DRIVER
+    if _DRIVER is None:
+        with _DRIVER_LOCK:
+            if _DRIVER is None:
+                uri = os.getenv("NEO4J_URI")
+                user = os.getenv("NEO4J_USERNAME") or os.getenv("NEO4J_USER")
+                password = os.getenv("NEO4J_PASSWORD")
+
+                if not all([uri, user, password]):
+                    raise ValueError("NEO4J_URI, NEO4J_USERNAME, and NEO4J_PASSWORD must be set in .env file")
+
+                print(f"Creating Neo4j driver for {uri}")
+                _DRIVER = GraphDatabase.driver(
+                    uri,
+                    auth=(user, password),
+                    max_connection_pool_size=int(os.getenv("NEO4J_MAX_POOL_SIZE", "50")),
+                    connection_acquisition_timeout=float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60")),
+                )
+    return _DRIVER
+
+def close_driver():
+    """
+    Closes the shared driver and its pooled connections. Registered to run at interpreter exit.
+    """
+    global _DRIVER
+    with _DRIVER_LOCK:
+        if _DRIVER is not None:
+            try:
+                _DRIVER.close()
+            except Exception as e:
+                print(f"Error closing Neo4j driver: {e}")
+            _DRIVER = None
+
+atexit.register(close_driver)
+
+def _run_query(tx, query: str, params: dict) -> list:
+    # Records must be consumed inside the transaction function
+    return [record.data() for record in tx.run(query, params)]
 
-    if not all([uri, user, password]):
-        raise ValueError("NEO4J_URI, NEO4J_USERNAME, and NEO4J_PASSWORD must be set in .env file")
+# Clauses that modify the graph; string literals are stripped before matching
+_WRITE_CLAUSE_RE = re.compile(r"\b(CREATE|MERGE|SET|DELETE|DETACH|REMOVE|DROP|FOREACH|LOAD\s+CSV)\b", re.IGNORECASE)
+_STRING_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
 
-    driver = None
+def resolve_access_mode(query: str, access_mode: str = None) -> str:
+    """
+    Returns "read" or "write". Without an explicit access_mode, queries containing write clauses run as writes.
+    """
+    if access_mode:
+        return "write" if str(access_mode).lower() == "write" else "read"
+    return "write" if _WRITE_CLAUSE_RE.search(_STRING_LITERAL_RE.sub("''", query or "")) else "read"
+
+def query_neo4j(query: str, params: dict = None, access_mode: str = None) -> dict:
+    """
+    Executes a Cypher query against a Neo4j database using credentials from environment variables.
+    Read queries run as managed read transactions (routed to readers in a cluster); queries with write
+    clauses, or access_mode="write", run as write transactions.
+    """
+    access_mode = resolve_access_mode(query, access_mode)
+    driver = get_driver()
+    # Within a step deadline the server aborts the transaction at the deadline, and managed
+    # retries of transient errors stop there too
+    timeout = call_timeout()
+    work = unit_of_work(timeout=timeout)(_run_query) if timeout else _run_query
+    session_config = {"max_transaction_retry_time": timeout} if timeout else {}
     try:
-        driver = GraphDatabase.driver(uri, auth=(user, password))
-        with driver.session() as session:
+        with driver.session(database=os.getenv("NEO4J_DATABASE") or None, **session_config) as session:
             print(f"Executing KG Query: {query} with params: {params}")
-            result = session.run(query, params or {})
-            
-            # Convert records to a list of dictionaries
-            records = [record.data() for record in result]
+            if access_mode == "write":
+                records = session.execute_write(work, query, params or {})
+            else:
+                records = session.execute_read(work, query, params or {})
+
             count = len(records)
-            
+
             return {"rows": records, "count": count}
     except Exception as e:
         print(f"Error connecting to or querying Neo4j: {e}")
         # Return a structured error to the agent
         return {"error": str(e), "count": 0, "rows": []}
-    finally:
-        if driver:
-            driver.close()
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""
+Process-wide PostgreSQL connection pool shared by all sql.* tools.
+Thread-safe, bounded (min/max), with health checks on idle connections,
+a maximum connection lifetime and a session-level statement_timeout.
+"""
+import os
+import time
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+def get_pg_dsn() -> Optional[str]:
+    """
+    Returns POSTGRES_DSN, or a DSN built from POSTGRES_HOST/PORT/DB/USER/PASSWORD.
+    Returns None when the connection details are incomplete.
+    """
+    dsn = os.getenv("POSTGRES_DSN")
+    if dsn:
+        return dsn
+    host = os.getenv("POSTGRES_HOST")
+    port = os.getenv("POSTGRES_PORT", "5432")
+    db = os.getenv("POSTGRES_DB")
+    user = os.getenv("POSTGRES_USER")
+    password = os.getenv("POSTGRES_PASSWORD")
+    if not all([host, db, user, password]):
+        return None
+    return f"host={host} port={port} dbname={db} user={user} password={password} sslmode=prefer"
+
+# Per-call statement timeout (ms) applied with SET LOCAL by the sql.* tools; set by the executor's step deadline
+_STATEMENT_TIMEOUT_MS: contextvars.ContextVar = contextvars.ContextVar("pg_statement_timeout_ms", default=None)
+
+@contextmanager
+def statement_timeout(timeout_ms: Optional[int]):
+    """
+    Limits every statement run inside the block to timeout_ms, so the server cancels work past a step deadline.
+    """
+    token = _STATEMENT_TIMEOUT_MS.set(int(timeout_ms) if timeout_ms else None)
+    try:
+        yield
+    finally:
+        _STATEMENT_TIMEOUT_MS.reset(token)
+
+def current_statement_timeout() -> Optional[int]:
+    return _STATEMENT_TIMEOUT_MS.get()
+
+class PgPoolTimeout(Exception):
+    """Raised when no connection becomes available within the acquire timeout."""
+
+class PgPool:
+    """
+    Wraps psycopg2's ThreadedConnectionPool.
+    - getconn() blocks (up to acquire_timeout) instead of failing when all connections are busy.
+    - Connections idle longer than health_check_idle are probed with SELECT 1 before reuse.
+    - Connections older than max_lifetime are closed and replaced.
+    """
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10, max_lifetime: float = 1800,
+                 health_check_idle: float = 30, statement_timeout_ms: int = 30000,
+                 connect_timeout: int = 5, acquire_timeout: float = 30):
+        self.maxconn = max(1, maxconn)
+        self.minconn = max(0, min(minconn, self.maxconn))
+        self.max_lifetime = max_lifetime
+        self.health_check_idle = health_check_idle
+        self.acquire_timeout = acquire_timeout
+
+        connect_kwargs = {"connect_timeout": connect_timeout}
+        if statement_timeout_ms > 0:
+            # Set at connection startup so the limit survives rollbacks between borrowers
+            connect_kwargs["options"] = f"-c statement_timeout={statement_timeout_ms}"
+
+        self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, dsn, **connect_kwargs)
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._lock = threading.Lock()
+        self._created_at: Dict[int, float] = {}
+        self._returned_at: Dict[int, float] = {}
+        self._stats = {"acquired": 0, "created": 0, "recycled": 0, "health_check_failed": 0}
+
+    @classmethod
+    def from_env(cls, dsn: str) -> "PgPool":
+        return cls(
+            dsn,
+            minconn=int(os.getenv("POSTGRES_POOL_MIN", "1")),
+            maxconn=int(os.getenv("POSTGRES_POOL_MAX", "10")),
+            max_lifetime=float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "1800")),
+            health_check_idle=float(os.getenv("POSTGRES_POOL_HEALTHCHECK_IDLE", "30")),
+            statement_timeout_ms=int(os.getenv("POSTGRES_STATEMENT_TIMEOUT_MS", "30000")),
+            connect_timeout=int(os.getenv("POSTGRES_CONNECT_TIMEOUT", "5")),
+            acquire_timeout=float(os.getenv("POSTGRES_POOL_ACQUIRE_TIMEOUT", "30")),
+        )
+
+    def getconn(self):
+        """
+        Borrows a healthy connection. Must be returned with putconn().
+        """
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PgPoolTimeout(f"No PostgreSQL connection available after {self.acquire_timeout}s")
+        try:
+            conn = self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats["acquired"] += 1
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        """
+        Returns a borrowed connection. Open transactions are rolled back by the pool;
+        broken connections (or close=True) are discarded.
+        """
+        try:
+            if conn.closed:
+                close = True
+            self._release(conn, close)
+        finally:
+            self._slots.release()
+
+    def _checkout(self):
+        # Retry a few times in case several stale connections are queued in the pool
+        for _ in range(self.maxconn + 1):
+            conn = self._pool.getconn()
+            key = id(conn)
+            now = time.time()
+            with self._lock:
+                if key not in self._created_at:
+                    self._created_at[key] = now
+                    self._stats["created"] += 1
+                created_at = self._created_at[key]
+                returned_at = self._returned_at.get(key, now)
+
+            if conn.closed or now - created_at > self.max_lifetime:
+                with self._lock:
+                    self._stats["recycled"] += 1
+                self._release(conn, close=True)
+                continue
+            if now - returned_at > self.health_check_idle and not self._is_healthy(conn):
+                with self._lock:
+                    self._stats["health_check_failed"] += 1
+                self._release(conn, close=True)
+                continue
+            return conn
+        raise psycopg2.OperationalError("Could not obtain a healthy PostgreSQL connection from the pool")
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _release(self, conn, close: bool):
+        key = id(conn)
+        with self._lock:
+            if close:
+                self._created_at.pop(key, None)
+                self._returned_at.pop(key, None)
+            else:
+                self._returned_at[key] = time.time()
+        try:
+            self._pool.putconn(conn, close=close)
+        except Exception as e:
+            print(f"Failed to return PostgreSQL connection to pool: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open"] = len(self._created_at)
+        stats["max"] = self.maxconn
+        return stats
+
+    def close(self):
+        self._pool.closeall()
+        with self._lock:
+            self._created_at.clear()
+            self._returned_at.clear()
+
+_PG_POOL = None
+_PG_POOL_LOCK = threading.Lock()
+
+def get_pg_pool() -> PgPool:
+    """
+    Returns the process-wide pool, creating it on first use.
+    Raises ValueError when no connection details are configured.
+    """
+    global _PG_POOL
+    if _PG_POOL is None:
+        with _PG_POOL_LOCK:
+            if _PG_POOL is None:
+                dsn = get_pg_dsn()
+                if not dsn:
+                    raise ValueError("POSTGRES_DSN must be set or POSTGRES_HOST/PORT/DB/USER/PASSWORD must be provided in .env")
+                _PG_POOL = PgPool.from_env(dsn)
+    return _PG_POOL
+
+def close_pg_pool():
+    """
+    Closes every pooled connection. Registered to run at interpreter exit.
+    """
+    global _PG_POOL
+    with _PG_POOL_LOCK:
+        if _PG_POOL is not None:
+            _PG_POOL.close()
+            _PG_POOL = None
+
+atexit.register(close_pg_pool)
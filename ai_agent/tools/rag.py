@@ -1,13 +1,17 @@
 """
 Tool for rag.search action
-Connects to Milvus and uses DeepSeek/Gemini for embeddings.
+Connects to Milvus and uses Gemini embeddings (via the shared embedding service).
 Now supports authenticated Milvus (token or user/password) and secure (TLS) connections.
 """
 import os
-import requests
-from typing import Dict, Any, Optional
+import json
+import time
+import atexit
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
 from pymilvus import utility, connections, Collection
-from ..llm_client import get_llm_client
+from ..embeddings import get_embedding_service
+from ..scheduler import call_timeout
 
 # --- Milvus Admin Tool --- #
 def _str_to_bool(value: Optional[str]) -> bool:
@@ -76,23 +80,162 @@ def _connect_to_milvus() -> None:
     connections.connect("default", **connect_kwargs)
 
 
+def _parse_index_params(raw_params) -> Dict[str, Any]:
+    """
+    pymilvus returns index params either as a dict or as a JSON string.
+    """
+    if isinstance(raw_params, dict):
+        return raw_params
+    if isinstance(raw_params, str):
+        try:
+            return json.loads(raw_params)
+        except Exception:
+            return {"raw": raw_params}
+    return {}
+
+
+class MilvusManager:
+    """
+    Long-lived Milvus connection plus a cache of loaded Collection handles and their index metadata.
+    Connection failures trigger one reconnect-and-retry; cached handles expire after collection_ttl seconds.
+    """
+    ALIAS = "default"
+
+    def __init__(self, collection_ttl: float = 600):
+        self.collection_ttl = collection_ttl
+        self._lock = threading.RLock()
+        self._connected = False
+        # name -> (Collection, index metadata, loaded_at)
+        self._collections: Dict[str, Tuple[Collection, Dict[str, Any], float]] = {}
+        # name -> set once the in-flight load of that collection finishes
+        self._loading: Dict[str, threading.Event] = {}
+
+    def connect(self, force: bool = False) -> None:
+        with self._lock:
+            if self._connected and not force and connections.has_connection(self.ALIAS):
+                return
+            if force:
+                self._disconnect()
+            _connect_to_milvus()
+            self._connected = True
+
+    def get_collection(self, name: str) -> Tuple[Collection, Dict[str, Any]]:
+        """
+        Returns a loaded Collection and its parsed index metadata, loading it only on first use.
+        Loading runs outside the manager lock: calls on other collections are not held up, and
+        callers of a collection being loaded wait for that load (or reuse its expired handle).
+        """
+        while True:
+            with self._lock:
+                entry = self._collections.get(name)
+                if entry and time.time() - entry[2] < self.collection_ttl:
+                    return entry[0], entry[1]
+                loading = self._loading.get(name)
+                if loading is None:
+                    loading = self._loading[name] = threading.Event()
+                    break
+                if entry:
+                    # Being refreshed by another thread; the expired handle is still usable
+                    return entry[0], entry[1]
+            if not loading.wait(call_timeout()):
+                raise TimeoutError(f"Timed out waiting for Milvus collection '{name}' to load")
+            # The load finished (or failed): look again, and load it ourselves if it failed
+
+        try:
+            self.connect()
+            if not utility.has_collection(name, using=self.ALIAS, timeout=call_timeout()):
+                with self._lock:
+                    self._collections.pop(name, None)
+                raise ValueError(f"Collection '{name}' does not exist in Milvus.")
+            collection_obj = Collection(name, using=self.ALIAS)
+            if entry is None:
+                print(f"Loading Milvus collection '{name}'...")
+            collection_obj.load(timeout=call_timeout())
+
+            indexes = [_parse_index_params(getattr(idx, "params", None)) for idx in collection_obj.indexes]
+            first = indexes[0] if indexes else {}
+            index_info = {
+                "indexes": indexes,
+                "metric_type": (first.get("metric_type") or first.get("metricType") or "").upper() or None,
+                "index_type": first.get("index_type") or first.get("indexType"),
+            }
+            with self._lock:
+                self._collections[name] = (collection_obj, index_info, time.time())
+            return collection_obj, index_info
+        finally:
+            with self._lock:
+                self._loading.pop(name, None)
+            loading.set()
+
+    def run(self, fn: Callable[[], Any]) -> Any:
+        """
+        Runs fn against the shared connection, reconnecting once if the call fails.
+        ValueError is reserved for caller mistakes (e.g. unknown collection) and is not retried,
+        and neither is a call that used up its step deadline.
+        """
+        self.connect()
+        try:
+            return fn()
+        except ValueError:
+            raise
+        except Exception as e:
+            if call_timeout(minimum=0) == 0:
+                raise
+            print(f"Milvus call failed ({e}); reconnecting and retrying once.")
+            self.connect(force=True)
+            return fn()
+
+    def _disconnect(self) -> None:
+        self._collections.clear()
+        self._connected = False
+        try:
+            connections.disconnect(self.ALIAS)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._disconnect()
+
+
+_MILVUS_MANAGER = None
+_MILVUS_MANAGER_LOCK = threading.Lock()
+
+def get_milvus_manager() -> MilvusManager:
+    """
+    Get or create the global Milvus connection manager.
+    """
+    global _MILVUS_MANAGER
+    if _MILVUS_MANAGER is None:
+        with _MILVUS_MANAGER_LOCK:
+            if _MILVUS_MANAGER is None:
+                _MILVUS_MANAGER = MilvusManager(
+                    collection_ttl=float(os.getenv("MILVUS_COLLECTION_CACHE_TTL", "600"))
+                )
+    return _MILVUS_MANAGER
+
+def close_milvus() -> None:
+    """
+    Drops the shared Milvus connection and cached collections. Registered to run at interpreter exit.
+    """
+    if _MILVUS_MANAGER is not None:
+        _MILVUS_MANAGER.close()
+
+atexit.register(close_milvus)
+
+
 def list_milvus_collections() -> dict:
     """
     Lists all collection names in the Milvus database.
     """
     try:
-        _connect_to_milvus()
+        manager = get_milvus_manager()
         print("Listing collections from Milvus...")
-        names = utility.list_collections()
+        names = manager.run(lambda: utility.list_collections(using=MilvusManager.ALIAS, timeout=call_timeout()))
         return {"collections": names, "count": len(names)}
     except Exception as e:
         print(f"Error listing Milvus collections: {e}")
         return {"error": str(e), "count": 0, "collections": []}
-    finally:
-        try:
-            connections.disconnect("default")
-        except Exception:
-            pass
 
 def describe_milvus_index(collection: str) -> dict:
     """
@@ -100,58 +243,13 @@ def describe_milvus_index(collection: str) -> dict:
     Returns index_type, metric_type, and raw params when possible.
     """
     try:
-        _connect_to_milvus()
-        if not utility.has_collection(collection):
-            return {"error": f"Collection '{collection}' does not exist", "indexes": []}
-        col = Collection(collection)
-        col.load()
-        indexes_info = []
-        for idx in col.indexes:
-            raw_params = getattr(idx, "params", None)
-            parsed = {}
-            if isinstance(raw_params, dict):
-                parsed = raw_params
-            elif isinstance(raw_params, str):
-                try:
-                    import json as _json
-                    parsed = _json.loads(raw_params)
-                except Exception:
-                    parsed = {"raw": raw_params}
-            indexes_info.append(parsed)
-        return {"collection": collection, "indexes": indexes_info}
+        manager = get_milvus_manager()
+        _, index_info = manager.run(lambda: manager.get_collection(collection))
+        return {"collection": collection, "indexes": index_info["indexes"]}
+    except ValueError:
+        return {"error": f"Collection '{collection}' does not exist", "indexes": []}
     except Exception as e:
         return {"error": str(e), "indexes": []}
-    finally:
-        try:
-            connections.disconnect("default")
-        except Exception:
-            pass
-
-# --- Temporary DeepSeek Embedding Client --- #
-# This will be moved to a dedicated client later
-def get_embedding(text: str) -> list[float]:
-    """
-    Generates embedding for a given text using the DeepSeek API.
-    """
-    api_key = os.getenv("DEEPSEEK_API_KEY")
-    api_base = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com/v1")
-    
-    if not api_key:
-        raise ValueError("DEEPSEEK_API_KEY must be set in .env file")
-
-    response = requests.post(
-        f"{api_base}/embeddings",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        },
-        json={
-            "model": "embedding.default", # Or another specific model
-            "input": text
-        }
-    )
-    response.raise_for_status()  # Raise an exception for bad status codes
-    return response.json()["data"][0]["embedding"]
 
 # --- Milvus Search Tool --- #
 
@@ -173,66 +271,47 @@ def search_milvus(
         return {"error": "Missing 'collection' parameter", "count": 0, "docs": [], "scores": []}
 
     try:
-        # 1. Connect to Milvus
-        _connect_to_milvus()
-
-        # 2. Check if collection exists and is loaded
-        if not utility.has_collection(target_collection):
-            raise ValueError(f"Collection '{target_collection}' does not exist in Milvus.")
-        collection_obj = Collection(target_collection)
-        collection_obj.load()
+        manager = get_milvus_manager()
 
-        # 3. Generate embedding for the query
+        # 1. Generate embedding for the query
         print(f"Generating embedding for query: '{query}'")
-        # Prefer Gemini via global llm_client
-        query_vector = get_llm_client().get_embedding(query)
+        # Shared embedding service: repeated queries are served from its cache
+        query_vector = get_embedding_service().embed(query).tolist()
 
-        # 4. Compose search parameters (auto-detect metric_type from index if not provided)
-        detected_metric = None
-        index_type = None
-        try:
-            if collection_obj.indexes:
-                idx = collection_obj.indexes[0]
-                # pymilvus: idx.params can be dict or JSON string
-                raw_params = getattr(idx, "params", None)
-                idx_params: Dict[str, Any] = {}
-                if isinstance(raw_params, dict):
-                    idx_params = raw_params
-                elif isinstance(raw_params, str):
-                    try:
-                        import json as _json
-                        idx_params = _json.loads(raw_params)
-                    except Exception:
-                        idx_params = {}
-                detected_metric = (idx_params.get("metric_type") or idx_params.get("metricType") or "").upper() or None
-                index_type = idx_params.get("index_type") or idx_params.get("indexType")
-        except Exception:
-            pass
+        def run_search():
+            # 2. Reuse the loaded collection and its index metadata (loaded on first use only)
+            collection_obj, index_info = manager.get_collection(target_collection)
+            detected_metric = index_info["metric_type"]
+            index_type = index_info["index_type"]
 
-        mt = (metric_type or detected_metric or os.getenv("MILVUS_DEFAULT_METRIC", "COSINE")).upper()
-        # Build base params with sensible defaults
-        search_params_inner: Dict[str, Any] = {}
-        if params and isinstance(params, dict):
-            search_params_inner.update(params)
-        else:
-            # Heuristic defaults based on index type
-            if (index_type or "").upper() == "HNSW":
-                search_params_inner.setdefault("ef", int(os.getenv("MILVUS_SEARCH_EF", "64")))
+            # 3. Compose search parameters (auto-detect metric_type from index if not provided)
+            mt = (metric_type or detected_metric or os.getenv("MILVUS_DEFAULT_METRIC", "COSINE")).upper()
+            # Build base params with sensible defaults
+            search_params_inner: Dict[str, Any] = {}
+            if params and isinstance(params, dict):
+                search_params_inner.update(params)
             else:
-                search_params_inner.setdefault("nprobe", int(os.getenv("MILVUS_SEARCH_NPROBE", "10")))
-
-        search_params = {"metric_type": mt, "params": search_params_inner}
-        print(f"Executing RAG Search in '{target_collection}' with top_k={top_k} | metric={mt} | index={index_type}")
-        
-        results = collection_obj.search(
-            data=[query_vector],
-            anns_field=anns_field,
-            param=search_params,
-            limit=top_k,
-            output_fields=["*"] # Get all metadata fields
-        )
-
-        # 5. Process and return results
+                # Heuristic defaults based on index type
+                if (index_type or "").upper() == "HNSW":
+                    search_params_inner.setdefault("ef", int(os.getenv("MILVUS_SEARCH_EF", "64")))
+                else:
+                    search_params_inner.setdefault("nprobe", int(os.getenv("MILVUS_SEARCH_NPROBE", "10")))
+
+            search_params = {"metric_type": mt, "params": search_params_inner}
+            print(f"Executing RAG Search in '{target_collection}' with top_k={top_k} | metric={mt} | index={index_type}")
+
+            return collection_obj.search(
+                data=[query_vector],
+                anns_field=anns_field,
+                param=search_params,
+                limit=top_k,
+                output_fields=["*"], # Get all metadata fields
+                timeout=call_timeout(),
+            )
+
+        results = manager.run(run_search)
+
+        # 4. Process and return results
         hits = results[0]
         scores = list(hits.distances)
         docs = [hit.entity.to_dict() for hit in hits]
@@ -243,9 +322,3 @@ def search_milvus(
     except Exception as e:
         print(f"Error during Milvus search: {e}")
         return {"error": str(e), "count": 0, "docs": [], "scores": []}
-    finally:
-        # Disconnect from Milvus
-        try:
-            connections.disconnect("default")
-        except Exception:
-            pass # Ignore if already disconnected
\ No newline at end of file
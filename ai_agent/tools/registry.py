@@ -0,0 +1,354 @@
+"""
+Tool registry keyed by the Action enum.
+Each ToolSpec declares the handler plus the metadata used for dispatch, validation,
+scheduling (timeouts, retries, concurrency) and caching decisions.
+Prompts and the default tool inventory are generated from this registry.
+"""
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from ..state import Action
+from . import database, rag, knowledge_graph, web, google_search
+from . import github as github_tool
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Retries for failures marked retriable. After failed attempt n (1-based) the delay is
+    min(backoff_max_s, backoff_base_s * 2**(n - 1)) * uniform(0.5, 1.0) (see scheduler.backoff_delay).
+    """
+    max_retries: int = 0
+    backoff_base_s: float = 0.5
+    backoff_max_s: float = 8.0
+
+@dataclass(frozen=True)
+class ToolSpec:
+    action: Action
+    handler: Callable[..., Any]
+    backend: str  # postgres | milvus | neo4j | general (groups tools in prompts)
+    description: str
+    # param -> {"type": ..., "required": bool, "default": ...}
+    input_schema: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    example_input: Dict[str, Any] = field(default_factory=dict)
+    example_expect: Dict[str, Any] = field(default_factory=dict)
+    note: Optional[str] = None
+    timeout_s: float = 30
+    retry: RetryPolicy = RetryPolicy()
+    # True/False, or a predicate on the input for tools whose side effects depend on it
+    idempotent: Union[bool, Callable[[Dict[str, Any]], bool]] = True
+    cacheable: bool = False
+    cache_ttl_s: float = 60  # How long a cached result stays valid (see tools/result_cache.py)
+    concurrency_class: str = "local"  # postgres | milvus | neo4j | http | local
+    cost_weight: float = 1.0
+
+    def is_idempotent(self, tool_input: Dict[str, Any]) -> bool:
+        return self.idempotent(tool_input or {}) if callable(self.idempotent) else self.idempotent
+
+    def prepare_input(self, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validates the planner's input against input_schema: fills defaults,
+        drops unknown keys and raises ValueError when a required key is missing.
+        """
+        tool_input = tool_input or {}
+        unknown = [key for key in tool_input if key not in self.input_schema]
+        if unknown:
+            print(f"Ignoring unknown input keys for {self.action.value}: {unknown}")
+
+        kwargs = {}
+        for name, schema in self.input_schema.items():
+            if name in tool_input and tool_input[name] is not None:
+                kwargs[name] = tool_input[name]
+            elif "default" in schema:
+                kwargs[name] = schema["default"]
+            elif schema.get("required"):
+                raise ValueError(f"Missing required input '{name}' for {self.action.value}")
+        return kwargs
+
+    def call(self, tool_input: Dict[str, Any]) -> Any:
+        """
+        Validates tool_input and runs the handler.
+        """
+        return self.invoke(self.prepare_input(tool_input))
+
+    def invoke(self, kwargs: Dict[str, Any]) -> Any:
+        """
+        Runs the handler with already prepared inputs, within the concurrency limit of its class.
+        """
+        semaphore = _get_class_semaphore(self.concurrency_class)
+        if semaphore is None:
+            return self.handler(**kwargs)
+        with semaphore:
+            return self.handler(**kwargs)
+
+# --- Concurrency classes --- #
+# Max concurrent calls per backend across all parallel steps; 0 = unbounded.
+# Override with TOOL_CONCURRENCY_<CLASS>, e.g. TOOL_CONCURRENCY_MILVUS=1
+DEFAULT_CONCURRENCY_LIMITS = {"postgres": 4, "milvus": 2, "neo4j": 4, "http": 4, "local": 0}
+
+_CLASS_SEMAPHORES: Dict[str, Optional[threading.BoundedSemaphore]] = {}
+_CLASS_SEMAPHORES_LOCK = threading.Lock()
+
+def _get_class_semaphore(concurrency_class: str) -> Optional[threading.BoundedSemaphore]:
+    if concurrency_class not in _CLASS_SEMAPHORES:
+        with _CLASS_SEMAPHORES_LOCK:
+            if concurrency_class not in _CLASS_SEMAPHORES:
+                env_value = os.getenv(f"TOOL_CONCURRENCY_{concurrency_class.upper()}")
+                limit = int(env_value) if env_value else DEFAULT_CONCURRENCY_LIMITS.get(concurrency_class, 0)
+                _CLASS_SEMAPHORES[concurrency_class] = threading.BoundedSemaphore(limit) if limit > 0 else None
+    return _CLASS_SEMAPHORES[concurrency_class]
+
+# --- Handlers that need adapting --- #
+
+def _plan_note(note: str) -> dict:
+    return {"note": note}
+
+def _github_is_idempotent(tool_input: Dict[str, Any]) -> bool:
+    return str(tool_input.get("method", "GET")).upper() in ("GET", "HEAD")
+
+def _kg_is_idempotent(tool_input: Dict[str, Any]) -> bool:
+    return knowledge_graph.resolve_access_mode(tool_input.get("query"), tool_input.get("access_mode")) == "read"
+
+_TABLE_NAME = {"table_name": {"type": "string", "required": True}}
+_SQL_RETRY = RetryPolicy(max_retries=2, backoff_base_s=0.5, backoff_max_s=4.0)
+_REMOTE_RETRY = RetryPolicy(max_retries=2, backoff_base_s=1.0, backoff_max_s=8.0)
+
+_SPECS: List[ToolSpec] = [
+    # --- PostgreSQL --- #
+    ToolSpec(
+        action=Action.SQL_LIST_TABLES,
+        handler=database.list_tables,
+        backend="postgres",
+        description="Liệt kê tất cả các bảng trong cơ sở dữ liệu PostgreSQL.",
+        input_schema={
+            "schemas": {"type": "array", "default": None},
+            "include_system": {"type": "boolean", "default": False},
+        },
+        example_expect={"min_rows": 1},
+        timeout_s=15, retry=_SQL_RETRY, cacheable=True, cache_ttl_s=300, concurrency_class="postgres", cost_weight=0.2,
+    ),
+    ToolSpec(
+        action=Action.SQL_DESCRIBE_TABLE,
+        handler=database.describe_table,
+        backend="postgres",
+        description="Mô tả cấu trúc chi tiết của một bảng cụ thể trong PostgreSQL.",
+        input_schema=_TABLE_NAME,
+        example_input={"table_name": "ten_bang"},
+        example_expect={"min_rows": 1},
+        timeout_s=15, retry=_SQL_RETRY, cacheable=True, cache_ttl_s=300, concurrency_class="postgres", cost_weight=0.2,
+    ),
+    ToolSpec(
+        action=Action.SQL_CUSTOM_QUERY,
+        handler=database.execute_custom_query,
+        backend="postgres",
+        description="Thực thi truy vấn SQL tùy chỉnh trong PostgreSQL (chỉ SELECT, có kiểm tra bảo mật).",
+        input_schema={"query": {"type": "string", "required": True}},
+        example_input={"query": "SELECT * FROM table WHERE condition"},
+        example_expect={"min_rows": 0},
+        timeout_s=60, retry=_SQL_RETRY, cacheable=True, concurrency_class="postgres", cost_weight=1.0,
+    ),
+    ToolSpec(
+        action=Action.SQL_QUERY,
+        handler=database.execute_custom_query,
+        backend="postgres",
+        description="Giống sql.custom_query: thực thi truy vấn SELECT trong PostgreSQL.",
+        input_schema={"query": {"type": "string", "required": True}},
+        example_input={"query": "SELECT * FROM table LIMIT 10"},
+        example_expect={"min_rows": 0},
+        timeout_s=60, retry=_SQL_RETRY, cacheable=True, concurrency_class="postgres", cost_weight=1.0,
+    ),
+    ToolSpec(
+        action=Action.SQL_GET_SCHEMA,
+        handler=database.get_schema,
+        backend="postgres",
+        description="Lấy schema của cơ sở dữ liệu PostgreSQL (tên bảng, tên cột, kiểu dữ liệu).",
+        example_expect={"min_rows": 1},
+        timeout_s=20, retry=_SQL_RETRY, cacheable=True, cache_ttl_s=300, concurrency_class="postgres", cost_weight=0.3,
+    ),
+    ToolSpec(
+        action=Action.SQL_GET_TABLE_INFO,
+        handler=database.get_table_info,
+        backend="postgres",
+        description="Lấy thông tin chi tiết về bảng PostgreSQL bao gồm số lượng dòng (ước tính, exact_count=true để đếm chính xác), cột và dữ liệu mẫu.",
+        input_schema={
+            "table_name": {"type": "string", "required": True},
+            "exact_count": {"type": "boolean", "default": False},
+        },
+        example_input={"table_name": "ten_bang"},
+        example_expect={"min_rows": 1},
+        timeout_s=30, retry=_SQL_RETRY, cacheable=True, concurrency_class="postgres", cost_weight=0.8,
+    ),
+    ToolSpec(
+        action=Action.SQL_SEARCH_IN_TABLE,
+        handler=database.search_in_table,
+        backend="postgres",
+        description="Tìm kiếm dữ liệu trong một cột cụ thể của bảng PostgreSQL.",
+        input_schema={
+            "table_name": {"type": "string", "required": True},
+            "column_name": {"type": "string", "required": True},
+            "search_term": {"type": "string", "required": True},
+            "limit": {"type": "integer", "default": 10},
+        },
+        example_input={"table_name": "ten_bang", "column_name": "ten_cot", "search_term": "tu_khoa", "limit": 10},
+        example_expect={"min_rows": 0},
+        timeout_s=30, retry=_SQL_RETRY, cacheable=True, concurrency_class="postgres", cost_weight=0.8,
+    ),
+    ToolSpec(
+        action=Action.SQL_GET_DISTINCT_VALUES,
+        handler=database.get_distinct_values,
+        backend="postgres",
+        description="Lấy các giá trị duy nhất từ một cột cụ thể trong PostgreSQL.",
+        input_schema={
+            "table_name": {"type": "string", "required": True},
+            "column_name": {"type": "string", "required": True},
+            "limit": {"type": "integer", "default": 50},
+        },
+        example_input={"table_name": "ten_bang", "column_name": "ten_cot", "limit": 50},
+        example_expect={"min_rows": 0},
+        timeout_s=30, retry=_SQL_RETRY, cacheable=True, concurrency_class="postgres", cost_weight=0.8,
+    ),
+    ToolSpec(
+        action=Action.SQL_GET_TABLE_STATS,
+        handler=database.get_table_statistics,
+        backend="postgres",
+        description="Lấy thống kê về bảng PostgreSQL từ pg_stats.",
+        input_schema=_TABLE_NAME,
+        example_input={"table_name": "ten_bang"},
+        example_expect={"min_rows": 0},
+        timeout_s=15, retry=_SQL_RETRY, cacheable=True, cache_ttl_s=300, concurrency_class="postgres", cost_weight=0.3,
+    ),
+    ToolSpec(
+        action=Action.SQL_FIND_RELATED_TABLES,
+        handler=database.find_related_tables,
+        backend="postgres",
+        description="Tìm các bảng PostgreSQL liên quan thông qua foreign key.",
+        input_schema=_TABLE_NAME,
+        example_input={"table_name": "ten_bang"},
+        example_expect={"min_rows": 0},
+        timeout_s=15, retry=_SQL_RETRY, cacheable=True, cache_ttl_s=300, concurrency_class="postgres", cost_weight=0.2,
+    ),
+    # --- Milvus --- #
+    ToolSpec(
+        action=Action.MILVUS_LIST_COLLECTIONS,
+        handler=rag.list_milvus_collections,
+        backend="milvus",
+        description="Liệt kê tên tất cả các collection trong Milvus.",
+        example_expect={"min_rows": 1},
+        timeout_s=15, retry=_REMOTE_RETRY, cacheable=True, cache_ttl_s=300, concurrency_class="milvus", cost_weight=0.2,
+    ),
+    ToolSpec(
+        action=Action.MILVUS_DESCRIBE_INDEX,
+        handler=rag.describe_milvus_index,
+        backend="milvus",
+        description="Mô tả cấu hình index của một collection Milvus (index_type, metric_type, params).",
+        input_schema={"collection": {"type": "string", "required": True}},
+        example_input={"collection": "ten_collection"},
+        example_expect={"min_rows": 1},
+        timeout_s=30, retry=_REMOTE_RETRY, cacheable=True, cache_ttl_s=300, concurrency_class="milvus", cost_weight=0.3,
+    ),
+    ToolSpec(
+        action=Action.RAG_SEARCH,
+        handler=rag.search_milvus,
+        backend="milvus",
+        description="Tìm kiếm thông tin trong cơ sở dữ liệu vector Milvus.",
+        input_schema={
+            "query": {"type": "string", "required": True},
+            "top_k": {"type": "integer", "default": 5},
+            "collection": {"type": "string"},
+            "collection_name": {"type": "string"},
+            "metric_type": {"type": "string"},
+            "anns_field": {"type": "string"},
+            "params": {"type": "object"},
+        },
+        example_input={"query": "chủ đề cần tìm", "top_k": 5, "collection": "ten_collection"},
+        example_expect={"min_docs": 3, "min_score": 0.2},
+        timeout_s=30, retry=_REMOTE_RETRY, cacheable=True, cache_ttl_s=120, concurrency_class="milvus", cost_weight=1.5,
+    ),
+    # --- Neo4j --- #
+    ToolSpec(
+        action=Action.KG_QUERY,
+        handler=knowledge_graph.query_neo4j,
+        backend="neo4j",
+        description="Truy vấn cơ sở dữ liệu đồ thị Neo4j bằng Cypher (access_mode=\"write\" cho truy vấn ghi; mặc định tự nhận diện).",
+        input_schema={
+            "query": {"type": "string", "required": True},
+            "params": {"type": "object", "default": None},
+            "access_mode": {"type": "string", "default": None},
+        },
+        example_input={"query": "MATCH (n) RETURN n LIMIT 1", "params": {}},
+        example_expect={"min_rows": 1},
+        timeout_s=30, retry=_REMOTE_RETRY, idempotent=_kg_is_idempotent, cacheable=True,
+        concurrency_class="neo4j", cost_weight=1.0,
+    ),
+    # --- General --- #
+    ToolSpec(
+        action=Action.HTTP_GET,
+        handler=web.get_http,
+        backend="general",
+        description="Lấy nội dung từ một URL.",
+        input_schema={
+            "url": {"type": "string", "required": True},
+            "timeout": {"type": "integer", "default": 10},
+        },
+        example_input={"url": "https://example.com", "timeout": 10},
+        example_expect={"non_empty": True, "must_contain": ["keyword1", "keyword2"]},
+        timeout_s=20, retry=_REMOTE_RETRY, cacheable=True, cache_ttl_s=120, concurrency_class="http", cost_weight=0.5,
+    ),
+    ToolSpec(
+        action=Action.PLAN_NOTE,
+        handler=_plan_note,
+        backend="general",
+        description="Ghi lại một ghi chú hoặc kết quả trung gian.",
+        input_schema={"note": {"type": "string", "default": "No note provided"}},
+        example_input={"note": "Nội dung cần ghi chú"},
+        timeout_s=1, cacheable=False, concurrency_class="local", cost_weight=0.0,
+    ),
+    ToolSpec(
+        action=Action.GITHUB_REQUEST,
+        handler=github_tool.github_request,
+        backend="general",
+        description="Gọi GitHub REST API để lấy thông tin repo/issues/PR/file.",
+        input_schema={
+            "method": {"type": "string", "default": "GET"},
+            "path": {"type": "string", "required": True},
+            "params": {"type": "object", "default": None},
+            "data": {"type": "object", "default": None},
+        },
+        example_input={"method": "GET", "path": "/repos/{owner}/{repo}", "params": {}},
+        example_expect={"status": 200},
+        timeout_s=30, retry=_REMOTE_RETRY, idempotent=_github_is_idempotent, cacheable=True,
+        concurrency_class="http", cost_weight=0.5,
+    ),
+    ToolSpec(
+        action=Action.GOOGLE_SEARCH,
+        handler=google_search.search,
+        backend="general",
+        description="Tìm kiếm thông tin trên Google (CHỈ DÙNG KHI CẦN THIẾT).",
+        input_schema={"query": {"type": "string", "required": True}},
+        example_input={"query": "chủ đề cần tìm"},
+        example_expect={"min_results": 1},
+        note="CHI PHÍ CAO - Chỉ dùng khi database không có dữ liệu hoặc cần thông tin bên ngoài",
+        timeout_s=20, retry=_REMOTE_RETRY, cacheable=True, cache_ttl_s=900, concurrency_class="http", cost_weight=3.0,
+    ),
+]
+
+TOOL_REGISTRY: Dict[Action, ToolSpec] = {spec.action: spec for spec in _SPECS}
+
+def get_tool_spec(action: Union[Action, str]) -> ToolSpec:
+    """
+    O(1) lookup by Action (or its string value). Raises ValueError for unknown actions.
+    """
+    try:
+        return TOOL_REGISTRY[Action(action)]
+    except (KeyError, ValueError):
+        raise ValueError(f"Tool '{getattr(action, 'value', action)}' not implemented for direct execution.")
+
+def action_names() -> List[str]:
+    """
+    Every registered action, in registry order.
+    """
+    return [spec.action.value for spec in _SPECS]
+
+def default_tool_inventory() -> List[str]:
+    return action_names()
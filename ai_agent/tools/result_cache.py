@@ -0,0 +1,137 @@
+"""
+Result cache for tool calls, keyed by a canonical hash of action + normalized input.
+In-memory LRU bounded by entry count and by total (JSON) size, with per-tool TTLs.
+"""
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+def _normalize(value: Any) -> Any:
+    """Canonical form of a tool input: sorted keys, trimmed strings."""
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+def make_signature(action: str, tool_input: Dict[str, Any]) -> str:
+    raw = json.dumps([action, _normalize(tool_input or {})], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ToolResultCache:
+    """LRU cache of successful tool results with per-entry TTL and a total byte budget"""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024, ttl_overrides: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_overrides = ttl_overrides or {}
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()  # key -> (expires_at, size, result)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0, "too_large": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["ToolResultCache"]:
+        """
+        Builds the cache from environment variables, or returns None when disabled.
+
+        - TOOL_CACHE_ENABLED: "true/false" (default: true)
+        - TOOL_CACHE_MAX_ENTRIES: max cached results (default: 512)
+        - TOOL_CACHE_MAX_BYTES: max total size of cached results as JSON (default: 32 MiB)
+        - TOOL_CACHE_TTL_<ACTION>: per-tool TTL override in seconds, e.g. TOOL_CACHE_TTL_SQL_LIST_TABLES=600
+        """
+        if os.getenv("TOOL_CACHE_ENABLED", "true").strip().lower() not in {"1", "true", "yes", "on"}:
+            return None
+        ttl_overrides = {}
+        prefix = "TOOL_CACHE_TTL_"
+        for name, value in os.environ.items():
+            if name.startswith(prefix):
+                # TOOL_CACHE_TTL_SQL_LIST_TABLES -> sql.list_tables is matched in ttl_for()
+                ttl_overrides[name[len(prefix):].lower()] = float(value)
+        return cls(
+            max_entries=int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "512")),
+            max_bytes=int(os.getenv("TOOL_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            ttl_overrides=ttl_overrides,
+        )
+
+    def ttl_for(self, action: str, default_ttl: float) -> float:
+        return self.ttl_overrides.get(action.replace(".", "_").lower(), default_ttl)
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                expires_at, size, result = item
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    # Callers may mutate the result; never hand out the cached object itself
+                    return copy.deepcopy(result)
+                self._remove(key)
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, result: Any, ttl: float):
+        if ttl <= 0:
+            return
+        size = len(json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"))
+        with self._lock:
+            if size > self.max_bytes:
+                self._stats["too_large"] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl, size, copy.deepcopy(result))
+            self._bytes += size
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        """Drop an entry; caller holds the lock"""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+_TOOL_CACHE = None
+_TOOL_CACHE_INITIALIZED = False
+_TOOL_CACHE_LOCK = threading.Lock()
+
+def get_tool_result_cache() -> Optional[ToolResultCache]:
+    """
+    Get or create the global tool result cache (None when TOOL_CACHE_ENABLED=false).
+    """
+    global _TOOL_CACHE, _TOOL_CACHE_INITIALIZED
+    if not _TOOL_CACHE_INITIALIZED:
+        with _TOOL_CACHE_LOCK:
+            if not _TOOL_CACHE_INITIALIZED:
+                _TOOL_CACHE = ToolResultCache.from_env()
+                _TOOL_CACHE_INITIALIZED = True
+    return _TOOL_CACHE
@@ -0,0 +1,147 @@
+"""
+In-process vector index for memory recall.
+Vectors live in one contiguous, L2-normalized float32 matrix so cosine similarity is a single matrix product.
+Small indexes are searched exhaustively; past ivf_threshold vectors an IVF (inverted file) layer built
+with spherical k-means restricts each search to the nprobe closest clusters.
+"""
+import math
+import threading
+from typing import List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+class VectorIndex:
+    """Cosine-similarity index over (id, vector) pairs; thread-safe"""
+
+    def __init__(self, ivf_threshold: int = 20000, nprobe: int = 8, kmeans_iterations: int = 10):
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self._ids: List[str] = []
+        self._id_set: Set[str] = set()
+        self._matrix: Optional[np.ndarray] = None  # capacity x dim, rows [0, size) are in use
+        self._size = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._trained_size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    def add(self, ids: Sequence[str], vectors) -> None:
+        """Adds (id, vector) pairs; ids already in the index are skipped"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if not len(ids):
+            return
+        if len(ids) != vectors.shape[0]:
+            raise ValueError(f"Got {len(ids)} ids for {vectors.shape[0]} vectors")
+        vectors = _normalize(vectors)
+
+        with self._lock:
+            keep, batch = [], set()
+            for i, memory_id in enumerate(ids):
+                if memory_id not in self._id_set and memory_id not in batch:
+                    batch.add(memory_id)
+                    keep.append(i)
+            if not keep:
+                return
+            if len(keep) < len(ids):
+                ids = [ids[i] for i in keep]
+                vectors = vectors[keep]
+
+            if self._matrix is None:
+                self._matrix = np.empty((max(64, len(ids)), vectors.shape[1]), dtype=np.float32)
+            elif vectors.shape[1] != self._matrix.shape[1]:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self._matrix.shape[1]}")
+
+            needed = self._size + len(ids)
+            if needed > self._matrix.shape[0]:
+                # Amortized growth keeps the matrix contiguous without reallocating on every add
+                grown = np.empty((max(needed, self._matrix.shape[0] * 2), self._matrix.shape[1]), dtype=np.float32)
+                grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+
+            start = self._size
+            self._matrix[start:needed] = vectors
+            self._ids.extend(ids)
+            self._id_set.update(ids)
+            self._size = needed
+
+            if self._size >= self.ivf_threshold and self._size >= 2 * self._trained_size:
+                self._train_ivf()
+            elif self._centroids is not None:
+                self._assign(np.arange(start, needed))
+
+    def search(self, query, k: int = 5) -> List[Tuple[str, float]]:
+        """Returns up to k (id, cosine similarity) pairs, best first"""
+        with self._lock:
+            if not self._size or k <= 0:
+                return []
+            q = np.asarray(query, dtype=np.float32).reshape(-1)
+            if q.shape[0] != self._matrix.shape[1]:
+                return []
+            norm = np.linalg.norm(q)
+            if norm == 0:
+                return []
+            q = q / norm
+
+            if self._centroids is None:
+                scores = self._matrix[:self._size] @ q
+                order = _top_k(scores, k)
+                return [(self._ids[i], float(scores[i])) for i in order]
+
+            probes = _top_k(self._centroids @ q, min(self.nprobe, len(self._lists)))
+            candidates = np.concatenate([self._lists[p] for p in probes])
+            if not candidates.size:
+                return []
+            scores = self._matrix[candidates] @ q
+            order = _top_k(scores, k)
+            return [(self._ids[candidates[i]], float(scores[i])) for i in order]
+
+    def _train_ivf(self):
+        """Spherical k-means over (a sample of) the vectors; caller holds the lock"""
+        data = self._matrix[:self._size]
+        nlist = max(1, int(math.sqrt(self._size)))
+        rng = np.random.default_rng(0)
+        sample = data[rng.choice(self._size, size=min(self._size, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            # Empty clusters keep their previous centroid
+            empty = ~np.bincount(assignment, minlength=nlist).astype(bool)
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+
+        self._centroids = centroids
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self._assign(np.arange(self._size))
+        self._trained_size = self._size
+        print(f"Trained IVF index: {self._size} vectors in {nlist} lists")
+
+    def _assign(self, rows: np.ndarray):
+        """Append rows to the inverted list of their nearest centroid; caller holds the lock"""
+        assignment = np.argmax(self._matrix[rows] @ self._centroids.T, axis=1)
+        for c in np.unique(assignment):
+            self._lists[c] = np.concatenate([self._lists[c], rows[assignment == c]])
@@ -1,6 +1,7 @@
 """
 Main entry point for the AI Agent's interactive chat loop.
 """
+import asyncio
 from dotenv import load_dotenv
 
 # Load environment variables from .env file at the very beginning
@@ -8,10 +9,12 @@ load_dotenv()
 
 from ai_agent.graph import build_graph
 from ai_agent.state import AgentState
+from ai_agent.tools.registry import default_tool_inventory
 
-def run_chat_loop():
+async def run_chat_loop():
     """
     Initializes the agent and runs an interactive chat loop in the terminal.
+    The graph runs on the async path, the same one a server would use for concurrent turns.
     """
     print("--- AI Agent Chat Interface ---")
     print("Agent is ready. Type your question.")
@@ -25,6 +28,7 @@ def run_chat_loop():
 
     while True:
         try:
+            # Blocking input is fine here: the CLI serves a single conversation
             question = input("\nYou: ")
 
             if question.lower() in ["exit", "quit", "bye"]:
@@ -40,17 +44,30 @@ def run_chat_loop():
                 history=session_history,
                 profile=session_profile,
                 chat_history=session_chat_history,
+                tool_inventory=default_tool_inventory(),
             )
 
             print("Agent: Thinking...")
             
-            # Use .invoke() for a simple request-response interaction
-            # It runs the graph until the end and returns the final state.
-            final_state = app.invoke(initial_state, {"recursion_limit": 50})
+            # Use .astream() so synthesis tokens ("custom" mode) are printed as they arrive,
+            # while "values" mode hands us the final state once the graph ends.
+            final_state = {}
+            streamed = False
+            async for mode, chunk in app.astream(initial_state, {"recursion_limit": 50}, stream_mode=["custom", "values"]):
+                if mode == "custom" and chunk.get("token"):
+                    if not streamed:
+                        print("\nAgent: ", end="", flush=True)
+                        streamed = True
+                    print(chunk["token"], end="", flush=True)
+                elif mode == "values":
+                    final_state = chunk
 
             # Print the final answer
             final_answer = final_state.get('final_answer', "Sorry, I encountered an issue and could not find an answer.")
-            print(f"\nAgent: {final_answer}")
+            if streamed:
+                print()
+            else:
+                print(f"\nAgent: {final_answer}")
 
             # Optional: Print errors if any occurred during the run
             if final_state.get('errors'):
@@ -75,5 +92,17 @@ def run_chat_loop():
             print(f"\nAn unexpected error occurred: {e}")
             print("Restarting the loop.")
 
+    await _close_llm_client()
+
+async def _close_llm_client():
+    """
+    Releases pooled LLM connections held for this event loop.
+    """
+    try:
+        from ai_agent.llm_client import get_llm_client
+        await get_llm_client().aclose()
+    except Exception:
+        pass
+
 if __name__ == "__main__":
-    run_chat_loop()
\ No newline at end of file
+    asyncio.run(run_chat_loop())
\ No newline at end of file
@@ -7,13 +7,14 @@ Run:
 from __future__ import annotations
 
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
 
 from dotenv import load_dotenv
 import streamlit as st
 
 from ai_agent.graph import build_graph
 from ai_agent.state import AgentState, Limits
+from ai_agent.tools.registry import default_tool_inventory
 
 
 def initialize_session() -> None:
@@ -39,6 +40,27 @@ def render_chat_history() -> None:
                 st.markdown(content)
 
 
+def stream_agent_answer(app, initial_state: AgentState, run_result: Dict[str, Any], thinking) -> Iterator[str]:
+    """
+    Runs the graph in streaming mode and yields synthesis tokens for st.write_stream.
+    The final state is stored in run_result["final_state"] once the graph ends.
+    """
+    for mode, chunk in app.stream(initial_state, {"recursion_limit": 50}, stream_mode=["custom", "values"]):
+        if mode == "custom" and chunk.get("token"):
+            if not run_result["streamed"]:
+                thinking.empty()
+                run_result["streamed"] = True
+            yield chunk["token"]
+        elif mode == "values":
+            run_result["final_state"] = chunk
+
+    thinking.empty()
+    if not run_result["streamed"]:
+        # Nothing was streamed (e.g. JSON deliverable): show the final answer in one piece
+        final_answer = run_result["final_state"].get("final_answer") or "Xin lỗi, tôi gặp sự cố khi xử lý yêu cầu này."
+        yield final_answer if isinstance(final_answer, str) else str(final_answer)
+
+
 def main() -> None:
     load_dotenv()  # Load environment variables early
 
@@ -298,7 +320,10 @@ def main() -> None:
                 from ai_agent.memory import get_memory_manager
                 memory_manager = get_memory_manager()
                 user_id = st.session_state.agent_profile.get("name", "default_user")
-                filename = memory_manager.export_memory(user_id)
+                progress_bar = st.progress(0.0, text="Đang xuất memory...")
+                def update_progress(done, total):
+                    progress_bar.progress(min(done / total, 1.0) if total else 1.0, text=f"Đã xuất {done}/{total or done} bản ghi")
+                filename = memory_manager.export_memory(user_id, format="jsonl.gz", progress=update_progress)
                 st.success(f"Memory exported to: {filename}")
             except Exception as e:
                 st.error(f"Error exporting memory: {e}")
@@ -335,47 +360,40 @@ def main() -> None:
         with st.chat_message("user"):
             st.write(user_input)
 
-        # Prepare state and invoke the agent
+        # Prepare state and stream the agent's answer
         with st.chat_message("assistant"):
-            with st.spinner("Agent đang suy nghĩ..."):
-                initial_state = AgentState(
-                    question=user_input,
-                    history=st.session_state.agent_history,
-                    profile=st.session_state.agent_profile,
-                    chat_history=st.session_state.chat_messages,
-                    limits=Limits(max_steps=6, max_retries_per_step=2, time_budget_hint="ngắn"), # Default limits
-                    tool_inventory=["sql.list_tables", "sql.custom_query", "google.search"] # Placeholder tools
-                )
-                try:
-                    final_state = st.session_state.agent_app.invoke(initial_state, {"recursion_limit": 50})
-                except Exception as e:
-                    st.error(f"Đã xảy ra lỗi khi gọi agent: {e}")
-                    return
+            initial_state = AgentState(
+                question=user_input,
+                history=st.session_state.agent_history,
+                profile=st.session_state.agent_profile,
+                chat_history=st.session_state.chat_messages,
+                limits=Limits(max_steps=6, max_retries_per_step=2, time_budget_hint="ngắn"), # Default limits
+                tool_inventory=default_tool_inventory()
+            )
+            run_result: Dict[str, Any] = {"final_state": {}, "streamed": False}
+            thinking = st.empty()
+            thinking.markdown("⏳ Agent đang suy nghĩ...")
+            try:
+                st.write_stream(stream_agent_answer(st.session_state.agent_app, initial_state, run_result, thinking))
+            except Exception as e:
+                thinking.empty()
+                st.error(f"Đã xảy ra lỗi khi gọi agent: {e}")
+                return
 
-                final_answer = final_state.get(
-                    "final_answer",
-                    "Xin lỗi, tôi gặp sự cố khi xử lý yêu cầu này.",
-                )
-                
-                # Improved answer display with better UX
-                if len(final_answer) > 500:
-                    # Long answers get expandable section with preview
-                    preview = final_answer[:200] + "..." if len(final_answer) > 200 else final_answer
-                    st.markdown(f"**Tóm tắt:** {preview}")
-                    with st.expander("📄 Xem câu trả lời đầy đủ", expanded=True):
-                        st.markdown(final_answer)
-                else:
-                    # Short answers display directly
-                    st.markdown(final_answer)
+            final_state = run_result["final_state"]
+            final_answer = final_state.get(
+                "final_answer",
+                "Xin lỗi, tôi gặp sự cố khi xử lý yêu cầu này.",
+            )
 
-                # Show errors if any
-                if final_state.get("errors"):
-                    with st.expander("⚠️ Chi tiết lỗi trong tác vụ", expanded=False):
-                        for i, err in enumerate(final_state["errors"], 1):
-                            st.error(f"**Lỗi {i}:** {err}")
-                
-                # Show success message
-                st.success("✅ Hoàn thành! Câu trả lời đã được tạo thành công.")
+            # Show errors if any
+            if final_state.get("errors"):
+                with st.expander("⚠️ Chi tiết lỗi trong tác vụ", expanded=False):
+                    for i, err in enumerate(final_state["errors"], 1):
+                        st.error(f"**Lỗi {i}:** {err}")
+            
+            # Show success message
+            st.success("✅ Hoàn thành! Câu trả lời đã được tạo thành công.")
 
         # Persist back session state
         st.session_state.chat_messages.append({"role": "assistant", "content": final_answer})